@@ -1,10 +1,19 @@
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.properties import ObjectProperty
 from serial.serialutil import SerialException
 from serial.serialwin32 import Serial
-from serial.tools.list_ports import comports
 import serial
+import os
+import sys
+
+# Shared modules of the examples live in the root of the repository
+_REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if (_REPOSITORY_DIR not in sys.path):
+    sys.path.append(_REPOSITORY_DIR)
+
+from common.hotplug import PortMonitor
 ##
 #   @brief          Root widget of the App.
 #
@@ -24,14 +33,31 @@ class Container(BoxLayout):
         
 
     def on_com_ports_spinner(self, instance, value):
-        ports = [port.device for port in comports()]
+        self.update_ports([], [])
+        # Ports are listed again whenever a device is plugged in or unplugged
+        self.port_monitor = PortMonitor(self.ports_changed)
+        self.port_monitor.start()
+
+    def ports_changed(self, added, removed):
+        # Called by the thread of the monitor: widgets are updated on the main thread
+        ports = sorted(self.port_monitor.ports)
+        Clock.schedule_once(lambda dt: self.update_ports(ports, added))
+
+    def update_ports(self, ports, added):
         self.com_ports_spinner.values = ports
+        if (self.connected):
+            return
         if len(ports) > 0:
-            self.com_ports_spinner.text = ports[0]
+            # Select the port just plugged in
+            if (len(added) > 0):
+                self.com_ports_spinner.text = added[0]
+            elif (self.com_ports_spinner.text not in ports):
+                self.com_ports_spinner.text = ports[0]
+            self.com_ports_spinner.disabled = False
         else:
             self.com_ports_spinner.text = 'No COM port found'
             self.com_ports_spinner.disabled = True
-        
+
     def button_pressed_callback(self):
         if (len(self.com_ports_spinner.values) == 0):
             print('No COM port selected')
@@ -0,0 +1,185 @@
+##
+# @package log_view
+#
+#   Virtualized view of the lines of a common.terminal.LineLog.
+#
+#   The \ref LogView is a RecycleView showing one row per line. Its
+#   \ref LogLayout gives all the rows the same height, so that the rows
+#   visible in the viewport are found, and laid out, in constant time: a
+#   RecycleBoxLayout computes the size and position of every row each time
+#   lines are appended, which does not scale to hundreds of thousands of
+#   lines.
+
+from bisect import bisect_left
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.properties import BooleanProperty, NumericProperty, StringProperty
+from kivy.uix.label import Label
+from kivy.uix.recyclelayout import RecycleLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+
+##
+#   @brief          Time in seconds between two updates of the view.
+REFRESH_INTERVAL = 0.1
+
+
+##
+#   @brief          Row of the view, showing a line.
+#
+#   Items of the data of the view are the lines themselves, not
+#   dictionaries, to save memory.
+class LogLine(RecycleDataViewBehavior, Label):
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.text = data
+
+
+##
+#   @brief          Options of the rows of a \ref LogLayout, computed when accessed.
+class RowOptions():
+
+    def __init__(self, layout, n_rows):
+        self.layout = layout
+        self.n_rows = n_rows
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getitem__(self, index):
+        layout = self.layout
+        row_height = layout.row_height
+        return {'size': [layout.width, row_height], 'size_hint': [None, None],
+                'size_hint_min': [None, None], 'size_hint_max': [None, None],
+                'pos': [layout.x, layout.top - (index + 1) * row_height], 'pos_hint': {},
+                'viewclass': layout.viewclass, 'width_none': False, 'height_none': False}
+
+
+##
+#   @brief          Vertical layout of rows of the same height.
+class LogLayout(RecycleLayout):
+
+    """
+    @brief Height of each row.
+    """
+    row_height = NumericProperty(dp(18))
+
+    def __init__(self, **kwargs):
+        super(LogLayout, self).__init__(**kwargs)
+        self.fbind('row_height', self._catch_layout_trigger)
+
+    def compute_sizes_from_data(self, data, flags):
+        # Rows change index when lines are evicted: all views are updated
+        self.clear_layout()
+        self.view_opts = RowOptions(self, len(data))
+
+    def compute_layout(self, data, flags):
+        self._size_needs_update = False
+        self._changed_views = None
+        self.height = len(data) * self.row_height
+        # Rows are resized with the layout
+        self.clear_layout()
+
+    def get_view_index_at(self, pos):
+        n_rows = len(self.view_opts)
+        index = int((self.top - pos[1]) // self.row_height)
+        return min(max(index, 0), n_rows - 1)
+
+    def compute_visible_views(self, data, viewport):
+        if (not data):
+            return []
+        x, y, w, h = viewport
+        return list(range(self.get_view_index_at((x, y + h)), self.get_view_index_at((x, y)) + 1))
+
+
+##
+#   @brief          View of the lines of a log, optionally filtered by a query.
+#
+#   The view polls the log every REFRESH_INTERVAL seconds, so that lines
+#   received at any rate are shown in batches. When a query is set, the
+#   lines already received are searched with the index of the log, and
+#   only new lines are then checked against the query.
+class LogView(RecycleView):
+
+    """
+    @brief Words that the lines shown must contain, all lines if empty.
+    """
+    query = StringProperty('')
+
+    """
+    @brief Keep the last line visible when lines are appended.
+    """
+    follow = BooleanProperty(True)
+
+    """
+    @brief Number of lines shown.
+    """
+    n_lines = NumericProperty(0)
+
+    def __init__(self, **kwargs):
+        self.log = None
+        self.next_id = 0        # id of the first line not checked yet
+        self.ids_shown = []     # ids of the lines shown, when filtered
+        super(LogView, self).__init__(**kwargs)
+        Clock.schedule_interval(self.refresh, REFRESH_INTERVAL)
+
+    ##
+    #   @brief          Show the lines of a common.terminal.LineLog.
+    def set_log(self, log):
+        self.log = log
+        self.reload()
+
+    def on_query(self, instance, value):
+        self.reload()
+
+    def on_follow(self, instance, value):
+        if (value):
+            self.scroll_y = 0
+
+    ##
+    #   @brief          Show again all the lines matching the query.
+    def reload(self):
+        if (self.log is None):
+            return
+        if (self.query.strip()):
+            # Lines appended meanwhile are filtered by the next refresh
+            next_id = self.log.next_id
+            self.ids_shown, lines = self.log.search(self.query, stop_id=next_id)
+        else:
+            self.ids_shown = []
+            first_id, lines = self.log.lines()
+            next_id = first_id + len(lines)
+        self.next_id = next_id
+        self.show(lines)
+
+    ##
+    #   @brief          Show the lines appended to the log since the last update.
+    def refresh(self, dt):
+        log = self.log
+        if (log is None or log.next_id == self.next_id):
+            return
+        if (not self.query.strip()):
+            first_id, lines = log.lines()
+            self.next_id = first_id + len(lines)
+            self.show(lines)
+            return
+        # Drop the evicted lines, then filter the new ones
+        n_evicted = bisect_left(self.ids_shown, log.first_id)
+        del self.ids_shown[:n_evicted]
+        first_id, new_lines = log.lines(self.next_id)
+        self.next_id = first_id + len(new_lines)
+        matching = [(line_id, line) for line_id, line in enumerate(new_lines, first_id)
+                    if (log.matches(self.query, line))]
+        if (n_evicted == 0 and not matching):
+            return
+        lines = self.data[n_evicted:]
+        for line_id, line in matching:
+            self.ids_shown.append(line_id)
+            lines.append(line)
+        self.show(lines)
+
+    def show(self, lines):
+        self.data = lines
+        self.n_lines = len(lines)
+        if (self.follow):
+            self.scroll_y = 0
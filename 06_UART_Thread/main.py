@@ -1,11 +1,30 @@
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
-from kivy.properties import ObjectProperty
+from kivy.properties import ObjectProperty, StringProperty
 import serial
 from serial.serialutil import SerialException
-from serial.tools.list_ports import comports
+import os
+import sys
 import threading
 
+# Shared modules of the examples live in the root of the repository
+_REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if (_REPOSITORY_DIR not in sys.path):
+    sys.path.append(_REPOSITORY_DIR)
+
+from common.hotplug import PortMonitor
+from common.terminal import LineLog, LineReader
+from log_view import LogView
+
+##
+#   @brief          Baud rates proposed, up to the 1 Mbaud of firmware logs.
+BAUD_RATES = ('9600', '57600', '115200', '230400', '460800', '921600', '1000000')
+
+##
+#   @brief          Baud rate selected at startup.
+DEFAULT_BAUD_RATE = '115200'
+
 ##
 #   @brief          Root widget of the App.
 #
@@ -19,16 +38,74 @@ class Container(BoxLayout):
     connection_button = ObjectProperty(None)
     com_ports_spinner = ObjectProperty(None)
     debug_label = ObjectProperty(None)
+    baud_rate_spinner = ObjectProperty(None)
+    log_view = ObjectProperty(None)
+
+    """
+    @brief Status of the terminal: lines received and shown.
+    """
+    status_string = StringProperty('')
 
     def __init__(self, **kwargs):
+        self.connected = False
+        self.reader = None
+        self.log = LineLog()
         super(Container, self).__init__(*kwargs)
+
+    def on_baud_rate_spinner(self, instance, value):
+        self.baud_rate_spinner.values = BAUD_RATES
+        self.baud_rate_spinner.text = DEFAULT_BAUD_RATE
+
+    def on_log_view(self, instance, value):
+        self.log_view.set_log(self.log)
+        self.log_view.bind(n_lines=self.update_status)
+
+    def update_status(self, instance, n_lines):
+        received = self.reader.n_bytes if (self.reader is not None) else 0
+        self.status_string = f'{n_lines} / {len(self.log)} lines | {received} bytes received'
+
+    def clear_log(self):
+        self.log.clear()
+        self.log_view.reload()
+
+    def reading_error(self, error):
+        # Called by the thread of the reader, e.g. when the board is unplugged
+        Clock.schedule_once(lambda dt: self.disconnected(f'Connection lost: {error}'))
+
+    def disconnected(self, message):
+        if (not self.connected):
+            return
+        self.reader.stop()
+        self.ser.close()
+        self.reader = None
         self.connected = False
+        self.debug_label.text = message
+        self.connection_button.text = 'Connect'
+        self.com_ports_spinner.disabled = False
+        self.baud_rate_spinner.disabled = False
 
     def on_com_ports_spinner(self, instance, value):
-        ports = [port.device for port in comports()]
+        self.update_ports([], [])
+        # Ports are listed again whenever a device is plugged in or unplugged
+        self.port_monitor = PortMonitor(self.ports_changed)
+        self.port_monitor.start()
+
+    def ports_changed(self, added, removed):
+        # Called by the thread of the monitor: widgets are updated on the main thread
+        ports = sorted(self.port_monitor.ports)
+        Clock.schedule_once(lambda dt: self.update_ports(ports, added))
+
+    def update_ports(self, ports, added):
         self.com_ports_spinner.values = ports
+        if (self.connected):
+            return
         if len(ports) > 0:
-            self.com_ports_spinner.text = ports[0]
+            # Select the port just plugged in
+            if (len(added) > 0):
+                self.com_ports_spinner.text = added[0]
+            elif (self.com_ports_spinner.text not in ports):
+                self.com_ports_spinner.text = ports[0]
+            self.com_ports_spinner.disabled = False
         else:
             self.com_ports_spinner.text = 'No COM port found'
             self.com_ports_spinner.disabled = True
@@ -47,23 +124,31 @@ class Container(BoxLayout):
             try:
                 self.connection_button.disabled = True
                 self.com_ports_spinner.disabled = True
+                self.baud_rate_spinner.disabled = True
                 self.ser = serial.Serial(
-                    port=self.com_ports_spinner.text, baudrate=115200)
+                    port=self.com_ports_spinner.text,
+                    baudrate=int(self.baud_rate_spinner.text))
                 if (self.ser.is_open):
+                    self.reader = LineReader(self.ser, self.log, error_callback=self.reading_error)
+                    self.reader.start()
                     self.debug_label.text = "Connection successful"
                     self.connected = True
                     self.connection_button.text = 'Disconnect'
                     self.com_ports_spinner.disabled = True
             except SerialException:
                 self.com_ports_spinner.disabled = False
+                self.baud_rate_spinner.disabled = False
                 self.debug_label.text = "Could not connect to serial port"
             self.connection_button.disabled = False
         else:
+            self.reader.stop()
             self.ser.close()
+            self.reader = None
             self.debug_label.text = "Disconnection successful"
             self.connected = False
             self.connection_button.text = 'Connect'
             self.com_ports_spinner.disabled = False
+            self.baud_rate_spinner.disabled = False
 
 ##
 #   @brief          PropertyApp class.
@@ -0,0 +1,90 @@
+##
+# @package benchmark
+#
+#   Headless benchmark of the GUI, enabled with the --benchmark flag.
+#
+#   The board is replaced by a common.benchmark.SyntheticPort streaming a
+#   sine wave at --benchmark-rate, the plot shows --benchmark-window
+#   seconds, and the JSON report of common.benchmark.FrameBenchmark is
+#   written to --benchmark-output (or printed):
+#
+#       python main.py --benchmark --benchmark-rate 1000 --benchmark-window 60
+
+import os
+import numpy as np
+
+from common.benchmark import DEFAULT_DURATION, DEFAULT_WARMUP, FrameBenchmark, SyntheticPort
+
+# Command line flag enabling the benchmark
+BENCHMARK_FLAG = '--benchmark'
+
+# Response of the synthetic board to the connection command
+SYNTHETIC_BANNER = b'WaveDAC $$$\r\n'
+
+# Frequency in Hz of the synthetic wave
+SYNTHETIC_FREQUENCY = 1.0
+
+
+def add_benchmark_arguments(parser):
+    '''
+    Add the arguments of the benchmark to the parser of the GUI.
+    '''
+    parser.add_argument(BENCHMARK_FLAG, action='store_true',
+                        help='run a headless benchmark with a synthetic board')
+    parser.add_argument('--benchmark-rate', type=float, default=100,
+                        help='sample rate in Hz of the synthetic board (default: %(default)s)')
+    parser.add_argument('--benchmark-window', type=float, default=60,
+                        help='seconds shown by the plot (default: %(default)s)')
+    parser.add_argument('--benchmark-duration', type=float, default=DEFAULT_DURATION,
+                        help='duration in seconds of the measurements (default: %(default)s)')
+    parser.add_argument('--benchmark-output', default=None,
+                        help='path of the JSON report (default: printed)')
+
+
+def use_offscreen_window():
+    '''
+    Use an offscreen window, unless a video driver is chosen.
+    Must be called before the Kivy window is created.
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+
+
+def make_packets(first_index, n, sample_rate):
+    '''
+    Bytes of n packets of a sine wave spanning the DAC range.
+    '''
+    # Imported once the app runs, as it imports Kivy
+    from communication import WAVEDAC_FRAME
+    t = np.arange(first_index, first_index + n) / sample_rate
+    codes = 32767.5 * (1 + np.sin(2 * np.pi * SYNTHETIC_FREQUENCY * t))
+    return WAVEDAC_FRAME.encode({'code': codes.astype(np.uint16)}, n)
+
+
+def start_benchmark(root, args):
+    '''
+    Connect the app to a synthetic board, start streaming and the
+    measurements. The returned FrameBenchmark must be kept referenced.
+    '''
+    from kivy.clock import Clock
+    from communication import READ_TIMEOUT
+    serial = root.serial
+    serial.port_monitor.stop()
+    rate = args.benchmark_rate
+    port = SyntheticPort(lambda first_index, n: make_packets(first_index, n, rate), rate,
+                         banner=SYNTHETIC_BANNER, timeout=READ_TIMEOUT)
+    serial.port_name = 'synthetic'
+    serial.connect(port)
+    root.graph_w.wave_dac_tab.plot.n_seconds = args.benchmark_window
+    Clock.schedule_once(lambda dt: root.start_streaming())
+
+    def collect():
+        return {'samples': serial.samples_counter,
+                'measured_rate_hz': round(serial.stats.mean_rate(), 2),
+                'start_latency_ms': (None if (serial.start_latency is None)
+                                     else round(serial.start_latency, 2))}
+    benchmark = FrameBenchmark(args.benchmark_duration, DEFAULT_WARMUP, args.benchmark_output,
+                               info={'app': 'WaveDAC', 'rate_hz': rate,
+                                     'window_s': args.benchmark_window},
+                               collect=collect)
+    benchmark.start()
+    return benchmark
@@ -1,10 +1,48 @@
 import serial
-import serial.tools.list_ports as list_ports
 import threading
 from kivy.properties import NumericProperty, StringProperty
 from kivy.event import EventDispatcher
+from kivy.clock import Clock
 import time
-import struct
+import numpy as np
+
+from common.commands import CommandQueue
+from common.conversion import LookupTableConverter, unsigned_full_scale
+from common.frames import FrameDecoder, FrameSpec, field_values
+from common.hotplug import PortMonitor
+from common.stats import StreamStats
+
+# Full scale of the DAC output in V
+DAC_FULL_SCALE = 5
+
+# Format of the data packets: START_BYTE | DATA_MSB | DATA_LSB | END_BYTE
+WAVEDAC_FRAME = FrameSpec('sample', header=0xA0, fields=[('code', 'H')], tail=0xC0, byteorder='>')
+
+# Time in seconds the writer thread waits for a new command
+COMMAND_POLL_INTERVAL = 0.1
+
+# Write timeout in seconds, so that a wedged port fails the command
+WRITE_TIMEOUT = 0.5
+
+# Read timeout in seconds: the read thread checks at least this often
+# whether streaming was stopped, also if a read is not cancelled
+READ_TIMEOUT = 0.1
+
+# Maximum time in seconds to wait for the response of a probed port
+PORT_CHECK_TIMEOUT = 2
+
+# Maximum time in seconds to wait for a probed port to open again
+PORT_REOPEN_TIMEOUT = 1.0
+
+# The firmware sets the sample rate, which is measured by the read thread
+# and published on the main thread every this many seconds
+STATS_UPDATE_INTERVAL = 0.5
+
+# Relative change of the measured sample rate that updates the sample_rate property
+RATE_CHANGE_TOLERANCE = 0.05
+
+# Number of decimals of the published sample rate in Hz
+SAMPLE_RATE_DECIMALS = 1
 
 class Singleton(type):
     _instances = {}
@@ -20,62 +58,144 @@ class KivySerial(EventDispatcher, metaclass=Singleton):
 
     def __init__(self):
         self.port_name = ""
+        self.port = None
         self.baudrate = 115200
         self.is_streaming = False
         self.connected = 0
-        self.read_state = 0
+        self.decoder = FrameDecoder([WAVEDAC_FRAME])
+        self.read_thread = None
+        self.start_latency = None   # time in ms from start request to first sample
+        self.stop_latency = None    # time in ms from stop request to read thread exit
         self.callbacks = []
-        find_port_thread = threading.Thread(target=self.find_port, daemon=True)
-        find_port_thread.start()
+        # Commands are written by a dedicated thread, never by the UI thread
+        self.commands = CommandQueue()
+        # Codes are converted to volts with a lookup table
+        self.converter = LookupTableConverter(unsigned_full_scale(DAC_FULL_SCALE))
+        self.stats = StreamStats()
+        self.register_event_type('on_command_complete')
+        super(KivySerial, self).__init__()
+        Clock.schedule_interval(self.update_stats, STATS_UPDATE_INTERVAL)
+        # Ports are probed when plugged in, and the board is connected when found
+        self.port_monitor = PortMonitor(self.find_port)
+        self.port_monitor.start()
     
     def add_callback(self, callback):
         if (callback not in self.callbacks):
             self.callbacks.append(callback)
 
-    def find_port(self):
-        mip_port_found = False
-        while (not mip_port_found):
-            ports = list_ports.comports()
-            for port in ports:
-                mip_port_found = self.check_mip_port(port.device)
-                if (mip_port_found):
-                    self.port_name = port.device
-                    if (self.connect() == 0):
-                        break
+    def set_property(self, name, value):
+        '''
+        Set a property bound to widgets, on the main thread whichever
+        thread calls this function.
+        '''
+        if (threading.current_thread() is threading.main_thread()):
+            setattr(self, name, value)
+        else:
+            Clock.schedule_once(lambda dt: setattr(self, name, value))
+
+    def find_port(self, added, removed):
+        '''
+        Called by the port monitor with the names of the ports plugged
+        in and unplugged: the new ports are checked until the board is
+        found, so that each port is opened only once. When the port of
+        the board is unplugged, the board is disconnected (also while
+        not streaming, when the port is not read), so that it is
+        probed again when plugged back.
+        '''
+        if (self.port_name in removed and self.connected != 0):
+            self.set_property('connected', 0)
+            return
+        if (self.connected == 2):
+            return
+        for port_name in added:
+            if (self.check_mip_port(port_name)):
+                self.port_name = port_name
+                if (self.connect() == 0):
+                    break
 
     def check_mip_port(self, port_name):
-        self.message_string = 'Checking: {}'.format(port_name)
+        '''
+        Send the 'v' command and poll the response until '$$$' is
+        received, or for at most PORT_CHECK_TIMEOUT seconds. The port
+        is always closed before returning.
+        '''
+        self.set_property('message_string', 'Checking: {}'.format(port_name))
+        try:
+            port = serial.Serial(port=port_name, baudrate=self.baudrate,
+                                 timeout=READ_TIMEOUT, write_timeout=WRITE_TIMEOUT)
+        except (serial.SerialException, ValueError):
+            return False
         try:
-            port = serial.Serial(port=port_name, baudrate=self.baudrate)
-            if (port.is_open):
-                port.write('v'.encode('utf-8'))
-                time.sleep(2)
-                received_string = ''
-                while (port.in_waiting > 0):
-                    received_string += port.read().decode('utf-8', errors='replace')
-                if ('$$$' in received_string):
-                    self.message_string = 'Device found on port: {}'.format(port_name)
-                    port.close()
-                    time.sleep(1)
-                    self.connected = 1
-                    return True
-        except serial.SerialException:
+            port.write('v'.encode('utf-8'))
+            received_string = ''
+            deadline = time.monotonic() + PORT_CHECK_TIMEOUT
+            while ('$$$' not in received_string and time.monotonic() < deadline):
+                received_string += port.read(max(1, port.in_waiting)).decode('utf-8', errors='replace')
+        except (serial.SerialException, OSError):
             return False
-        except ValueError:
+        finally:
+            port.close()
+        if ('$$$' not in received_string):
             return False
-        return False
+        self.set_property('message_string', 'Device found on port: {}'.format(port_name))
+        self.set_property('connected', 1)
+        return True
 
-    def connect(self):
-        self.port = serial.Serial(port=self.port_name, baudrate=self.baudrate)
+    def connect(self, port=None):
+        '''
+        Open the port and start the writer thread. An already open port
+        may be given instead, e.g. the synthetic port of the benchmark.
+        A port just closed by check_mip_port may not open at once:
+        opening is retried for at most PORT_REOPEN_TIMEOUT seconds.
+        Return 0 if connected, -1 otherwise.
+        '''
+        deadline = time.monotonic() + PORT_REOPEN_TIMEOUT
+        while (port is None):
+            try:
+                port = serial.Serial(port=self.port_name, baudrate=self.baudrate,
+                                     timeout=READ_TIMEOUT, write_timeout=WRITE_TIMEOUT)
+            except serial.SerialException:
+                if (time.monotonic() >= deadline):
+                    self.set_property('message_string', 'Error when opening port')
+                    return -1
+                time.sleep(COMMAND_POLL_INTERVAL)
+        self.port = port
         if (self.port.isOpen()):
-            self.message_string = 'Device connected'
-            self.connected = 2
+            write_thread = threading.Thread(target=self.write_commands, args=(self.port,), daemon=True)
+            write_thread.start()
+            self.set_property('message_string', 'Device connected')
+            self.set_property('connected', 2)
             return 0
+        return -1
+
+    def write_commands(self, port):
+        while (port.is_open):
+            self.commands.service(port, block_timeout=COMMAND_POLL_INTERVAL)
+        self.commands.cancel_all()
+
+    def send_command(self, cmd):
+        '''
+        Queue a command for the writer thread. The on_command_complete
+        event is dispatched on the main thread once it is written.
+        '''
+        def command_completed(command):
+            Clock.schedule_once(lambda dt: self.dispatch('on_command_complete', command))
+        return self.commands.put(cmd.encode('utf-8'), callback=command_completed)
+
+    def on_command_complete(self, command):
+        if (not command.succeeded()):
+            self.message_string = 'Could not send command to the board'
 
     def on_connected(self, instance, value):
         if (value == 0):
             self.is_streaming = False
             self.message_string = 'Device disconnected'
+            # Stop reader and writer threads, the board is connected again when plugged back
+            self.stop_reader()
+            if (self.port is not None):
+                self.port.close()
+            # Probed again when scanned, also if the port never disappeared (e.g., board reset)
+            self.port_monitor.forget(self.port_name)
         
     def start_streaming(self):
         if (not (self.connected == 2)):
@@ -84,76 +204,109 @@ class KivySerial(EventDispatcher, metaclass=Singleton):
         
         if (not (self.is_streaming)):
             self.message_string = 'Started streaming'
-            self.port.write('b'.encode('utf-8'))
+            self.stop_reader()
+            # Bytes received before the last stop must not be parsed
+            self.port.reset_input_buffer()
+            self.start_time = time.monotonic()
+            self.start_latency = None
+            self.send_command('b')
             self.is_streaming = True
-            self.read_state = 0
-            read_thread = threading.Thread(target=self.collect_data)
-            read_thread.daemon = True
-            read_thread.start()
+            self.decoder.reset()
+            self.read_thread = threading.Thread(target=self.collect_data, args=(self.port,))
+            self.read_thread.daemon = True
             self.samples_counter = 0
+            self.stats.reset()
+            self.read_thread.start()
+
+    def stop_reader(self):
+        '''
+        Cancel the pending read and wait for the read thread to exit, so
+        that a new one never reads the same port. The thread exits within
+        READ_TIMEOUT even if the read is not cancelled, so it is joined
+        without a timeout. Return the time waited in ms.
+        '''
+        stop_time = time.monotonic()
+        read_thread = self.read_thread
+        self.read_thread = None
+        if (read_thread is not None and read_thread is not threading.current_thread()):
+            try:
+                self.port.cancel_read()
+            except (OSError, TypeError, AttributeError):
+                # Raised by pyserial when the port is closed
+                pass
+            read_thread.join()
+        return (time.monotonic() - stop_time) * 1000
 
-    def collect_data(self):
+    def collect_data(self, port):
         print("Started collect data thread")
-        while(self.is_streaming):
-            self.read_serial_binary()
+        try:
+            while (self.is_streaming and port is self.port):
+                self.read_serial_binary()
+        except (serial.SerialException, OSError, TypeError, AttributeError):
+            # Raised when the board is unplugged, or the port is closed
+            if (self.is_streaming):
+                self.set_property('connected', 0)
 
-    def read_serial_binary(self, max_bytes_to_skip=3000):
+    def read_serial_binary(self):
         '''
-        Parses incoming data packet into a Sample
+        Read the bytes received and parse the data packets with the
+        decoder of WAVEDAC_FRAME. Return the samples in V, None if no
+        complete packet was received.
         Incoming packet structure:
         START_BYTE(1)| DATA_MSB(1) | DATA_LSB(1) | END_BYTE (1)
         '''
-        def read(n):
-            bb = self.port.read(n)
-            if not bb:
-                self.connected = 0
-            else:
-                return bb
-        for rep in range(max_bytes_to_skip):
-            # ---------Start Byte ---------
-            if self.read_state == 0:
-                b = read(1)
-                if (b == -999):
-                    break
-                if struct.unpack('B', b)[0] == 0xA0:
-                    self.read_state = 1
-                    if (rep != 0):
-                        print (f"Skipped {rep} bytes before start")
-                        rep = 0
-            # ---------DATA MSB and LSB---------
-            elif self.read_state == 1:
-                # Read 2 bytes for each
-                b = read(2)
-                unpack = struct.unpack('2B', b)
-                sensor_data = (((unpack[0] << 8) & 0xFFFF) | unpack[1])
-                sensor_data = sensor_data/65535*5
-                self.read_state = 2
-            # ---------End Byte---------
-            elif self.read_state == 2:
-                b = read(1)
-                if struct.unpack('B', b)[0] == 0xC0:
-                    self.read_state = 0
-                    self.samples_counter += 1
-                    for callback in self.callbacks:
-                        callback(sensor_data)
-                    return sensor_data
+        data = self.port.read(max(1, self.port.in_waiting))
+        frames = self.decoder.feed(data)['sample']
+        if (len(frames) == 0):
+            # Also when the read is cancelled by stop_reader
+            return None
+        sensor_data = self.converter.convert(field_values(frames, ('code',), np.uint16))[:, 0]
+        if (self.samples_counter == 0):
+            self.start_latency = (time.monotonic() - self.start_time) * 1000
+            self.set_property('message_string',
+                              f'Started streaming, first sample after {self.start_latency:.0f} ms')
+        self.samples_counter += len(sensor_data)
+        self.stats.add(len(sensor_data))
+        for value in sensor_data.tolist():
+            for callback in self.callbacks:
+                callback(value)
+        return sensor_data
+
+    def update_stats(self, dt):
+        '''
+        Called on the main thread every STATS_UPDATE_INTERVAL seconds:
+        update the sample_rate property when the measured rate changes
+        noticeably.
+        '''
+        if (not self.is_streaming):
+            return
+        rate = self.stats.rate()
+        if (rate > 0 and abs(rate - self.sample_rate) > RATE_CHANGE_TOLERANCE * self.sample_rate):
+            self.sample_rate = round(rate, SAMPLE_RATE_DECIMALS)
+
+    def set_calibration(self, offset=0, gain=1):
+        '''
+        Set offset (in V) and gain applied to the converted samples.
+        '''
+        self.converter.set_calibration([offset], [gain])
 
     def stop_streaming(self):
-        self.message_string = 'Stopped streaming data'
         self.is_streaming = False
-        self.port.write('s'.encode('utf-8'))
+        self.stop_latency = self.stop_reader()
+        self.message_string = f'Stopped streaming data, reader stopped in {self.stop_latency:.0f} ms'
+        self.send_command('s')
 
     def select_wave(self, wave):
         if (wave.upper() == 'SINE'):
-            self.port.write('e'.encode('utf-8'))
+            self.send_command('e')
         elif (wave.upper() == 'TRIANGLE'):
-            self.port.write('f'.encode('utf-8'))
+            self.send_command('f')
 
     def select_range(self, range_val):
         if (range_val.upper() == 'SMALL'):
-            self.port.write('t'.encode('utf-8'))
+            self.send_command('t')
         elif (range_val.upper() == 'LARGE'):
-            self.port.write('y'.encode('utf-8'))
+            self.send_command('y')
     
     def is_connected(self):
         if (self.connected == 2):
@@ -1,3 +1,23 @@
+import argparse
+import os
+import sys
+
+# Shared modules of the examples live in the root of the repository
+_REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if (_REPOSITORY_DIR not in sys.path):
+    sys.path.append(_REPOSITORY_DIR)
+
+from benchmark import add_benchmark_arguments, use_offscreen_window
+
+# Arguments of the GUI are parsed before Kivy is imported, and removed
+# from the command line so that Kivy does not reject them.
+arg_parser = argparse.ArgumentParser(add_help=False)
+add_benchmark_arguments(arg_parser)
+args, sys.argv[1:] = arg_parser.parse_known_args()
+
+if (args.benchmark):
+    use_offscreen_window()
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.lang import Builder
@@ -41,6 +61,7 @@ class ContainerLayout(BoxLayout):
         
     def on_graph_w(self, instance, value):
         self.serial.add_callback(self.graph_w.update_plot)
+        self.serial.bind(sample_rate=self.graph_w.update_sample_rate)
         
     def connection_event(self, instance, value):
         if (self.serial.is_connected()):
@@ -60,4 +81,9 @@ class PSoCKivy(App):
     def build(self):
         return ContainerLayout()
 
+    def on_start(self):
+        if (args.benchmark):
+            from benchmark import start_benchmark
+            self.benchmark = start_benchmark(self.root, args)
+
 PSoCKivy().run()
\ No newline at end of file
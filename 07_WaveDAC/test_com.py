@@ -1,5 +1,13 @@
 #!/usr/bin/python3
 
+import os
+import sys
+
+# Shared modules of the examples live in the root of the repository
+_REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if (_REPOSITORY_DIR not in sys.path):
+    sys.path.append(_REPOSITORY_DIR)
+
 from communication import *
 
 ks = KivySerial()
@@ -18,33 +26,15 @@ print("buffer empty.")
 # Start streaming
 ks.port.write('b'.encode('utf-8'))
 ks.is_streaming = 1
-
-skipped_bytes = 0
-b = 0
+ks.samples_counter = 0
+ks.start_time = time.monotonic()
 
 while ks.is_streaming:
-
-    while b != 160:
-        skipped_bytes += 1
-        b = ks.port.read(1)
-        if len(b) > 0:
-            b = struct.unpack('B', b)[0]
-        #print(b)
-
-    print(f"Skipped {skipped_bytes} bytes before 0xA0")
-    skipped_bytes = 0
-
-    data = ks.port.read(3)
-    data = struct.unpack('3B', data)
-    print(f"raw data = {data[0]} {data[1]}")
-    sensor_data = (((data[0] << 8) & 0xFFFF) | data[1])
-    sensor_data = sensor_data/65535*5
-    if data[2] == 192:
-        # valid sample
-        print(f"Sample {ks.samples_counter}: {sensor_data}")
-        ks.samples_counter += 1
-        b = ks.port.read(1)
-        b = struct.unpack('B', b)[0]
-        print(b)
-    else:
-        print("Invalid data.")
+    skipped_bytes = ks.decoder.skipped_bytes
+    sensor_data = ks.read_serial_binary()
+    if (ks.decoder.skipped_bytes > skipped_bytes):
+        print(f"Skipped {ks.decoder.skipped_bytes - skipped_bytes} bytes before 0xA0")
+    if (sensor_data is not None):
+        for value in sensor_data.tolist():
+            print(f"Sample: {value}")
+        print(f"{ks.samples_counter} samples")
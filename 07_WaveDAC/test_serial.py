@@ -1,7 +1,16 @@
 #!/usr/bin/python3
 
+import os
+import sys
+
+# Shared modules of the examples live in the root of the repository
+_REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if (_REPOSITORY_DIR not in sys.path):
+    sys.path.append(_REPOSITORY_DIR)
+
 import serial
-import struct
+from communication import DAC_FULL_SCALE, WAVEDAC_FRAME
+from common.frames import FrameDecoder
 
 s = serial.Serial('/dev/ttyACM1', baudrate=115200, timeout=1)
 
@@ -17,32 +26,15 @@ print("buffer empty.")
 s.write('b'.encode('utf-8'))
 streaming = 1
 
-skipped_bytes = 0
-b = 0
+decoder = FrameDecoder([WAVEDAC_FRAME])
 samples_counter = 0
 
 while streaming:
-    while b != 160:
-        skipped_bytes += 1
-        b = s.read(1)
-        if len(b) > 0:
-            b = struct.unpack('B', b)[0]
-        #print(b)
-
-    print(f"Skipped {skipped_bytes} bytes before 0xA0")
-    skipped_bytes = 0
-
-    data = s.read(3)
-    data = struct.unpack('3B', data)
-    print(f"raw data = {data[0]} {data[1]}")
-    sensor_data = (((data[0] << 8) & 0xFFFF) | data[1])
-    sensor_data = sensor_data/65535*5
-    if data[2] == 192:
-        # valid sample
-        print(f"Sample {samples_counter}: {sensor_data}")
+    skipped_bytes = decoder.skipped_bytes
+    frames = decoder.feed(s.read(max(1, s.in_waiting)))['sample']
+    if (decoder.skipped_bytes > skipped_bytes):
+        print(f"Skipped {decoder.skipped_bytes - skipped_bytes} bytes before 0xA0")
+    for code in frames['code'].tolist():
+        sensor_data = code / 65535 * DAC_FULL_SCALE
+        print(f"Sample {samples_counter}: raw data = {code >> 8} {code & 0xFF}, {sensor_data}")
         samples_counter += 1
-        b = s.read(1)
-        b = struct.unpack('B', b)[0]
-        print(b)
-    else:
-        print("Invalid data.")
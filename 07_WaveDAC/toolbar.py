@@ -1,7 +1,14 @@
+from kivy.clock import Clock
+from kivy.core.window import Keyboard, Window
+from kivy.logger import Logger
 from kivy.properties import NumericProperty, ObjectProperty, StringProperty
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.popup import Popup
 from communication import KivySerial
+from common.profiler import DEFAULT_PROFILE_DURATION, StackSampler
+
+# Key starting and stopping the profiler
+PROFILE_HOTKEY = 'f12'
 
 class Toolbar(BoxLayout):
     """
@@ -16,8 +23,52 @@ class Toolbar(BoxLayout):
     """
     message_string = StringProperty("")
 
+    """
+    @brief Button starting and stopping the profiler.
+    """
+    profile_button = ObjectProperty(None)
+
     def __init__(self, **kwargs):
+        self.sampler = None     # profiler, while a profile is being taken
         super(Toolbar, self).__init__(**kwargs)
+        Window.bind(on_key_down=self.on_key_down)
+
+    def on_key_down(self, window, key, scancode, codepoint, modifiers):
+        """
+        @brief Toggle the profiler with the hotkey.
+        """
+        if (key == Keyboard.keycodes[PROFILE_HOTKEY]):
+            self.toggle_profile()
+            return True
+        return False
+
+    def toggle_profile(self):
+        """
+        @brief Start a profile of all the threads, or end the current one.
+
+        Stacks of the main and reader threads are sampled for
+        DEFAULT_PROFILE_DURATION seconds, and written as collapsed
+        stacks with a report of the memory allocations.
+        """
+        if (self.sampler is not None):
+            self.sampler.stop()
+            return
+        self.sampler = StackSampler(DEFAULT_PROFILE_DURATION, callback=self.profile_written)
+        self.sampler.start()
+        self.profile_button.text = 'Stop Profile'
+        self.message_string = f'Profiling for {DEFAULT_PROFILE_DURATION:.0f} s...'
+
+    def profile_written(self, paths):
+        """
+        @brief Called by the thread of the profiler once the files are written.
+        """
+        Clock.schedule_once(lambda dt: self.profile_done(paths))
+
+    def profile_done(self, paths):
+        self.sampler = None
+        self.profile_button.text = 'Profile'
+        self.message_string = 'Profile written to ' + ', '.join(paths)
+        Logger.info(f'Profiler: {self.message_string}')
 
     def wave_select_dialog(self):
         """
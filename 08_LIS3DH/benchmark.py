@@ -0,0 +1,113 @@
+##
+# @package benchmark
+#
+#   Headless benchmark of the GUI, enabled with the --benchmark flag.
+#
+#   The board is replaced by a common.benchmark.SyntheticPort streaming
+#   packets at --benchmark-rate, all the plots show --benchmark-window
+#   seconds, and the JSON report of common.benchmark.FrameBenchmark is
+#   written to --benchmark-output (or printed):
+#
+#       python main.py --benchmark --benchmark-rate 1000 --benchmark-window 60
+
+import os
+import numpy as np
+
+from lis3dh.acquire import (CONNECTION_CMD, DATA_FRAME, SENSITIVITY, DEFAULT_FULL_SCALE_RANGE,
+                            DEFAULT_RESOLUTION)
+from common.benchmark import DEFAULT_DURATION, DEFAULT_WARMUP, FrameBenchmark, SyntheticPort
+
+##
+#   @brief          Command line flag enabling the benchmark.
+BENCHMARK_FLAG = '--benchmark'
+
+##
+#   @brief          Response of the synthetic board to the connection command.
+SYNTHETIC_BANNER = b'LIS3DH $$$\r\n'
+
+##
+#   @brief          Frequency in Hz of the synthetic acceleration.
+SYNTHETIC_FREQUENCY = 1.0
+
+
+##
+#   @brief          Add the arguments of the benchmark to the parser of the GUI.
+def add_benchmark_arguments(parser):
+    parser.add_argument(BENCHMARK_FLAG, action='store_true',
+                        help='run a headless benchmark with a synthetic board')
+    parser.add_argument('--benchmark-rate', type=float, default=200,
+                        help='sample rate in Hz of the synthetic board (default: %(default)s)')
+    parser.add_argument('--benchmark-window', type=float, default=20,
+                        help='seconds shown by the plots (default: %(default)s)')
+    parser.add_argument('--benchmark-duration', type=float, default=DEFAULT_DURATION,
+                        help='duration in seconds of the measurements (default: %(default)s)')
+    parser.add_argument('--benchmark-output', default=None,
+                        help='path of the JSON report (default: printed)')
+
+
+##
+#   @brief          Use an offscreen window, unless a video driver is chosen.
+#
+#   Must be called before Kivy is imported.
+def use_offscreen_window():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+
+
+##
+#   @brief          Bytes of n data packets, with a sine on x and gravity on z.
+#
+#   @param[in]      first_index: index of the first packet.
+#   @param[in]      n: number of packets.
+#   @param[in]      sample_rate: sample rate in Hz.
+def make_packets(first_index, n, sample_rate):
+    t = np.arange(first_index, first_index + n) / sample_rate
+    g = 1000. / SENSITIVITY[DEFAULT_FULL_SCALE_RANGE][DEFAULT_RESOLUTION]
+    codes = np.zeros((n, 3))
+    codes[:, 0] = 0.5 * g * np.sin(2 * np.pi * SYNTHETIC_FREQUENCY * t)
+    codes[:, 1] = 0.5 * g * np.cos(2 * np.pi * SYNTHETIC_FREQUENCY * t)
+    codes[:, 2] = g
+    # Left-justified codes, as sent by the board
+    codes = (codes.astype(np.int16) << (16 - DEFAULT_RESOLUTION)).view(np.uint16)
+    return DATA_FRAME.encode(dict(zip(DATA_FRAME.field_names, codes.T)), n)
+
+
+##
+#   @brief          Connect the app to a synthetic board and start the benchmark.
+#
+#   @param[in]      root: the ContainerLayout of the app.
+#   @param[in]      args: parsed command line arguments.
+#   @return         the common.benchmark.FrameBenchmark, which must be kept
+#                   referenced, as the Kivy clock keeps weak references only.
+def start_benchmark(root, args):
+    acquisition = root.serial.acquisition
+    acquisition.stop_discovery()
+    rate = args.benchmark_rate
+    port = SyntheticPort(lambda first_index, n: make_packets(first_index, n, rate), rate,
+                         banner=SYNTHETIC_BANNER, timeout=0.05)
+    acquisition.port_name = 'synthetic'
+    if (acquisition.attach_port(port) != 0):
+        raise RuntimeError('Could not connect to the synthetic board')
+    for tab in root.graph_w.tab_list:
+        plot = getattr(tab, 'plot', None)
+        if (plot is not None):
+            plot.n_seconds = args.benchmark_window
+
+    def board_configured(command):
+        # Called by the I/O thread after the sample rate set upon connection,
+        # so that the rate of the synthetic board is not overwritten.
+        acquisition.sample_rate = rate
+        from kivy.clock import Clock
+        Clock.schedule_once(lambda dt: root.streaming())
+    acquisition.send_command(CONNECTION_CMD, callback=board_configured)
+
+    def collect():
+        return {'samples': acquisition.samples_counter,
+                'measured_rate_hz': round(acquisition.stats.mean_rate(), 2),
+                'start_latency_ms': (None if (acquisition.start_latency is None)
+                                     else round(acquisition.start_latency, 2))}
+    benchmark = FrameBenchmark(args.benchmark_duration, DEFAULT_WARMUP, args.benchmark_output,
+                               info={'app': 'LIS3DH', 'rate_hz': rate,
+                                     'window_s': args.benchmark_window},
+                               collect=collect)
+    benchmark.start()
+    return benchmark
@@ -46,7 +46,7 @@ class BottomBar(BoxLayout):
             self.connection_label.update_color(0, 0.5, 0)
             self.connection_label.color = (1, 1, 1, 1)
         else:
-            self.connection_label.update_color(0.3, 0.3, 0.3, 1.0)
+            self.connection_label.update_color(0.3, 0.3, 0.3)
             self.connection_label.color = (1, 1, 1, 1)
         
 ##
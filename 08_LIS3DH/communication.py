@@ -1,54 +1,22 @@
 ##
 # @package communication
+#
+#   Kivy adapter around the acquisition core in \ref lis3dh.acquire.
 
-from datetime import datetime
+import threading
+from kivy.clock import Clock
 from kivy.event import EventDispatcher
 from kivy.properties import NumericProperty, StringProperty  # pylint: disable=no-name-in-module
-import serial
-import serial.tools.list_ports as list_ports
-import struct
-import threading
-import time
-
-##
-#   @brief          Data packet header.
-#
-DATA_PACKET_HEADER = 0xA0
+from lis3dh.acquire import (CONNECTION_CMD, CONNECTION_STATE_CONNECTED,  # noqa: F401
+                            CONNECTION_STATE_DISCONNECTED, CONNECTION_STATE_FOUND,
+                            DATA_PACKET_HEADER, DATA_PACKET_TAIL, DEFAULT_FULL_SCALE_RANGE,
+                            DEFAULT_RESOLUTION, START_STREAMING_CMD,
+                            STOP_STREAMING_CMD, LIS3DHAcquisition, LIS3DHDataPacket)
+from lis3dh.calibration import DEFAULT_CALIBRATION_SAMPLES
 
 ##
-#   @brief          Data packet tail.
-#
-DATA_PACKET_TAIL = 0xC0
-
-##
-#   @brief          Command to start connection with board.
-#
-CONNECTION_CMD = 'v'
-
-##
-#   @brief          Command to start streaming from the board.
-#
-START_STREAMING_CMD = 'b'
-
-##
-#   @brief          Command to stop streaming from the board.
-#
-STOP_STREAMING_CMD = 's'
-
-##
-#   @brief          Disconnected port state.
-#
-CONNECTION_STATE_DISCONNECTED = 0
-
-##
-#   @brief          Port found state.
-#
-CONNECTION_STATE_FOUND = 1
-
-##
-#   @brief          Connected state.
-#
-CONNECTION_STATE_CONNECTED = 2
+#   @brief          Interval in seconds between updates of the streaming statistics.
+STATS_UPDATE_INTERVAL = 0.5
 
 ##
 #   @brief          Class used for Singleton pattern.
@@ -72,14 +40,17 @@ class Singleton(type):
 ##
 #   @brief          Main class used for serial communication.
 #
-#   This is the main class used to communicate with the serial port.
+#   This is the main class used by the GUI to communicate with the board.
 #   It has \ref Singleton as a metaclass, so only one instance of this
 #   class exists throughout the application.
-#   Automatic port discovery is implemented: it is not required to
-#   specify the serial port, as it is automatically detected by
-#   scanning all the available ports, and sending a known command
-#   to the port. If the expected response is detected, then
-#   a connection with the serial port is carried out.
+#   All the work is carried out by a \ref lis3dh.acquire.LIS3DHAcquisition
+#   object: this class only mirrors its state into Kivy properties, so
+#   that they can be bound to widgets. Properties are always changed on
+#   the main thread, whichever thread changed the acquisition state, and
+#   completed commands are dispatched on the main thread with the
+#   on_command_complete event. While streaming, the number of samples
+#   and the sample rate are shown in \ref message_string every
+#   \ref STATS_UPDATE_INTERVAL seconds.
 
 
 class KivySerial(EventDispatcher, metaclass=Singleton):
@@ -111,302 +82,176 @@ class KivySerial(EventDispatcher, metaclass=Singleton):
     #
     sample_rate = NumericProperty(1)
 
+    ##
+    #   @brief          Full scale range in g set on the board.
+    full_scale_range = NumericProperty(DEFAULT_FULL_SCALE_RANGE)
+
+    ##
+    #   @brief          Resolution in bits set on the board.
+    resolution = NumericProperty(DEFAULT_RESOLUTION)
+
     ##
     #  @brief           Initialize the class.
     #
     #  @param[in]       baudrate: the desired baudrate for serial communication.
+    #  @param[in]       acquisition: optional acquisition object to be used instead
+    #                   of the serial port (e.g., a \ref lis3dh.network.NetworkSource).
     #
-    def __init__(self, baudrate=115200):
-
-        self.port_name = ""         # port name, set later when port is found
-        self.baudrate = baudrate    # baudrate for serial communication
-        self.is_streaming = False   # streaming status
-        self.connected = 0          # connection status
-        self.read_state = 0         # read state for data parser
-        self.callbacks = []         # list of callbacks to be called when new data are available
-        self.samples_counter = 0    # counter for samples received
-        self.initial_time = 0       # time of first sample received
-        self.timeout = 1
+    def __init__(self, baudrate=115200, acquisition=None):
+        self.register_event_type('on_command_complete')
+        super(KivySerial, self).__init__()
+        if (acquisition is None):
+            acquisition = LIS3DHAcquisition(baudrate=baudrate)
+        self.acquisition = acquisition
+        self.acquisition.add_listener(self.acquisition_event)
+        Clock.schedule_interval(self.update_stats, STATS_UPDATE_INTERVAL)
         # Start thread for automatic port discovery
-        find_port_thread = threading.Thread(target=self.find_port, daemon=True)
-        find_port_thread.start()
+        self.acquisition.start_discovery()
 
     ##
-    #  @brief           Add callback to be called upon packet reception.
+    #  @brief           Mirror a state change of the acquisition core.
     #
-    #  @param[in]       callback: the callback function to be called.
+    #  @param[in]       name: name of the changed state.
+    #  @param[in]       value: new value of the state.
     #
-    def add_callback(self, callback):
-        if (callback not in self.callbacks):
-            self.callbacks.append(callback)
-
-    ##
-    #   @brief          Automatic serial port discovery.
-    #   
-    #   This function scans all the available COM ports to
-    #   check if one of them is the proper one. It does it
-    #   by sending a \ref CONNECTION_CMD and checking that
-    #   the expected string is received.
-    def find_port(self):
-        port_found = False
-        time.sleep(2)
-        while (not port_found):
-            ports = list_ports.comports()
-            if (len(ports) == 0):
-                self.message_string = 'No ports found.. Check your connections'
-                time.sleep(2)
-            for port in ports:
-                port_found = self.check_lis3dh_port(port.device)
-                if (port_found):
-                    self.port_name = port.device
-                    if (self.connect() == 0):
-                        break
+    def acquisition_event(self, name, value):
+        if (name == 'command'):
+            Clock.schedule_once(lambda dt: self.dispatch('on_command_complete', value))
+        elif (threading.current_thread() is threading.main_thread()):
+            setattr(self, name, value)
+        else:
+            # Bound to widgets, which must be updated on the main thread
+            Clock.schedule_once(lambda dt: setattr(self, name, value))
 
     ##
-    #   @brief              Check if the port is the desired one.
-    #
-    #   This function sends a \ref CONNECTION_CMD to the port,
-    #   and checks if three $$$ are found in the response from
-    #   the port.
-    #
-    #   @param[in]          port_name: the name of the port to be checked
-    #   @return             True if check was successfull, False otherwise.
+    #  @brief           Show the streaming statistics in \ref message_string.
     #
-    def check_lis3dh_port(self, port_name):
-        self.message_string = 'Checking: {}'.format(port_name)
-        try:
-            port = serial.Serial(
-                port=port_name, baudrate=self.baudrate, write_timeout=0, timeout=5)
-            if (port.is_open):
-                port.write(CONNECTION_CMD.encode('utf-8'))
-                time.sleep(2)
-                received_string = ''
-                while (port.in_waiting > 0):
-                    received_string += port.read().decode('utf-8', errors='replace')
-                if ('$$$' in received_string and 'LIS' in received_string):
-                    self.message_string = 'Device found on port: {}'.format(
-                        port_name)
-                    self.connected = CONNECTION_STATE_FOUND
-                    port.close()
-                    time.sleep(2)
-                    return True
-        except serial.SerialException:
-            return False
-        except ValueError:
-            return False
-        return False
-
-    ##
-    #   @brief          Connect to the serial port that was found.
+    #  Called on the main thread every \ref STATS_UPDATE_INTERVAL seconds.
     #
-    #   @return         0 if connection was successful, -1 otherwise
-    def connect(self):
-        try:
-            self.port = serial.Serial(
-                port=self.port_name, baudrate=self.baudrate, timeout=self.timeout)
-        except serial.SerialException:
-            self.message_string = f'Error when opening port'
-            return -1
-        if (self.port.is_open):
-            self.message_string = f'Device connected at {self.port_name}'
-            self.update_sample_rate_on_board('1 Hz')
-            self.connected = CONNECTION_STATE_CONNECTED
-            return 0
-        return -1
+    def update_stats(self, dt):
+        acquisition = self.acquisition
+        if (acquisition.is_streaming and acquisition.samples_counter > 0):
+            message = (f'Samples: {acquisition.samples_counter:6d} | '
+                       f'Sample Rate: {acquisition.current_sample_rate:5.2f} Hz')
+            recorder = acquisition.recorder
+            if (recorder is not None):
+                message += f' | Recorded: {recorder.samples_written:6d}'
+            self.message_string = message
 
     ##
-    #   @brief          Start streaming data from the device.
+    #  @brief           Default handler of the on_command_complete event.
     #
-    #   This function sends the proper command to start data 
-    #   streaming, and initiates a thread to collec data
-    #   received from the serial port.
+    #  @param[in]       command: the completed \ref common.commands.Command.
     #
-    def start_streaming(self):
-        if (self.connected == CONNECTION_STATE_CONNECTED):
-            if (not (self.is_streaming)):
-                self.message_string = 'Starting data streaming'
-                self.port.write(START_STREAMING_CMD.encode('utf-8'))
-                self.is_streaming = True
-                self.read_state = 0
-                self.skipped_bytes = 0
-                self.samples_counter = 0
-                read_thread = threading.Thread(target=self.collect_data)
-                read_thread.daemon = True
-                read_thread.start()
-        else:
-            self.message_string = 'Device is not connected.'
+    def on_command_complete(self, command):
+        pass
 
     ##
-    #   @brief          Target function for thread collecting data.
-    #
-    #   This function receives packets from the serial port and
-    #   streams them to all the callbacks that were added. It also
-    #   updates the computed sample rate.
-    def collect_data(self):
-        while(self.is_streaming):
-            packet = self.read_serial_binary()
-            if (packet):
-                for callback in self.callbacks:
-                    callback(packet)
-                self.update_sample_rate()
+    #  @brief           Streaming status.
+    @property
+    def is_streaming(self):
+        return self.acquisition.is_streaming
 
     ##
-    #   @brief          Compute new sample rate value upon reception of a packet.
+    #  @brief           Add callback to be called upon packet reception.
     #
-    def update_sample_rate(self):
-        if (self.samples_counter == 0):
-            self.initial_time = datetime.now()
-        else:
-            diff = (datetime.now() - self.initial_time).total_seconds()
-            if (diff != 0):
-                self.current_sample_rate = (self.samples_counter+1) / diff
-                self.message_string = f'Samples: {self.samples_counter:6d} | Sample Rate: {self.current_sample_rate:5.2f} Hz'
-        self.samples_counter += 1
+    #  @param[in]       callback: the callback function to be called.
+    #
+    def add_callback(self, callback):
+        self.acquisition.add_callback(callback)
 
     ##
-    #   @brief          Serial data parser.
+    #  @brief           Add callback to be called with each batch of samples, as an array.
     #
-    #   State machine to parse incoming data packet into a \ref LIS3DHDataPacket
-    #   The structure of the incoming packet is as follows:
-    #       - Header byte: 0xA0
-    #       - X Axis data: 2 bytes
-    #       - Y Axis data: 2 bytes
-    #       - Z Axis data: 2 bytes
-    #       - Tail byte: 0xC0
+    #  The callback is called by the I/O thread with a structured array of
+    #  \ref lis3dh.acquire.SAMPLE_DTYPE (fields t, x, y, z).
     #
-    #   @param[in]      max_bytes_to_skip: optional number of bytes to skip when looking for header byte
-    #   @return         \ref LIS3DHDataPacket packet with accelerometer data
+    #  @param[in]       callback: the callback function to be called.
     #
-    def read_serial_binary(self, max_bytes_to_skip=3000):
-        for rep in range(max_bytes_to_skip):
-            if (not self.is_streaming):
-                break
-            if (self.read_state == 0):
-                # State 0, looking for header byte
-                b = self.port.read(1)
-                if (len(b) > 0):
-                    b = struct.unpack('B', b)[0]
-                    if (b == DATA_PACKET_HEADER):
-                        if (rep > 0):
-                            print(f'Skipped {rep} bytes')
-                        rep = 0
-                        self.read_state = 1
-            elif (self.read_state == 1):
-                # Get six bytes of acceleration data
-                data = self.port.read(6)
-                if (len(data) == 6):
-                    data = struct.unpack('6B', data)
-                    x_data = self.convert_acc_data(data[0:2])
-                    y_data = self.convert_acc_data(data[2:4])
-                    z_data = self.convert_acc_data(data[4:])
-                    self.read_state = 2
-                else:
-                    self.read_state = 0
-            elif (self.read_state == 2):
-                tail_byte = self.port.read(1)
-                if (len(tail_byte) == 1):
-                    # We have a valid byte
-                    tail_byte = struct.unpack('B', tail_byte)[0]
-                    if (tail_byte == DATA_PACKET_TAIL):
-                        packet = LIS3DHDataPacket(x_data, y_data, z_data)
-                        self.read_state = 0
-                        return packet
-                else:
-                    # Reset state machine
-                    self.read_state = 0
+    def add_record_callback(self, callback):
+        self.acquisition.add_record_callback(callback)
 
     ##
-    #   @brief          Convert acceleration data in float format.
+    #  @brief           Remove callback previously added with \ref add_callback or \ref add_record_callback.
     #
-    #   This function converts raw bytes into a float value representing
-    #   acceleration data. Check is done on negative/positive data based
-    #   on 2's complement notation. Conversion is based on normal mode,
-    #   +/- 2g settings.
-    #   @param[in]      data: two bytes representing acceleration
-    #   @return         float formatted acceleration value
+    #  @param[in]       callback: the callback function to be removed.
     #
-    def convert_acc_data(self, data):
-        try:
-            temp_data = data[0] << 8 | data[1]
-        except:
-            return data
-        if (temp_data & 0x8000):
-            # We have a negative number
-            temp_data = 0xFFFF - temp_data
-            temp_data = temp_data + 1
-            temp_data = - temp_data
-        temp_data = temp_data >> 6  # 6-byte shift since we are in normal mode
-        temp_data = temp_data * 4   # Sensitivity of 4 mg/digit in normal mode, +/-2g
-        return temp_data / 1000.
+    def remove_callback(self, callback):
+        self.acquisition.remove_callback(callback)
+
+    ##
+    #   @brief          Start streaming data from the device.
+    def start_streaming(self):
+        self.acquisition.start_streaming()
 
     ##
     #   @brief          Stop data streaming.
-    #
-    #   Stop data streaming and show statistics on collected data.
     def stop_streaming(self):
-        self.is_streaming = False
-        if (self.samples_counter == 0):
-            self.message_string = f'Stopped streaming data'
-        else:
-            self.message_string = f'Stopped streaming data. Collected {self.samples_counter:d} samples with {self.current_sample_rate:.2f} Hz sample rate.'
-        self.port.write(STOP_STREAMING_CMD.encode('utf-8'))
+        self.acquisition.stop_streaming()
 
     ##
     #   @brief          Update sample rate on board
     #
-    #   Update the accelerometer sample rate based on selected value.
     #   @param[in]      value: the desired sample rate to be set.
+    #   @return         the queued command, None if no command was sent.
     def update_sample_rate_on_board(self, value):
-        sample_rate_dict = {
-            '1 Hz': '0',
-            '10 Hz': '1',
-            '25 Hz': '2',
-            '50 Hz': '3',
-            '100 Hz': '4',
-            '200 Hz': '5'
-        }
-        if (self.port.is_open):
-            try:
-                self.port.write(sample_rate_dict[value].encode('utf-8'))
-                self.message_string = f'Updated sample rate to {value}'
-                self.sample_rate = int(value.split(' ')[0])
-            except:
-                self.message_string = "Could not update sample rate"
+        return self.acquisition.update_sample_rate_on_board(value)
 
     ##
-    #   @brief          Get if serial port is connected.
-    #   @return         True if connected, False otherwise
-    def is_connected(self):
-        if (self.connected == CONNECTION_STATE_CONNECTED):
-            return True
-        else:
-            return False
+    #   @brief          Select full scale range on board
+    #
+    #   @param[in]      value: the desired full scale range (e.g., '+/-4g').
+    #   @return         the queued command, None if no command was sent.
+    def select_range(self, value):
+        return self.acquisition.select_range(value)
 
-##
-#   @brief          Class holding a packet of accelerometer data.
-class LIS3DHDataPacket():
+    ##
+    #   @brief          Select resolution mode on board
+    #
+    #   @param[in]      value: the desired resolution mode (e.g., 'Normal (10 bit)').
+    #   @return         the queued command, None if no command was sent.
+    def select_resolution(self, value):
+        return self.acquisition.select_resolution(value)
+
+    ##
+    #   @brief          Set the calibration of the axes.
+    #
+    #   @param[in]      offsets: x, y, z offsets in g.
+    #   @param[in]      gains: x, y, z gains.
+    def set_calibration(self, offsets=None, gains=None):
+        self.acquisition.set_calibration(offsets, gains)
 
     ##
-    #   @brief          Initialization function.
-    #   @param[in]      x_data: x axis acceleration
-    #   @param[in]      y_data: y axis acceleration
-    #   @param[in]      z_data: z axis acceleration
-    def __init__(self, x_data, y_data, z_data):
-        self.x_data = x_data
-        self.y_data = y_data
-        self.z_data = z_data
+    #   @brief          Start measuring the positions of a calibration.
+    #   @return         the \ref lis3dh.calibration.CalibrationSession.
+    def start_calibration(self, n_samples=DEFAULT_CALIBRATION_SAMPLES):
+        return self.acquisition.start_calibration(n_samples)
 
     ##
-    #   @brief          Get x axis acceleration.
-    def get_x_data(self):
-        return self.x_data
+    #   @brief          Stop the calibration, storing the new profile if given.
+    def stop_calibration(self, profile=None):
+        self.acquisition.stop_calibration(profile)
 
     ##
-    #   @brief          Get y axis acceleration.
-    def get_y_data(self):
-        return self.y_data
+    #   @brief          Start recording the acquired samples to file.
+    #
+    #   @param[in]      path: path of the recording file.
+    def start_recording(self, path):
+        self.acquisition.start_recording(path)
 
     ##
-    #   @brief          Get z axis acceleration.
-    def get_z_data(self):
-        return self.z_data
+    #   @brief          Stop recording and close the recording file.
+    def stop_recording(self):
+        self.acquisition.stop_recording()
+
+    ##
+    #   @brief          Recording status.
+    @property
+    def is_recording(self):
+        return self.acquisition.recorder is not None
+
+    ##
+    #   @brief          Get if serial port is connected.
+    #   @return         True if connected, False otherwise
+    def is_connected(self):
+        return self.acquisition.is_connected()
@@ -1,14 +1,26 @@
-from datetime import datetime
-from decimal import Decimal
-from kivy.lang import Builder
-from kivy.uix.textinput import TextInput
+from kivy.clock import Clock
+from kivy.core.window import Window
 from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.label import Label
-from kivy.properties import BooleanProperty, ObjectProperty, NumericProperty  # pylint:disable=no-name-in-module
-import re
-from kivy.garden.graph import LinePlot  # pylint:disable=no-name-in-module, import-error
-from math import pow, isclose
+from kivy.properties import (BooleanProperty, ObjectProperty,  # pylint:disable=no-name-in-module
+                             StringProperty)
+from lis3dh.dataflow import create_dataflow
+from lis3dh.triggers import (EventStore, LevelTrigger, MagnitudeTrigger, RMSTrigger,
+                             SlopeTrigger, TriggerEngine)
+from common.plotting.streaming_plot import StreamingPlot  # pylint:disable=unused-import
+from common.plotting.spectrogram import Spectrogram  # pylint:disable=unused-import
+import numpy as np
+
+##
+#   @brief              Interval in seconds between plot updates.
+PLOT_UPDATE_INTERVAL = 1 / 30.
+
+##
+#   @brief              Directory where trigger events are saved.
+EVENTS_DIRECTORY = 'events'
+
+##
+#   @brief              Length in seconds of the window of the RMS trigger.
+RMS_WINDOW_SECONDS = 0.1
 
 ##
 #   @brief              Main tabbed panel to show tabbed items in the GUI.
@@ -20,10 +32,61 @@ class GraphTabs(TabbedPanel):
     acc_tab = ObjectProperty(None)
 
     ##
-    #   @brief          Update plots with new packet of data
-    #   @param[in]      packet: new packet of data.
-    def update_plot(self, packet):
-        self.acc_tab.update_plot(packet)
+    #   @brief          Reference to trigger events tabbed item.
+    trigger_tab = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to spectrogram tabbed item.
+    spectrogram_tab = ObjectProperty(None)
+
+    def __init__(self, **kwargs):
+        self.dataflow = create_dataflow()   # derived channels shown by the derived tabs
+        super(GraphTabs, self).__init__(**kwargs)
+        Window.bind(on_minimize=lambda *args: self.set_window_visible(False),
+                    on_hide=lambda *args: self.set_window_visible(False),
+                    on_restore=lambda *args: self.set_window_visible(True),
+                    on_show=lambda *args: self.set_window_visible(True))
+
+    ##
+    #   @brief          Suspend or resume drawing of the plots when the window is minimized or restored.
+    #   @param[in]      visible: True if the window is visible.
+    def set_window_visible(self, visible):
+        for tab in self.tab_list:
+            if (isinstance(tab, (LIS3DHTabbedPanelItem, SpectrogramTabbedPanelItem))):
+                tab.window_visible = visible
+
+    ##
+    #   @brief          Read samples to be plotted from a shared memory ring.
+    #
+    #   New samples are read on the main thread every \ref PLOT_UPDATE_INTERVAL
+    #   seconds, directly from the ring.
+    #   @param[in]      sample_bus: the \ref lis3dh.sample_bus.SampleBus to be read.
+    def attach_sample_bus(self, sample_bus):
+        self.bus_reader = sample_bus.reader()
+        Clock.schedule_interval(self.read_sample_bus, PLOT_UPDATE_INTERVAL)
+
+    ##
+    #   @brief          Plot new samples available on the shared memory ring.
+    def read_sample_bus(self, dt):
+        spans = self.bus_reader.read()
+        if (spans):
+            if (not self.trigger_tab.frozen):
+                self.update_plot(spans)
+            self.trigger_tab.process(spans)
+
+    ##
+    #   @brief          Update plots with new samples.
+    #
+    #   Derived channels are only computed for the derived tab being shown.
+    #   @param[in]      spans: list of arrays of x, y, z samples.
+    def update_plot(self, spans):
+        self.acc_tab.update_plot(spans)
+        self.spectrogram_tab.update_plot(spans)
+        tab = self.current_tab
+        channels = [tab.channel] if isinstance(tab, DerivedTabbedPanelItem) else []
+        outputs = [self.dataflow.process(samples, channels) for samples in spans]
+        if (channels):
+            tab.update_plot([output[tab.channel] for output in outputs])
 
     ##
     #   @brief          Update sample rate value in plots.
@@ -31,346 +94,327 @@ class GraphTabs(TabbedPanel):
     #   @param[in]      value: new sample rate value
     def update_sample_rate(self, instance, value):
         self.acc_tab.update_sample_rate(value)
+        self.trigger_tab.update_sample_rate(value)
+        self.spectrogram_tab.update_sample_rate(value)
+        self.dataflow.set_sample_rate(value)
+        for tab in self.tab_list:
+            if (isinstance(tab, DerivedTabbedPanelItem)):
+                tab.update_sample_rate(value)
+
+    ##
+    #   @brief          Update full scale range value in plots.
+    #   @param[in]      instance: object calling the update function
+    #   @param[in]      value: new full scale range in g
+    def update_full_scale_range(self, instance, value):
+        self.acc_tab.update_full_scale_range(value)
 
 ##
 #   @brief          Tabbed panel item to show acceleration data.
 #
+#   Samples are always stored, but plots are only redrawn (and autoscaled)
+#   while the tab is \ref visible; a single redraw catches up when it
+#   becomes visible again.
+#
 class LIS3DHTabbedPanelItem(TabbedPanelItem):
 
+    ##
+    #   @brief          Reference to the streaming plot widget.
+    plot = ObjectProperty(None)
 
     ##
-    #   @brief          Reference to graph widget.
-    graph = ObjectProperty(None)
+    #   @brief          True if the window showing the tab is not minimized.
+    window_visible = BooleanProperty(True)
 
     ##
-    #   @brief          Reference to plot settings widget.
-    plot_settings = ObjectProperty(None)
+    #   @brief          True if the tab is the current tab of a visible window.
+    visible = BooleanProperty(False)
 
     ##
-    #   @brief          Autoscale setting.
-    autoscale = BooleanProperty(False)
+    #   @brief          Colors of the plotted channels.
+    plot_colors = [(0.75, 0.4, 0.4, 1.0), (0.4, 0.4, 0.75, 1.0), (0.4, 0.75, 0.4, 1.0)]
 
-    def __init__(self, **kwargs):
-        self.max_seconds = 20                # Maximum number of seconds to show
-        self.n_seconds = self.max_seconds    # Initial number of samples to be shown
-        self.x_axis_n_points_collected = []  # Number of new collected points for x axis
-        self.y_axis_n_points_collected = []  # Number of new collected points for y axis
-        self.z_axis_n_points_collected = []  # Number of new collected points for z axis
-        self.sample_rate = 1                 # Sample rate for data streaming
-        self.n_points_per_update = 1         # Number of new points before triggering a new update
-        super(LIS3DHTabbedPanelItem, self).__init__(**kwargs)
+    ##
+    #   @brief          Names of the plotted channels in the statistics.
+    channel_names = ['X', 'Y', 'Z']
 
     ##
-    #   @brief          Callback called when the graph widget is shown on the screen.
-    #
-    #   Here, we setup the plots for x, y, and z data.
-    def on_graph(self, instance, value):
-        self.graph.xmin = -self.n_seconds
-        self.graph.xmax = 0
-        self.graph.xlabel = 'Time (s)'
-        self.graph.ylabel = 'Acceleration (g)'
-        self.graph.x_ticks_minor = 1
-        self.graph.x_ticks_major = 2
-        self.graph.y_ticks_minor = 1
-        self.graph.y_ticks_major = 1
-        self.graph.x_grid_label = True
-        self.graph.ymin = -2
-        self.graph.ymax = 2
-        self.graph.y_grid_label = True
-        # Compute number of points to show
-        self.n_points = self.n_seconds * self.sample_rate  # Number of points to plot
-        # Compute time between points on x-axis
-        self.time_between_points = (self.n_seconds)/float(self.n_points)
-        # Initialize x and y points list
-        self.x_points = [x for x in range(-self.n_points, 0)]
-        for j in range(self.n_points):
-            self.x_points[j] = -self.n_seconds + \
-                (j+1) * self.time_between_points
-        self.x_axis_points = [0 for y in range(-self.n_points, 0)]
-        self.y_axis_points = [0 for y in range(-self.n_points, 0)]
-        self.z_axis_points = [0 for y in range(-self.n_points, 0)]
-
-        self.x_plot = LinePlot(color=(0.75, 0.4, 0.4, 1.0))
-        self.x_plot.line_width = 1.2
-        self.x_plot.points = zip(self.x_points, self.x_axis_points)
-
-        self.y_plot = LinePlot(color=(0.4, 0.4, 0.75, 1.0))
-        self.y_plot.line_width = 1.2
-        self.y_plot.points = zip(self.x_points, self.y_axis_points)
-
-        self.z_plot = LinePlot(color=(0.4, 0.75, 0.4, 1.0))
-        self.z_plot.line_width = 1.2
-        self.z_plot.points = zip(self.x_points, self.z_axis_points)
-
-        self.graph.add_plot(self.x_plot)
-        self.graph.add_plot(self.y_plot)
-        self.graph.add_plot(self.z_plot)
-
-    ##
-    #   @brief          Callback called when the \ref autoscale property changes.
-    def on_autoscale(self, instance, value):
-        if (value):
-            self.autoscale_plots()
-
-    ##
-    #   @brief          Autoscale all plots.
-    #
-    #   Autoscale all plots in the \ref graph_widget and update y ticsk.
-    def autoscale_plots(self):
-        global_y_min = []
-        global_y_max = []
-        for plot_idx in range(3):
-            if plot_idx == 0:
-                yy_points = self.x_axis_points
-            elif plot_idx == 1:
-                yy_points = self.y_axis_points
-            else:
-                yy_points = self.z_axis_points
-            # Slice only the visible part
-            if (abs(self.graph.xmin) < self.max_seconds):
-                y_points_slice = yy_points[(
-                    self.max_seconds-abs(self.graph.xmin)) * self.sample_rate:]
-            else:
-                y_points_slice = yy_points
+    #   @brief          Label of the y axis.
+    ylabel = 'Acceleration (g)'
+
+    ##
+    #   @brief          Initial range of the y axis.
+    y_range = (-2, 2)
 
-            global_y_min.append(min(y_points_slice))
-            global_y_max.append(max(y_points_slice))
+    ##
+    #   @brief          Callback called when the plot widget is shown on the screen.
+    def on_plot(self, instance, value):
+        self.plot.plot_colors = self.plot_colors
+        self.plot.channel_names = self.channel_names
+        self.plot.ylabel = self.ylabel
+        self.plot.set_range(*self.y_range)
+        self.plot.visible = self.visible
 
-        y_min = min(global_y_min)
-        y_max = max(global_y_max)
-        if (y_min != y_max):
-            min_val, max_val, major_ticks, minor_ticks = self.get_bounds_and_ticks(
-                y_min, y_max, 10)
-            self.graph.ymin = min_val
-            self.graph.ymax = max_val
-            self.graph.y_ticks_major = major_ticks
-            self.graph.y_ticks_minor = minor_ticks
+    ##
+    #   @brief          Callback called when the tab is selected or deselected.
+    def on_state(self, instance, value):
+        self.visible = (value == 'down' and self.window_visible)
 
-    def fexp(self, number):
-        (sign, digits, exponent) = Decimal(number).as_tuple()
-        return len(digits) + exponent - 1
+    ##
+    #   @brief          Callback called when the window is minimized or restored.
+    def on_window_visible(self, instance, value):
+        self.visible = (value and self.state == 'down')
 
-    def fman(self, number):
-        return float(Decimal(number).scaleb(-self.fexp(number)).normalize())
+    def on_visible(self, instance, value):
+        if (self.plot is not None):
+            self.plot.visible = value
 
     ##
-    #   @brief          Get bounds and ticks to autoscale plots.
+    #   @brief          Make the y axis follow the full scale range.
     #
-    #   @param[in]      minval: minimum value of the plot.
-    #   @param[in]      maxval: maximum value of the plot.
-    #   @param[in]      nticks: desired number of ticks
-    def get_bounds_and_ticks(self, minval, maxval, nticks):
-        # amplitude of data
-        amp = maxval - minval
-        # basic tick
-        basictick = self.fman(amp/float(nticks))
-        # correct basic tick to 1,2,5 as mantissa
-        tickpower = pow(10.0, self.fexp(amp/float(nticks)))
-        if basictick < 1.5:
-            tick = 1.0*tickpower
-            suggested_minor_tick = 4
-        elif basictick >= 1.5 and basictick < 2.5:
-            tick = 2.0*tickpower
-            suggested_minor_tick = 4
-        elif basictick >= 2.5 and basictick < 7.5:
-            tick = 5.0*tickpower
-            suggested_minor_tick = 5
-        elif basictick >= 7.5:
-            tick = 10.0*tickpower
-            suggested_minor_tick = 4
-        # calculate good (rounded) min and max
-        goodmin = tick * (minval // tick)
-        if not isclose(maxval % tick, 0.0):
-            goodmax = tick * (maxval // tick + 1)
-        else:
-            goodmax = tick * (maxval // tick)
-        return goodmin, goodmax, tick, suggested_minor_tick
-
-    ##
-    #   @brief          Callback called when \ref plot_settings widget is displayed.
+    #   The y axis is not changed while autoscale is enabled.
+    #   @param[in]      value: new full scale range in g
+    def update_full_scale_range(self, value):
+        if (not self.plot.autoscale):
+            self.plot.set_range(-value, value)
+
+    ##
+    #   @brief          Update plot with new samples.
     #
-    #   Binding of several properties across widgets.
-    def on_plot_settings(self, instance, value):
-        #self.plot_settings.bind(n_seconds=self.graph.setter('xmin'))
-        self.plot_settings.bind(n_seconds=self.n_seconds_updated)
-        self.plot_settings.bind(ymin=self.graph.setter('ymin'))
-        self.plot_settings.bind(ymax=self.graph.setter('ymax'))
-        self.plot_settings.bind(autoscale_selected=self.setter('autoscale'))
+    #   @param[in]      spans: list of arrays of x, y, z samples.
+    def update_plot(self, spans):
+        self.plot.add_samples(spans[0] if len(spans) == 1 else np.concatenate(spans))
 
     ##
-    #   @brief          Number of seconds updated.
+    #   @brief          Update plot based on new sample rate value.
     #
-    #   Update minimum value of the graph and set up x ticks.
-    def n_seconds_updated(self, instance, value):
-        self.graph.xmin = value
-        min_val, max_val, major_ticks, minor_ticks = self.get_bounds_and_ticks(value, 0, 10)
-        self.graph.x_ticks_major = major_ticks
-        self.graph.x_ticks_minor = minor_ticks
+    #   Samples acquired at the previous rate are removed.
+    def update_sample_rate(self, samples_per_second):
+        self.plot.sample_rate = samples_per_second
+        self.plot.clear()
+
+
+##
+#   @brief          Tabbed panel item to show a channel derived from acceleration data.
+#
+#   The channel is computed by the \ref lis3dh.dataflow.Dataflow of
+#   \ref GraphTabs only while the tab is shown: when hidden, its plot is
+#   not updated.
+#
+class DerivedTabbedPanelItem(LIS3DHTabbedPanelItem):
 
     ##
-    #   @brief          Update plot with new packet.
+    #   @brief          Name of the channel in the dataflow.
+    channel = StringProperty('')
+
+    ##
+    #   @brief          Clear the plot when the tab is shown again.
     #
-    #   @param[in]      packet: new packet received.
-    def update_plot(self, packet):
-        self.x_axis_n_points_collected.append(packet.get_x_data())
-        self.y_axis_n_points_collected.append(packet.get_y_data())
-        self.z_axis_n_points_collected.append(packet.get_z_data())
-        if (len(self.x_axis_n_points_collected) == self.n_points_per_update):
-            for idx in range(self.n_points_per_update):
-                self.x_axis_points.append(self.x_axis_points.pop(0))
-                self.x_axis_points[-1] = self.x_axis_n_points_collected[idx]
-                self.y_axis_points.append(self.y_axis_points.pop(0))
-                self.y_axis_points[-1] = self.y_axis_n_points_collected[idx]
-                self.z_axis_points.append(self.z_axis_points.pop(0))
-                self.z_axis_points[-1] = self.z_axis_n_points_collected[idx]
-            self.x_plot.points = zip(self.x_points, self.x_axis_points)
-            self.y_plot.points = zip(self.x_points, self.y_axis_points)
-            self.z_plot.points = zip(self.x_points, self.z_axis_points)
-            self.x_axis_n_points_collected = []
-            self.y_axis_n_points_collected = []
-            self.z_axis_n_points_collected = []
-
-            if (self.autoscale):
-                self.autoscale_plots()
-
-    ##
-    #   @brief          Update plots based on new sample rate value.
+    #   The derived channel restarts from the samples received from now on.
+    def on_state(self, instance, value):
+        if (value == 'down' and self.plot is not None):
+            self.plot.clear()
+        super(DerivedTabbedPanelItem, self).on_state(instance, value)
+
+
+##
+#   @brief          Tabbed panel item to show the magnitude of acceleration.
+class MagnitudeTabbedPanelItem(DerivedTabbedPanelItem):
+    plot_colors = [(0.75, 0.75, 0.4, 1.0)]
+    channel_names = ['|a|']
+    ylabel = 'Magnitude (g)'
+    y_range = (0, 2)
+
+
+##
+#   @brief          Tabbed panel item to show pitch and roll angles.
+class TiltTabbedPanelItem(DerivedTabbedPanelItem):
+    plot_colors = [(0.75, 0.4, 0.4, 1.0), (0.4, 0.4, 0.75, 1.0)]
+    channel_names = ['Pitch', 'Roll']
+    ylabel = 'Pitch, roll (deg)'
+    y_range = (-180, 180)
+
+
+##
+#   @brief          Tabbed panel item to show the velocity integrated from acceleration.
+class VelocityTabbedPanelItem(DerivedTabbedPanelItem):
+    ylabel = 'Velocity (m/s)'
+    y_range = (-1, 1)
+
+
+##
+#   @brief          Tabbed panel item to show the spectrogram of each axis.
+#
+#   FFTs are computed from all the samples by the worker of the
+#   common.plotting.spectrogram.Spectrogram, but its texture is only
+#   updated while the tab is visible.
+#
+class SpectrogramTabbedPanelItem(TabbedPanelItem):
+
+    ##
+    #   @brief          Reference to the spectrogram widget.
+    spectrogram = ObjectProperty(None)
+
+    ##
+    #   @brief          True if the window showing the tab is not minimized.
+    window_visible = BooleanProperty(True)
+
+    ##
+    #   @brief          True if the tab is the current tab of a visible window.
+    visible = BooleanProperty(False)
+
+    def on_spectrogram(self, instance, value):
+        self.spectrogram.visible = self.visible
+
+    def on_state(self, instance, value):
+        self.visible = (value == 'down' and self.window_visible)
+
+    def on_window_visible(self, instance, value):
+        self.visible = (value and self.state == 'down')
+
+    def on_visible(self, instance, value):
+        if (self.spectrogram is not None):
+            self.spectrogram.visible = value
+
+    ##
+    #   @brief          Queue new samples for the FFTs.
     #
-    #   If a new sample rate is set, plots must be updated to reflect the
-    #   new value of samples per second.
+    #   @param[in]      spans: list of arrays of x, y, z samples.
+    def update_plot(self, spans):
+        for samples in spans:
+            self.spectrogram.add_samples(samples)
+
+    ##
+    #   @brief          Restart the spectrogram at the new sample rate.
     def update_sample_rate(self, samples_per_second):
-        self.sample_rate = samples_per_second
-        # Compute number of points to show
-        self.n_points = self.n_seconds * self.sample_rate  # Number of points to plot
-        # Compute time between points on x-axis
-        self.time_between_points = (self.n_seconds)/float(self.n_points)
-        # Initialize x and y points list
-        self.x_points = [x for x in range(-self.n_points, 0)]
-        for j in range(self.n_points):
-            self.x_points[j] = -self.n_seconds + \
-                (j+1) * self.time_between_points
-
-        self.x_axis_points = [0 for y in range(-self.n_points, 0)]
-        self.y_axis_points = [0 for y in range(-self.n_points, 0)]
-        self.z_axis_points = [0 for y in range(-self.n_points, 0)]
-        self.x_plot.points = zip(self.x_points, self.x_axis_points)
-        self.y_plot.points = zip(self.x_points, self.y_axis_points)
-        self.z_plot.points = zip(self.x_points, self.z_axis_points)
-
-        if (samples_per_second > 60):
-            self.n_points_per_update = 5
-        else:
-            self.n_points_per_update = 1
-
-
-class PlotSettings(BoxLayout):
-    """
-    @brief Class to show some settings related to the plot.
-    """
-
-    """
-    @brief Number of seconds to show on the plot.
-    """
-    seconds_spinner = ObjectProperty(None)
-
-    autoscale_checkbox = ObjectProperty(None)
-
-    """
-    @brief Minimum value for y axis text input widget.
-    """
-    ymin_input = ObjectProperty(None)
-
-    """
-    @brief Maximum value for y axis text input widget.
-    """
-    ymax_input = ObjectProperty(None)
-
-    """
-    @brief Current number of seconds shown.
-    """
-    n_seconds = NumericProperty(0)
-
-    autoscale_selected = BooleanProperty(False)
-
-    ymin = NumericProperty()
-    ymax = NumericProperty()
+        self.spectrogram.sample_rate = samples_per_second
 
-    def __init__(self, **kwargs):
-        super(PlotSettings, self).__init__(**kwargs)
-        self.n_seconds = 20
-
-    def on_seconds_spinner(self, instance, value):
-        """
-        @brief Bind change on seconds spinner to callback.
-        """
-        self.seconds_spinner.bind(text=self.spinner_updated)
-
-    def on_ymin_input(self, instance, value):
-        """
-        @brief Bind enter pressed on ymin text input to callback.
-        """
-        self.ymin_input.bind(enter_pressed=self.axis_changed)
-
-    def on_ymax_input(self, instance, value):
-        """
-        @brief Bind enter pressed on on ymax text input to callback.
-        """
-        self.ymax_input.bind(enter_pressed=self.axis_changed)
-
-    def on_autoscale_checkbox(self, instance, value):
-        self.autoscale_checkbox.bind(active=self.autoscale_changed)
-
-    def autoscale_changed(self, instance, value):
-        self.ymin_input.disabled = value
-        self.ymax_input.disabled = value
-        self.autoscale_selected = value
-
-    def spinner_updated(self, instance, value):
-        """
-        @brief Get new value of seconds to show on the plot.
-        """
-        self.n_seconds = -int(self.seconds_spinner.text)
-
-    def axis_changed(self, instance, focused):
-        """
-        @brief Called when a new value of ymin or ymax is entered on the GUI.
-        """
-        if (not focused):
-            if (not ((self.ymin_input.text == '') or (self.ymax_input.text == ''))):
-                y_min = float(self.ymin_input.text)
-                y_max = float(self.ymax_input.text)
-                if (y_min >= y_max):
-                    self.ymin_input.text = f"{self.ymin:.2f}"
-                    self.ymax_input.text = f"{self.ymax:.2f}"
-                else:
-                    self.ymin = y_min
-                    self.ymax = y_max
-            elif (self.ymin_input.text == ''):
-                self.ymin_input.text = f"{self.ymin:.2f}"
-            elif (self.ymax_input.text == ''):
-                self.ymax_input.text = f"{self.ymax:.2f}"
-
-
-class FloatInput(TextInput):
-    pat = re.compile('[^0-9]')
-    enter_pressed = BooleanProperty(None)
+
+##
+#   @brief          Tabbed panel item to detect and list trigger events.
+#
+#   Incoming samples are evaluated by a \ref lis3dh.triggers.TriggerEngine
+#   while the trigger is armed. Captured events are saved in
+#   \ref EVENTS_DIRECTORY and listed in the tab, and can optionally
+#   freeze the acceleration plot.
+#
+class TriggerTabbedPanelItem(TabbedPanelItem):
+
+    ##
+    #   @brief          Reference to trigger type spinner.
+    trigger_spinner = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to axis spinner.
+    axis_spinner = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to trigger level text input.
+    level_input = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to pre-trigger seconds text input.
+    pre_input = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to post-trigger seconds text input.
+    post_input = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to view listing the events.
+    events_view = ObjectProperty(None)
+
+    ##
+    #   @brief          True while the trigger is armed.
+    armed = BooleanProperty(False)
+
+    ##
+    #   @brief          Disarm the trigger after the first event.
+    single = BooleanProperty(False)
+
+    ##
+    #   @brief          Freeze the acceleration plot when an event is captured.
+    freeze_on_trigger = BooleanProperty(False)
+
+    ##
+    #   @brief          True while the acceleration plot is frozen.
+    frozen = BooleanProperty(False)
 
     def __init__(self, **kwargs):
-        super(FloatInput, self).__init__(**kwargs)
-        self.bind(focus=self.on_focus)  # pylint:disable=no-member
-        self.multiline = False
-
-    def insert_text(self, substring, from_undo=False):
-        pat = self.pat
-        if ((len(self.text) == 0) and substring == '-'):
-            s = '-'
-        else:
-            if '.' in self.text:
-                s = re.sub(pat, '', substring)
+        self.sample_rate = 1                 # Sample rate for data streaming
+        self.engine = None                   # Trigger engine, while armed
+        self.event_store = EventStore(EVENTS_DIRECTORY)
+        super(TriggerTabbedPanelItem, self).__init__(**kwargs)
+
+    ##
+    #   @brief          Callback called when the events view is shown on the screen.
+    #
+    #   List the events saved in previous sessions.
+    def on_events_view(self, instance, value):
+        for event in self.event_store.load_all():
+            self.add_event(event)
+
+    ##
+    #   @brief          Arm or disarm the trigger.
+    #
+    #   @param[in]      armed: True to arm the trigger with the current settings.
+    def arm(self, armed):
+        self.engine = None
+        if (armed):
+            try:
+                level = float(self.level_input.text)
+                pre_samples = int(float(self.pre_input.text) * self.sample_rate)
+                post_samples = int(float(self.post_input.text) * self.sample_rate)
+            except ValueError:
+                armed = False
             else:
-                s = '.'.join([re.sub(pat, '', s)
-                             for s in substring.split('.', 1)])
-        return super(FloatInput, self).insert_text(s, from_undo=from_undo)
+                self.engine = TriggerEngine(self.create_trigger(level), pre_samples,
+                                            post_samples, self.sample_rate, self.single)
+        self.armed = armed
+
+    ##
+    #   @brief          Create the trigger selected in the settings.
+    #
+    #   @param[in]      level: trigger level.
+    def create_trigger(self, level):
+        trigger_type = self.trigger_spinner.text
+        axis = self.axis_spinner.text
+        if (trigger_type == 'Level'):
+            return LevelTrigger(axis, level, rising=(level >= 0))
+        elif (trigger_type == 'Slope'):
+            return SlopeTrigger(axis, level)
+        elif (trigger_type == 'RMS'):
+            return RMSTrigger(axis, level, RMS_WINDOW_SECONDS * self.sample_rate)
+        return MagnitudeTrigger(level)
 
-    def on_focus(self, instance, value):
-        self.enter_pressed = value
+    ##
+    #   @brief          Evaluate the trigger on new samples.
+    #
+    #   @param[in]      spans: list of arrays of x, y, z samples.
+    def process(self, spans):
+        if (self.engine is None):
+            return
+        for samples in spans:
+            for event in self.engine.process(samples):
+                self.event_store.save(event)
+                self.add_event(event)
+                if (self.freeze_on_trigger):
+                    self.frozen = True
+        if (not self.engine.armed):
+            self.arm(False)
+
+    ##
+    #   @brief          Add an event at the top of the list.
+    def add_event(self, event):
+        text = (f'{event.timestamp:%Y-%m-%d %H:%M:%S}  |  {event.description}  |  '
+                f'peak {event.peak_magnitude():.2f} g')
+        self.events_view.data = [{'text': text}] + self.events_view.data
+
+    ##
+    #   @brief          Update trigger based on new sample rate value.
+    #
+    #   Pre and post trigger windows are given in seconds, so an armed
+    #   trigger is re-armed with the new number of samples.
+    def update_sample_rate(self, samples_per_second):
+        self.sample_rate = samples_per_second
+        if (self.armed):
+            self.arm(True)
@@ -0,0 +1,20 @@
+##
+# @package lis3dh
+#
+#   Kivy-free acquisition core for the PSoC-LIS3DH board.
+#
+#   This package contains everything that is needed to discover the
+#   board, parse its data packets, compute streaming statistics and
+#   record samples to disk, without importing Kivy. The Kivy GUI wraps
+#   it with a thin adapter (see communication.KivySerial), while
+#   headless rigs can run it directly with:
+#
+#       python -m lis3dh.acquire --rate 200 --out capture.bin
+
+import os
+import sys
+
+# Shared modules of the examples live in the root of the repository
+_REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if (_REPOSITORY_DIR not in sys.path):
+    sys.path.append(_REPOSITORY_DIR)
@@ -0,0 +1,1273 @@
+##
+# @package lis3dh.acquire
+#
+#   Acquisition core for the PSoC-LIS3DH board.
+#
+#   This module implements port discovery, packet parsing, streaming
+#   statistics and recording of samples. It does not depend on Kivy,
+#   so it can be used both by the GUI and by headless acquisition rigs:
+#
+#       python -m lis3dh.acquire --rate 200 --out capture.bin
+#
+#   Commands are written by the I/O thread owning the port. Firmware that
+#   advertises \ref ACK_CAPABILITY in its response to \ref CONNECTION_CMD
+#   acknowledges each command with a 4 bytes frame:
+#       - Header byte: 0xAB
+#       - Command byte: the acknowledged command
+#       - Status byte: 0 if the command was applied, error code otherwise
+#       - Tail byte: 0xBA
+
+import argparse
+import collections
+import numpy as np
+from numpy.lib import recfunctions
+import serial
+import signal
+import struct
+import sys
+import threading
+import time
+
+from common.commands import DEFAULT_COMMAND_TIMEOUT, COMMAND_ERROR, Command, CommandQueue
+from common.conversion import LookupTableConverter, left_justified
+from common.frames import FrameDecoder, FrameSpec, field_values
+from common.hotplug import PortMonitor, usb_port_identity
+from common.stats import StreamStats
+from lis3dh.calibration import (CALIBRATION_FILE, DEFAULT_CALIBRATION_SAMPLES, CalibrationSession,
+                                CalibrationStore, board_identity)
+
+##
+#   @brief          Data packet header.
+#
+DATA_PACKET_HEADER = 0xA0
+
+##
+#   @brief          Data packet tail.
+#
+DATA_PACKET_TAIL = 0xC0
+
+##
+#   @brief          Size in bytes of a data packet.
+#
+#   Header byte, three 16-bit big-endian axis values and tail byte.
+DATA_PACKET_SIZE = 8
+
+##
+#   @brief          Acknowledgement packet header.
+#
+ACK_PACKET_HEADER = 0xAB
+
+##
+#   @brief          Acknowledgement packet tail.
+#
+ACK_PACKET_TAIL = 0xBA
+
+##
+#   @brief          Size in bytes of an acknowledgement packet.
+#
+ACK_PACKET_SIZE = 4
+
+##
+#   @brief          String advertising acknowledgements in the board response.
+#
+ACK_CAPABILITY = 'ACK'
+
+##
+#   @brief          Command to start connection with board.
+#
+CONNECTION_CMD = 'v'
+
+##
+#   @brief          Command to start streaming from the board.
+#
+START_STREAMING_CMD = 'b'
+
+##
+#   @brief          Command to stop streaming from the board.
+#
+STOP_STREAMING_CMD = 's'
+
+##
+#   @brief          Maximum time in seconds to wait for the board response.
+#
+PORT_CHECK_TIMEOUT = 2
+
+##
+#   @brief          Maximum time in seconds to wait for a checked port to open again.
+#
+PORT_REOPEN_TIMEOUT = 1.0
+
+##
+#   @brief          Read timeout in seconds of the I/O thread.
+#
+#   Reads are cancelled when a command is queued, so that it is written
+#   at once: this is the latency of the other checks of the thread (e.g.,
+#   acknowledgement timeouts).
+IO_POLL_INTERVAL = 0.05
+
+##
+#   @brief          Write timeout in seconds, so that a wedged port fails the command.
+#
+WRITE_TIMEOUT = 0.5
+
+##
+#   @brief          Disconnected port state.
+#
+CONNECTION_STATE_DISCONNECTED = 0
+
+##
+#   @brief          Port found state.
+#
+CONNECTION_STATE_FOUND = 1
+
+##
+#   @brief          Connected state.
+#
+CONNECTION_STATE_CONNECTED = 2
+
+##
+#   @brief          Commands used to set the sample rate on the board.
+#
+SAMPLE_RATE_CMDS = {
+    '1 Hz': '0',
+    '10 Hz': '1',
+    '25 Hz': '2',
+    '50 Hz': '3',
+    '100 Hz': '4',
+    '200 Hz': '5'
+}
+
+##
+#   @brief          Commands used to set the full scale range on the board.
+#
+FULL_SCALE_RANGE_CMDS = {
+    '+/-2g': 'g',
+    '+/-4g': 'h',
+    '+/-8g': 'j',
+    '+/-16g': 'k'
+}
+
+##
+#   @brief          Commands used to set the resolution mode on the board.
+#
+RESOLUTION_CMDS = {
+    'Low power (8 bit)': 'l',
+    'Normal (10 bit)': 'n',
+    'High resolution (12 bit)': 'm'
+}
+
+##
+#   @brief          Resolution in bits of each resolution mode.
+#
+RESOLUTION_BITS = {
+    'Low power (8 bit)': 8,
+    'Normal (10 bit)': 10,
+    'High resolution (12 bit)': 12
+}
+
+##
+#   @brief          Default full scale range in g.
+#
+DEFAULT_FULL_SCALE_RANGE = 2
+
+##
+#   @brief          Default resolution in bits.
+#
+DEFAULT_RESOLUTION = 10
+
+##
+#   @brief          Sensitivity in mg/digit for each full scale range and resolution.
+#
+#   Values from the LIS3DH datasheet, keyed by full scale range in g and
+#   then by resolution in bits.
+SENSITIVITY = {
+    2: {8: 16, 10: 4, 12: 1},
+    4: {8: 32, 10: 8, 12: 2},
+    8: {8: 64, 10: 16, 12: 4},
+    16: {8: 192, 10: 48, 12: 12}
+}
+
+##
+#   @brief          Format of the data packets: three 16-bit big-endian axis codes.
+DATA_FRAME = FrameSpec('data', header=DATA_PACKET_HEADER,
+                       fields=[('x', 'H'), ('y', 'H'), ('z', 'H')],
+                       tail=DATA_PACKET_TAIL, byteorder='>')
+
+##
+#   @brief          Format of the acknowledgement packets: command byte and status.
+ACK_FRAME = FrameSpec('ack', header=ACK_PACKET_HEADER,
+                      fields=[('command', 'B'), ('status', 'B')],
+                      tail=ACK_PACKET_TAIL)
+
+##
+#   @brief          Values returned by the parser when no data packet was received.
+_NO_VALUES = np.empty((0, 3), dtype=np.float32)
+
+
+##
+#   @brief          Get the label of a full scale range in g.
+def full_scale_range_label(full_scale_range):
+    return f'+/-{full_scale_range:d}g'
+
+
+##
+#   @brief          Get the label of a resolution in bits.
+def resolution_label(resolution):
+    return [label for label, bits in RESOLUTION_BITS.items() if bits == resolution][0]
+
+
+##
+#   @brief          Convert acceleration data in float format.
+#
+#   This function converts signed 16-bit left-justified values into
+#   float values representing acceleration data, as one vectorized
+#   operation for a whole batch.
+#   @param[in]      raw: array of signed 16-bit values read from the board
+#   @param[in]      full_scale_range: full scale range in g
+#   @param[in]      resolution: resolution in bits
+#   @return         array of acceleration values in g
+#
+def convert_acc_data(raw, full_scale_range=DEFAULT_FULL_SCALE_RANGE,
+                     resolution=DEFAULT_RESOLUTION):
+    return acc_conversion(full_scale_range, resolution)(
+        np.asarray(raw, dtype=np.int16).view(np.uint16))
+
+
+##
+#   @brief          Get the conversion function of the codes into g.
+#
+#   @param[in]      full_scale_range: full scale range in g
+#   @param[in]      resolution: resolution in bits
+#   @return         function suitable for \ref common.conversion.LookupTableConverter.
+def acc_conversion(full_scale_range, resolution):
+    return left_justified(resolution, SENSITIVITY[full_scale_range][resolution] / 1000.)
+
+
+##
+#   @brief          Data type of a batch of samples: acquisition time in seconds and x, y, z in g.
+#
+#   It matches the records of the files written by \ref Recorder.
+SAMPLE_DTYPE = np.dtype([('t', '<f8'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+
+
+##
+#   @brief          Create a batch of samples received together.
+#
+#   @param[in]      timestamp: acquisition time in seconds of the batch.
+#   @param[in]      values: array of shape (n, 3) of x, y, z acceleration in g.
+#   @return         structured array of \ref SAMPLE_DTYPE.
+def make_records(timestamp, values):
+    records = np.empty(len(values), dtype=SAMPLE_DTYPE)
+    records['t'] = timestamp
+    record_values(records)[:] = values
+    return records
+
+
+##
+#   @brief          Get the x, y, z acceleration of a batch of samples.
+#
+#   @param[in]      records: structured array of \ref SAMPLE_DTYPE.
+#   @return         array of shape (n, 3), a view on the records.
+def record_values(records):
+    return recfunctions.structured_to_unstructured(records[['x', 'y', 'z']], copy=False)
+
+
+##
+#   @brief          Class holding a packet of accelerometer data.
+#
+#   Packets are immutable tuples without a per-instance dictionary.
+#   Consumers of whole batches should rather use the structured arrays
+#   delivered to \ref LIS3DHAcquisition.add_record_callback.
+class LIS3DHDataPacket(collections.namedtuple('LIS3DHDataPacket', ('x_data', 'y_data', 'z_data'))):
+
+    __slots__ = ()
+
+    ##
+    #   @brief          Get x axis acceleration.
+    def get_x_data(self):
+        return self.x_data
+
+    ##
+    #   @brief          Get y axis acceleration.
+    def get_y_data(self):
+        return self.y_data
+
+    ##
+    #   @brief          Get z axis acceleration.
+    def get_z_data(self):
+        return self.z_data
+
+
+##
+#   @brief          Serial data parser.
+#
+#   Incremental parser that turns the raw byte stream coming from the
+#   board into \ref LIS3DHDataPacket objects. Bytes can be fed in chunks
+#   of arbitrary size: incomplete packets are kept until the next call.
+#   Packets are decoded by a common.frames.FrameDecoder of \ref DATA_FRAME
+#   and \ref ACK_FRAME. Acknowledgement packets are passed to the on_ack
+#   callback as soon as they are parsed, or collected in \ref acks.
+#   Values are converted with the lookup tables of the mode set with
+#   \ref set_mode, once per run of consecutive data packets: a mode set
+#   by on_ack applies from the packet following the acknowledgement,
+#   even within the same chunk of bytes. The calibration set with
+#   \ref set_calibration is folded into the tables.
+#   The structure of the incoming packet is as follows:
+#       - Header byte: 0xA0
+#       - X Axis data: 2 bytes
+#       - Y Axis data: 2 bytes
+#       - Z Axis data: 2 bytes
+#       - Tail byte: 0xC0
+#
+class LIS3DHPacketParser():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      on_ack: optional function called with the command byte and
+    #                   status of each acknowledgement, in stream order.
+    def __init__(self, on_ack=None):
+        self.decoder = FrameDecoder([DATA_FRAME, ACK_FRAME])
+        self.on_ack = on_ack
+        self.acks = []              # (command byte, status) acknowledgements received, without on_ack
+        self.full_scale_range = DEFAULT_FULL_SCALE_RANGE
+        self.resolution = DEFAULT_RESOLUTION
+        self.converter = LookupTableConverter(
+            acc_conversion(self.full_scale_range, self.resolution), n_channels=3)
+
+    ##
+    #   @brief          Set the scaling of the values of the next packets.
+    #
+    #   @param[in]      full_scale_range: full scale range in g.
+    #   @param[in]      resolution: resolution in bits.
+    def set_mode(self, full_scale_range, resolution):
+        self.full_scale_range = full_scale_range
+        self.resolution = resolution
+        self.converter.set_function(acc_conversion(full_scale_range, resolution))
+
+    ##
+    #   @brief          Set the calibration of the axes.
+    #
+    #   @param[in]      offsets: x, y, z offsets in g, subtracted from the values.
+    #   @param[in]      gains: x, y, z gains, applied after the offsets.
+    def set_calibration(self, offsets=None, gains=None):
+        self.converter.set_calibration(offsets, gains)
+
+    ##
+    #   @brief          Discard any partially received packet.
+    def reset(self):
+        self.decoder.reset()
+        self.acks = []
+
+    ##
+    #   @brief          Bytes discarded while looking for a header.
+    @property
+    def skipped_bytes(self):
+        return self.decoder.skipped_bytes
+
+    ##
+    #   @brief          Get and clear the acknowledgements received so far.
+    def pop_acks(self):
+        acks = self.acks
+        self.acks = []
+        return acks
+
+    ##
+    #   @brief          Parse a new chunk of bytes.
+    #
+    #   @param[in]      data: bytes read from the serial port.
+    #   @return         list of \ref LIS3DHDataPacket found in the data.
+    def feed(self, data):
+        return [LIS3DHDataPacket(*values) for values in self.feed_values(data).tolist()]
+
+    ##
+    #   @brief          Parse a new chunk of bytes into an array.
+    #
+    #   @param[in]      data: bytes read from the serial port.
+    #   @return         array of shape (n, 3) of the x, y, z values found in the data.
+    def feed_values(self, data):
+        batches = []
+        for spec, records in self.decoder.feed_runs(data):
+            if (spec is ACK_FRAME):
+                acks = zip(records['command'].tolist(), records['status'].tolist())
+                if (self.on_ack is None):
+                    self.acks.extend(acks)
+                else:
+                    for command_byte, status in acks:
+                        self.on_ack(command_byte, status)
+            else:
+                # Convert the codes of the whole run at once
+                codes = field_values(records, DATA_FRAME.field_names, np.uint16)
+                batches.append(self.converter.convert(codes))
+        if (not batches):
+            return _NO_VALUES
+        return batches[0] if (len(batches) == 1) else np.concatenate(batches)
+
+
+##
+#   @brief          Binary recorder of acquired samples.
+#
+#   Samples are stored as a sequence of little-endian records, each one
+#   made of the acquisition time in seconds (double) and the x, y, z
+#   acceleration in g (float). The file starts with a small header
+#   containing a magic string and the sample rate set on the board.
+#
+class Recorder():
+
+    ##
+    #   @brief          Magic string identifying a recording file.
+    MAGIC = b'LIS3DH01'
+
+    ##
+    #   @brief          Struct of the file header.
+    HEADER_STRUCT = struct.Struct('<8sI')
+
+    ##
+    #   @brief          Struct of a single sample record.
+    RECORD_STRUCT = struct.Struct('<dfff')
+
+    ##
+    #   @brief          Open a new recording file.
+    #
+    #   @param[in]      path: path of the file to be written.
+    #   @param[in]      sample_rate: sample rate set on the board.
+    def __init__(self, path, sample_rate=0):
+        self.path = path
+        self.samples_written = 0
+        # The recording may be closed by another thread than the writer
+        self.lock = threading.Lock()
+        self.file = open(path, 'wb')
+        self.file.write(self.HEADER_STRUCT.pack(self.MAGIC, int(sample_rate)))
+
+    ##
+    #   @brief          Append a batch of samples to the recording.
+    #
+    #   @param[in]      records: structured array of \ref SAMPLE_DTYPE, with the
+    #                   time since start of streaming in seconds.
+    def write(self, records):
+        with self.lock:
+            if (self.file.closed):
+                return
+            self.file.write(records.tobytes())
+            self.samples_written += len(records)
+
+    ##
+    #   @brief          Flush and close the recording file.
+    def close(self):
+        with self.lock:
+            if (not self.file.closed):
+                self.file.close()
+
+
+##
+#   @brief          Kivy-free acquisition core.
+#
+#   This class takes care of communication with the board. Automatic
+#   port discovery is implemented: it is not required to specify the
+#   serial port, as it is automatically detected by sending a known
+#   command to the ports that are plugged in. If the expected response
+#   is detected, then a connection with the serial port is carried out.
+#   Each port is probed once, when it appears, so that unrelated devices
+#   are left alone, and the board is connected again when plugged back.
+#
+#   State changes are notified to listeners added with \ref add_listener,
+#   while parsed packets are streamed to the callbacks added with
+#   \ref add_callback, \ref add_batch_callback or, as structured arrays,
+#   \ref add_record_callback.
+#
+class LIS3DHAcquisition():
+
+    ##
+    #  @brief           Initialize the class.
+    #
+    #  @param[in]       baudrate: the desired baudrate for serial communication.
+    #
+    def __init__(self, baudrate=115200):
+        self.port = None            # serial port, opened upon connection
+        self.port_name = ""         # port name, set later when port is found
+        self.baudrate = baudrate    # baudrate for serial communication
+        self.is_streaming = False   # streaming status
+        self.callbacks = []         # list of callbacks to be called when new data are available
+        self.batch_callbacks = []   # list of callbacks to be called with each batch of packets
+        self.record_callbacks = []  # list of callbacks to be called with each batch of records
+        self.listeners = []         # list of callbacks to be called when state changes
+        self.parser = LIS3DHPacketParser(on_ack=self.acknowledge)
+        self.recorder = None        # optional recorder of acquired samples
+        self.sample_bus = None      # optional shared memory ring of samples
+        self.stats = StreamStats()  # number of samples received and their rate
+        self.start_time = 0         # time at which streaming was started
+        self.banner = ''            # response of the board to the connection command
+        self.board_id = ''          # identity of the board, used as calibration key
+        self.calibration_store = CalibrationStore(CALIBRATION_FILE)
+        self.calibration_session = None
+        self.commands = CommandQueue()
+        self.io_thread = None       # thread reading from and writing to the port
+        self.port_monitor = None    # monitor of plugged ports, while discovery is running
+        self.dispatch_lock = threading.RLock()  # held while a batch is delivered
+        self.flush_requested = False    # True until stale input is flushed upon start
+        self.start_latency = None   # time in ms from start request to first sample
+        self.stop_latency = None    # time in ms from stop request to the last batch delivered
+        self._connected = CONNECTION_STATE_DISCONNECTED
+        self._message_string = ''
+        self._sample_rate = 1
+        self._full_scale_range = DEFAULT_FULL_SCALE_RANGE
+        self._resolution = DEFAULT_RESOLUTION
+
+    ##
+    #   @brief          Number of samples received since streaming started.
+    @property
+    def samples_counter(self):
+        return self.stats.total
+
+    ##
+    #   @brief          Sample rate of the received samples, over the last seconds.
+    @property
+    def current_sample_rate(self):
+        return self.stats.rate()
+
+    ##
+    #   @brief          Connection status.
+    #
+    #   Possible values are:
+    #       - \ref CONNECTION_STATE_DISCONNECTED: board is disconnected
+    #       - \ref CONNECTION_STATE_FOUND: board is found among serial ports
+    #       - \ref CONNECTION_STATE_CONNECTED: board is connected
+    #
+    @property
+    def connected(self):
+        return self._connected
+
+    @connected.setter
+    def connected(self, value):
+        self._connected = value
+        self.notify('connected', value)
+
+    ##
+    #   @brief          Debug message string.
+    @property
+    def message_string(self):
+        return self._message_string
+
+    @message_string.setter
+    def message_string(self, value):
+        self._message_string = value
+        self.notify('message_string', value)
+
+    ##
+    #   @brief          Sample rate set on the board.
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        self._sample_rate = value
+        self.notify('sample_rate', value)
+
+    ##
+    #   @brief          Full scale range in g set on the board.
+    @property
+    def full_scale_range(self):
+        return self._full_scale_range
+
+    @full_scale_range.setter
+    def full_scale_range(self, value):
+        self._full_scale_range = value
+        self.notify('full_scale_range', value)
+
+    ##
+    #   @brief          Resolution in bits set on the board.
+    @property
+    def resolution(self):
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value):
+        self._resolution = value
+        self.notify('resolution', value)
+
+    ##
+    #  @brief           Add callback to be called upon packet reception.
+    #
+    #  @param[in]       callback: the callback function to be called.
+    #
+    def add_callback(self, callback):
+        if (callback not in self.callbacks):
+            self.callbacks.append(callback)
+
+    ##
+    #  @brief           Add callback to be called once per batch of packets.
+    #
+    #  Packets parsed from the same chunk of serial data are delivered
+    #  together as a list, which is cheaper than one call per packet
+    #  for consumers that process data in blocks.
+    #
+    #  @param[in]       callback: the callback function to be called.
+    #
+    def add_batch_callback(self, callback):
+        if (callback not in self.batch_callbacks):
+            self.batch_callbacks.append(callback)
+
+    ##
+    #  @brief           Add callback to be called once per batch of samples, as an array.
+    #
+    #  The callback receives a structured array of \ref SAMPLE_DTYPE (fields
+    #  t, x, y, z), so no Python object is created for each sample. This is
+    #  the preferred way to consume data; packets are only created when
+    #  callbacks added with \ref add_callback or \ref add_batch_callback exist.
+    #
+    #  @param[in]       callback: the callback function to be called.
+    #
+    def add_record_callback(self, callback):
+        if (callback not in self.record_callbacks):
+            self.record_callbacks.append(callback)
+
+    ##
+    #  @brief           Remove a callback previously added with \ref add_callback,
+    #                   \ref add_batch_callback or \ref add_record_callback.
+    #
+    #  The lists are replaced rather than modified in place, so that the
+    #  reader thread can keep iterating over it safely.
+    #
+    #  @param[in]       callback: the callback function to be removed.
+    #
+    def remove_callback(self, callback):
+        self.callbacks = [c for c in self.callbacks if c != callback]
+        self.batch_callbacks = [c for c in self.batch_callbacks if c != callback]
+        self.record_callbacks = [c for c in self.record_callbacks if c != callback]
+
+    ##
+    #  @brief           Add listener to be called upon state changes.
+    #
+    #  The listener is called with the name of the changed state
+    #  ('connected', 'message_string', 'sample_rate', 'full_scale_range',
+    #  'resolution' or 'command') and its new value, possibly from the
+    #  I/O thread. Streaming statistics are not notified: they are read
+    #  from \ref samples_counter and \ref current_sample_rate when needed.
+    #
+    #  @param[in]       listener: the callback function to be called.
+    #
+    def add_listener(self, listener):
+        if (listener not in self.listeners):
+            self.listeners.append(listener)
+
+    ##
+    #  @brief           Notify all listeners of a state change.
+    #
+    def notify(self, name, value):
+        for listener in self.listeners:
+            listener(name, value)
+
+    ##
+    #   @brief          Start automatic port discovery in a background thread.
+    #
+    #   Ports are probed when they are plugged in, and the board is
+    #   connected as soon as it is found, until \ref stop_discovery is called.
+    def start_discovery(self):
+        if (self.port_monitor is None):
+            self.port_monitor = PortMonitor(self.ports_changed)
+            self.port_monitor.start()
+
+    ##
+    #   @brief          Stop automatic port discovery.
+    def stop_discovery(self):
+        port_monitor = self.port_monitor
+        self.port_monitor = None
+        if (port_monitor is not None):
+            port_monitor.stop()
+
+    ##
+    #   @brief          Automatic serial port discovery.
+    #
+    #   This function waits until the board is found among the
+    #   plugged ports, and connected.
+    def find_port(self):
+        self.start_discovery()
+        while (not self.is_connected()):
+            time.sleep(IO_POLL_INTERVAL)
+        self.stop_discovery()
+
+    ##
+    #   @brief          Callback of the port monitor.
+    #
+    #   Newly plugged ports are checked by sending a \ref CONNECTION_CMD,
+    #   and the first one answering with the expected string is connected.
+    #
+    #   @param[in]      added: names of the ports plugged in.
+    #   @param[in]      removed: names of the ports unplugged.
+    def ports_changed(self, added, removed):
+        if (self.connected == CONNECTION_STATE_CONNECTED):
+            return
+        for port_name in added:
+            if (self.check_lis3dh_port(port_name)):
+                self.port_name = port_name
+                if (self.connect() == 0):
+                    return
+        if (not self.port_monitor or not self.port_monitor.ports):
+            self.message_string = 'No ports found.. Check your connections'
+        else:
+            self.message_string = 'Board not found.. Plug it in'
+
+    ##
+    #   @brief              Check if the port is the desired one.
+    #
+    #   This function sends a \ref CONNECTION_CMD to the port,
+    #   and checks if three $$$ are found in the response from
+    #   the port. The response is polled, so that the check ends as
+    #   soon as the expected string is received, or after
+    #   \ref PORT_CHECK_TIMEOUT seconds.
+    #
+    #   @param[in]          port_name: the name of the port to be checked
+    #   @return             True if check was successfull, False otherwise.
+    #
+    def check_lis3dh_port(self, port_name):
+        self.message_string = 'Checking: {}'.format(port_name)
+        try:
+            port = serial.Serial(
+                port=port_name, baudrate=self.baudrate, write_timeout=0, timeout=0.1)
+            if (port.is_open):
+                received_string = self.read_banner(port)
+                port.close()
+                if ('$$$' in received_string and 'LIS' in received_string):
+                    self.message_string = 'Device found on port: {}'.format(
+                        port_name)
+                    self.connected = CONNECTION_STATE_FOUND
+                    return True
+        except serial.SerialException:
+            return False
+        except ValueError:
+            return False
+        return False
+
+    ##
+    #   @brief              Send the connection command and read the response.
+    #
+    #   The response is polled until three $$$ and the board name are
+    #   received, or for at most \ref PORT_CHECK_TIMEOUT seconds.
+    #
+    #   @param[in]          port: the open serial port.
+    #   @return             the string received from the board.
+    #
+    def read_banner(self, port):
+        port.write(CONNECTION_CMD.encode('utf-8'))
+        received_string = ''
+        deadline = time.monotonic() + PORT_CHECK_TIMEOUT
+        while (time.monotonic() < deadline):
+            received_string += port.read(max(1, port.in_waiting)).decode(
+                'utf-8', errors='replace')
+            if ('$$$' in received_string and 'LIS' in received_string):
+                break
+        return received_string
+
+    ##
+    #   @brief          Connect to the serial port that was found.
+    #
+    #   Once connected, an I/O thread reads from the port and writes the
+    #   queued commands until \ref disconnect is called. A port just closed
+    #   by \ref check_lis3dh_port may not open at once: opening is retried
+    #   for at most \ref PORT_REOPEN_TIMEOUT seconds.
+    #
+    #   @return         0 if connection was successful, -1 otherwise
+    def connect(self):
+        deadline = time.monotonic() + PORT_REOPEN_TIMEOUT
+        while (True):
+            try:
+                port = serial.Serial(
+                    port=self.port_name, baudrate=self.baudrate,
+                    timeout=IO_POLL_INTERVAL, write_timeout=WRITE_TIMEOUT)
+                break
+            except serial.SerialException:
+                if (time.monotonic() >= deadline):
+                    self.message_string = f'Error when opening port'
+                    return -1
+                time.sleep(IO_POLL_INTERVAL)
+        return self.attach_port(port)
+
+    ##
+    #   @brief          Connect to an open port.
+    #
+    #   @param[in]      port: the open port, a serial.Serial or an object with
+    #                   the same interface (e.g., common.benchmark.SyntheticPort).
+    #   @return         0 if connection was successful, -1 otherwise
+    def attach_port(self, port):
+        self.port = port
+        if (self.port.is_open):
+            try:
+                self.banner = self.read_banner(self.port)
+            except serial.SerialException:
+                self.banner = ''
+            self.commands = CommandQueue(ack_enabled=(ACK_CAPABILITY in self.banner))
+            self.board_id = board_identity(self.banner, usb_port_identity(self.port_name))
+            self.load_calibration()
+            self.parser.reset()
+            self.io_thread = threading.Thread(target=self.io_loop, args=(self.port,), daemon=True)
+            self.io_thread.start()
+            self.message_string = f'Device connected at {self.port_name}'
+            self.update_sample_rate_on_board('1 Hz')
+            self.select_range(full_scale_range_label(self.full_scale_range))
+            self.select_resolution(resolution_label(self.resolution))
+            self.connected = CONNECTION_STATE_CONNECTED
+            return 0
+        return -1
+
+    ##
+    #   @brief          Stop the I/O thread and close the port.
+    def disconnect(self):
+        port = self.port
+        self.port = None
+        if (port is not None):
+            port.close()
+            if (self.io_thread is not None and self.io_thread is not threading.current_thread()):
+                self.io_thread.join()
+        self.io_thread = None
+
+    ##
+    #   @brief          Match an acknowledgement with the pending command.
+    #
+    #   Called by the parser in the I/O thread, before the packets that
+    #   follow the acknowledgement are converted.
+    def acknowledge(self, command_byte, status):
+        self.commands.acknowledge(command_byte, status)
+
+    ##
+    #   @brief          Target function of the I/O thread.
+    #
+    #   This function writes queued commands, matches acknowledgements
+    #   and, while streaming, streams received packets to all the
+    #   callbacks that were added.
+    #
+    #   @param[in]      port: the port owned by the thread.
+    def io_loop(self, port):
+        try:
+            while (port is self.port):
+                self.commands.service(port)
+                data = port.read(max(1, port.in_waiting))
+                if (not data):
+                    continue
+                values = self.parser.feed_values(data)
+                if (len(values)):
+                    self.deliver_values(values)
+        except (serial.SerialException, OSError):
+            # Raised when the board is unplugged
+            pass
+        except (TypeError, AttributeError):
+            # Raised by pyserial when the port is closed by disconnect
+            if (port is self.port):
+                raise
+        self.commands.cancel_all()
+        if (port is self.port):
+            port.close()
+            self.port = None
+            self.is_streaming = False
+            self.message_string = 'Device disconnected'
+            port_monitor = self.port_monitor
+            if (port_monitor is not None):
+                # Probed again when scanned, also if the port never disappeared (e.g., board reset)
+                port_monitor.forget(self.port_name)
+        self.connected = CONNECTION_STATE_DISCONNECTED
+
+    ##
+    #   @brief          Queue a command for the board.
+    #
+    #   The command is written by the I/O thread. Upon completion, the
+    #   callback is called and listeners are notified with 'command'.
+    #
+    #   @param[in]      cmd: command string.
+    #   @param[in]      callback: optional function called with the completed command.
+    #   @param[in]      timeout: time in seconds to wait for an acknowledgement.
+    #   @param[in]      before_write: optional function called by the I/O thread with the
+    #                   port, just before writing the command.
+    #   @return         the queued \ref common.commands.Command.
+    def send_command(self, cmd, callback=None, timeout=DEFAULT_COMMAND_TIMEOUT, before_write=None):
+        def command_completed(command):
+            if (callback is not None):
+                callback(command)
+            self.notify('command', command)
+        port = self.port
+        if (port is None):
+            command = Command(cmd.encode('utf-8'), timeout, command_completed)
+            command.complete(COMMAND_ERROR)
+            return command
+        command = self.commands.put(cmd.encode('utf-8'), timeout, command_completed, before_write)
+        self.wake_io_thread(port)
+        return command
+
+    ##
+    #   @brief          Cancel the current read of the I/O thread, so that it services commands.
+    def wake_io_thread(self, port):
+        try:
+            port.cancel_read()
+        except (OSError, TypeError, AttributeError):
+            # Raised by pyserial when the port is being closed
+            pass
+
+    ##
+    #   @brief          Start streaming data from the device.
+    #
+    #   This function queues the proper command to start data
+    #   streaming. Received packets are then streamed to the callbacks
+    #   by the I/O thread.
+    #
+    def start_streaming(self):
+        if (self.connected == CONNECTION_STATE_CONNECTED):
+            if (not (self.is_streaming)):
+                self.message_string = 'Starting data streaming'
+                self.stats.reset()
+                self.start_latency = None
+                self.start_time = time.monotonic()
+                self.flush_requested = True
+                self.is_streaming = True
+                self.send_command(START_STREAMING_CMD, before_write=self.flush_input)
+        else:
+            self.message_string = 'Device is not connected.'
+
+    ##
+    #   @brief          Discard the bytes received before streaming is started.
+    #
+    #   Called by the I/O thread just before writing the start command, so
+    #   that a restart never delivers samples sent before the last stop.
+    #
+    #   @param[in]      port: the port owned by the thread.
+    def flush_input(self, port):
+        port.reset_input_buffer()
+        self.parser.reset()
+        self.flush_requested = False
+
+    ##
+    #   @brief          Deliver a batch of samples, if streaming.
+    #
+    #   Called by the thread receiving the samples. Batches are delivered
+    #   while holding \ref dispatch_lock, so that none is delivered once
+    #   \ref wait_quiet returns.
+    #
+    #   @param[in]      values: array of shape (n, 3) of x, y, z values received together.
+    def deliver_values(self, values):
+        with self.dispatch_lock:
+            if (not self.is_streaming or self.flush_requested):
+                return
+            if (self.start_latency is None):
+                self.start_latency = (time.monotonic() - self.start_time) * 1000
+                self.message_string = f'Streaming started, first sample after {self.start_latency:.0f} ms'
+            self.dispatch_values(values)
+
+    ##
+    #   @brief          Wait until the batch being delivered, if any, is done.
+    #
+    #   Called after \ref is_streaming is cleared: no batch is delivered
+    #   after this function returns.
+    #
+    #   @param[in]      stop_time: time at which streaming was stopped.
+    #   @return         time in ms from stop_time to the end of the wait.
+    def wait_quiet(self, stop_time):
+        with self.dispatch_lock:
+            return (time.monotonic() - stop_time) * 1000
+
+    ##
+    #   @brief          Deliver a batch of samples to recorder and callbacks.
+    #
+    #   @param[in]      values: array of shape (n, 3) of x, y, z values received together.
+    def dispatch_values(self, values):
+        records = make_records(time.monotonic() - self.start_time, values)
+        recorder = self.recorder
+        if (recorder is not None):
+            recorder.write(records)
+        for record_callback in self.record_callbacks:
+            record_callback(records)
+        batch_callbacks = self.batch_callbacks
+        callbacks = self.callbacks
+        if (batch_callbacks or callbacks):
+            packets = [LIS3DHDataPacket(*sample) for sample in values.tolist()]
+            for batch_callback in batch_callbacks:
+                batch_callback(packets)
+            for packet in packets:
+                for callback in callbacks:
+                    callback(packet)
+        self.stats.add(len(values))
+
+    ##
+    #   @brief          Stop data streaming.
+    #
+    #   Stop data streaming and show statistics on collected data.
+    #   @return         the queued \ref common.commands.Command.
+    def stop_streaming(self):
+        stop_time = time.monotonic()
+        self.is_streaming = False
+        self.stop_latency = self.wait_quiet(stop_time)
+        if (self.samples_counter == 0):
+            self.message_string = f'Stopped streaming data'
+        else:
+            self.message_string = f'Stopped streaming data. Collected {self.samples_counter:d} samples with {self.stats.mean_rate():.2f} Hz sample rate.'
+        return self.send_command(STOP_STREAMING_CMD)
+
+    ##
+    #   @brief          Publish acquired samples on a shared memory ring.
+    #
+    #   The ring is created the first time this function is called.
+    #
+    #   @param[in]      capacity: number of samples kept in the ring.
+    #   @param[in]      name: optional name of the shared memory block.
+    #   @return         the \ref lis3dh.sample_bus.SampleBus with x, y, z channels.
+    def enable_sample_bus(self, capacity=None, name=None):
+        if (self.sample_bus is None):
+            from lis3dh.sample_bus import DEFAULT_CAPACITY, SampleBus
+            self.sample_bus = SampleBus(capacity or DEFAULT_CAPACITY, 3, name)
+            self.add_record_callback(self.write_sample_bus)
+        return self.sample_bus
+
+    ##
+    #   @brief          Stop publishing samples and release the shared memory ring.
+    def disable_sample_bus(self):
+        sample_bus = self.sample_bus
+        if (sample_bus is not None):
+            self.remove_callback(self.write_sample_bus)
+            self.sample_bus = None
+            sample_bus.close()
+
+    ##
+    #   @brief          Write a batch of samples on the shared memory ring.
+    def write_sample_bus(self, records):
+        sample_bus = self.sample_bus
+        if (sample_bus is not None):
+            sample_bus.write(record_values(records))
+
+    ##
+    #   @brief          Start recording acquired samples to file.
+    #
+    #   @param[in]      path: path of the recording file.
+    def start_recording(self, path):
+        self.stop_recording()
+        self.recorder = Recorder(path, self.sample_rate)
+        self.message_string = f'Recording to {path}'
+
+    ##
+    #   @brief          Stop recording and close the recording file.
+    def stop_recording(self):
+        recorder = self.recorder
+        self.recorder = None
+        if (recorder is not None):
+            recorder.close()
+
+    ##
+    #   @brief          Update sample rate on board
+    #
+    #   Update the accelerometer sample rate based on selected value.
+    #   The \ref sample_rate is updated only after the board confirms
+    #   the command.
+    #   @param[in]      value: the desired sample rate to be set (e.g., '100 Hz').
+    #   @return         the queued \ref common.commands.Command, None if value is invalid.
+    def update_sample_rate_on_board(self, value):
+        if (value not in SAMPLE_RATE_CMDS):
+            self.message_string = "Could not update sample rate"
+            return None
+
+        def sample_rate_updated(command):
+            if (command.succeeded()):
+                self.sample_rate = int(value.split(' ')[0])
+                self.message_string = f'Updated sample rate to {value}'
+            else:
+                self.message_string = f'Could not update sample rate ({command.status})'
+        return self.send_command(SAMPLE_RATE_CMDS[value], sample_rate_updated)
+
+    ##
+    #   @brief          Select full scale range on board.
+    #
+    #   The scaling of the values changes as soon as the board confirms
+    #   the command, as the same thread parses the following packets.
+    #   @param[in]      value: the desired full scale range (e.g., '+/-4g').
+    #   @return         the queued \ref common.commands.Command, None if value is invalid.
+    def select_range(self, value):
+        if (value not in FULL_SCALE_RANGE_CMDS):
+            self.message_string = "Could not update full scale range"
+            return None
+
+        def range_updated(command):
+            if (command.succeeded()):
+                full_scale_range = int(value[3:-1])
+                self.parser.set_mode(full_scale_range, self.resolution)
+                self.full_scale_range = full_scale_range
+                self.message_string = f'Updated full scale range to {value}'
+            else:
+                self.message_string = f'Could not update full scale range ({command.status})'
+        return self.send_command(FULL_SCALE_RANGE_CMDS[value], range_updated)
+
+    ##
+    #   @brief          Select resolution mode on board.
+    #
+    #   @param[in]      value: the desired resolution mode (e.g., 'Normal (10 bit)').
+    #   @return         the queued \ref common.commands.Command, None if value is invalid.
+    def select_resolution(self, value):
+        if (value not in RESOLUTION_CMDS):
+            self.message_string = "Could not update resolution"
+            return None
+
+        def resolution_updated(command):
+            if (command.succeeded()):
+                resolution = RESOLUTION_BITS[value]
+                self.parser.set_mode(self.full_scale_range, resolution)
+                self.resolution = resolution
+                self.message_string = f'Updated resolution to {value}'
+            else:
+                self.message_string = f'Could not update resolution ({command.status})'
+        return self.send_command(RESOLUTION_CMDS[value], resolution_updated)
+
+    ##
+    #   @brief          Set the calibration of the axes.
+    #
+    #   @param[in]      offsets: x, y, z offsets in g, subtracted from the values.
+    #   @param[in]      gains: x, y, z gains, applied after the offsets.
+    def set_calibration(self, offsets=None, gains=None):
+        self.parser.set_calibration(offsets, gains)
+
+    ##
+    #   @brief          Apply the stored calibration profile of the connected board.
+    #
+    #   Boards without a stored profile are not calibrated.
+    #   @return         the applied \ref lis3dh.calibration.CalibrationProfile, or None.
+    def load_calibration(self):
+        try:
+            profile = self.calibration_store.load(self.board_id)
+        except (OSError, ValueError, KeyError):
+            self.message_string = f'Could not read {self.calibration_store.path}'
+            profile = None
+        if (profile is None):
+            self.set_calibration()
+        else:
+            self.set_calibration(profile.offsets, profile.gains)
+            self.message_string = f'Loaded calibration of {self.board_id}'
+        return profile
+
+    ##
+    #   @brief          Start measuring the positions of a calibration.
+    #
+    #   The current calibration is removed, so that uncalibrated values
+    #   are measured. Samples are fed to the session while streaming.
+    #   @param[in]      n_samples: number of samples averaged for each position.
+    #   @return         the \ref lis3dh.calibration.CalibrationSession.
+    def start_calibration(self, n_samples=DEFAULT_CALIBRATION_SAMPLES):
+        self.set_calibration()
+        self.calibration_session = CalibrationSession(n_samples)
+        self.add_record_callback(self.calibrate)
+        return self.calibration_session
+
+    ##
+    #   @brief          Feed a batch of samples to the calibration session.
+    def calibrate(self, records):
+        session = self.calibration_session
+        if (session is not None):
+            session.process(record_values(records))
+
+    ##
+    #   @brief          Stop the calibration.
+    #
+    #   @param[in]      profile: the new \ref lis3dh.calibration.CalibrationProfile
+    #                   to be stored for the board, None to restore the previous one.
+    def stop_calibration(self, profile=None):
+        self.remove_callback(self.calibrate)
+        self.calibration_session = None
+        if (profile is not None):
+            self.calibration_store.save(self.board_id, profile)
+            self.message_string = f'Saved calibration of {self.board_id}'
+        self.load_calibration()
+
+    ##
+    #   @brief          Get if serial port is connected.
+    #   @return         True if connected, False otherwise
+    def is_connected(self):
+        if (self.connected == CONNECTION_STATE_CONNECTED):
+            return True
+        else:
+            return False
+
+
+##
+#   @brief          Parse command line arguments of the headless acquisition.
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m lis3dh.acquire',
+        description='Headless acquisition of LIS3DH data, without Kivy.')
+    parser.add_argument('--rate', type=int, default=1,
+                        choices=[int(k.split(' ')[0]) for k in SAMPLE_RATE_CMDS],
+                        help='sample rate in Hz (default: %(default)s)')
+    parser.add_argument('--range', type=int, default=DEFAULT_FULL_SCALE_RANGE,
+                        choices=sorted(SENSITIVITY),
+                        help='full scale range in g (default: %(default)s)')
+    parser.add_argument('--resolution', type=int, default=DEFAULT_RESOLUTION,
+                        choices=sorted(RESOLUTION_BITS.values()),
+                        help='resolution in bits (default: %(default)s)')
+    parser.add_argument('--out', required=True,
+                        help='path of the recording file')
+    parser.add_argument('--port', default='',
+                        help='serial port of the board (default: automatic discovery)')
+    parser.add_argument('--baudrate', type=int, default=115200,
+                        help='baudrate (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=0,
+                        help='acquisition duration in seconds (default: until Ctrl-C)')
+    parser.add_argument('--serve', default='',
+                        help='publish samples on tcp://host:port or unix:///path')
+    parser.add_argument('--bus', default='',
+                        help='publish samples on a shared memory ring with this name')
+    return parser.parse_args(argv)
+
+
+##
+#   @brief          Entry point of the headless acquisition.
+def main(argv=None):
+    args = parse_args(argv)
+    acquisition = LIS3DHAcquisition(baudrate=args.baudrate)
+
+    def print_message(name, value):
+        if (name == 'message_string'):
+            print(value, file=sys.stderr)
+    acquisition.add_listener(print_message)
+
+    publisher = None
+    if (args.serve):
+        from lis3dh.network import SamplePublisher
+        publisher = SamplePublisher(args.serve)
+        publisher.attach(acquisition)
+        publisher.start()
+    if (args.bus):
+        acquisition.enable_sample_bus(name=args.bus)
+
+    if (args.port):
+        acquisition.port_name = args.port
+        if (acquisition.connect() != 0):
+            return 1
+    else:
+        acquisition.find_port()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    for command in (acquisition.update_sample_rate_on_board(f'{args.rate} Hz'),
+                    acquisition.select_range(full_scale_range_label(args.range)),
+                    acquisition.select_resolution(resolution_label(args.resolution))):
+        command.wait()
+        if (not command.succeeded()):
+            acquisition.disconnect()
+            return 1
+    acquisition.start_recording(args.out)
+    acquisition.start_streaming()
+    start_time = time.monotonic()
+    try:
+        while (not stop_event.wait(1)):
+            print(f'Samples: {acquisition.samples_counter:6d} | '
+                  f'Sample Rate: {acquisition.current_sample_rate:5.2f} Hz',
+                  file=sys.stderr)
+            if (args.duration and time.monotonic() - start_time >= args.duration):
+                break
+    finally:
+        acquisition.stop_streaming().wait(DEFAULT_COMMAND_TIMEOUT)
+        acquisition.stop_recording()
+        if (acquisition.start_latency is not None):
+            print(f'Start latency: {acquisition.start_latency:.1f} ms | '
+                  f'Stop latency: {acquisition.stop_latency:.1f} ms', file=sys.stderr)
+        acquisition.disconnect()
+        if (publisher is not None):
+            publisher.close()
+        acquisition.disable_sample_bus()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
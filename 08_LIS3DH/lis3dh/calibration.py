@@ -0,0 +1,193 @@
+##
+# @package lis3dh.calibration
+#
+#   Six-position calibration of the accelerometer axes.
+#
+#   The board is placed with each axis pointing up and down in turn
+#   (tumble test), and the average value of each position is measured
+#   on the live stream. For each axis, +1 g and -1 g readings give
+#   the zero-g offset and the gain:
+#
+#       offset = (a_up + a_down) / 2
+#       gain = 2 / (a_up - a_down)
+#
+#   so that the calibrated value is (value - offset) * gain. Profiles
+#   are stored in a JSON file, keyed by the identity of the board: its
+#   response to the connection command, which is the same for all the
+#   boards with the same firmware, and the USB serial number of its port.
+
+from datetime import datetime
+import json
+import os
+import numpy as np
+
+##
+#   @brief          Default file where calibration profiles are stored.
+CALIBRATION_FILE = 'calibration.json'
+
+##
+#   @brief          Default number of samples averaged for each position.
+DEFAULT_CALIBRATION_SAMPLES = 50
+
+##
+#   @brief          Minimum difference in g between the up and down positions of an axis.
+MIN_CALIBRATION_SPAN = 1.
+
+##
+#   @brief          Positions of the tumble test: name, axis column and expected value in g.
+CALIBRATION_POSITIONS = [
+    ('+X', 0, 1.),
+    ('-X', 0, -1.),
+    ('+Y', 1, 1.),
+    ('-Y', 1, -1.),
+    ('+Z', 2, 1.),
+    ('-Z', 2, -1.)
+]
+
+
+##
+#   @brief          Get the identity of a board from its response to the connection command.
+#
+#   @param[in]      banner: string received from the board.
+#   @param[in]      port_identity: identity of the USB device of the port of the
+#                   board (see common.hotplug.usb_port_identity), '' if unknown.
+#   @return         the banner without the trailing $$$ and white spaces, followed
+#                   by the identity of the port if known.
+def board_identity(banner, port_identity=''):
+    identity = ' '.join(banner.replace('$', ' ').split())
+    if (port_identity):
+        identity += ' / ' + port_identity
+    return identity
+
+
+##
+#   @brief          Offsets and gains of the three axes.
+class CalibrationProfile():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      offsets: x, y, z offsets in g.
+    #   @param[in]      gains: x, y, z gains.
+    #   @param[in]      timestamp: date and time of the calibration.
+    def __init__(self, offsets, gains, timestamp=None):
+        self.offsets = [float(value) for value in offsets]
+        self.gains = [float(value) for value in gains]
+        self.timestamp = timestamp or datetime.now()
+
+    def to_dict(self):
+        return {'offsets': self.offsets, 'gains': self.gains,
+                'timestamp': self.timestamp.isoformat()}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(values['offsets'], values['gains'],
+                   datetime.fromisoformat(values['timestamp']))
+
+
+##
+#   @brief          Measurement of the six positions of the tumble test.
+#
+#   Samples are fed in batches with \ref process, e.g. from a batch
+#   callback of the acquisition: only the position started with
+#   \ref start_position is measured, until \ref n_samples are averaged.
+#
+class CalibrationSession():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      n_samples: number of samples averaged for each position.
+    def __init__(self, n_samples=DEFAULT_CALIBRATION_SAMPLES):
+        self.n_samples = n_samples
+        self.means = {}             # average x, y, z values of each measured position
+        self.position = None        # position being measured
+        self.sum = np.zeros(3)
+        self.count = 0
+
+    ##
+    #   @brief          Start measuring a position.
+    #   @param[in]      position: name of the position (e.g., '+X').
+    def start_position(self, position):
+        self.sum = np.zeros(3)
+        self.count = 0
+        self.position = position
+
+    ##
+    #   @brief          Accumulate a batch of samples.
+    #   @param[in]      samples: array of shape (n, 3) of uncalibrated values.
+    def process(self, samples):
+        position = self.position
+        if (position is None):
+            return
+        samples = samples[:self.n_samples - self.count]
+        self.sum += samples.sum(axis=0)
+        self.count += len(samples)
+        if (self.count >= self.n_samples):
+            self.means[position] = self.sum / self.count
+            self.position = None
+
+    ##
+    #   @brief          Fraction of samples measured for the current position.
+    def progress(self):
+        return min(1., self.count / float(self.n_samples))
+
+    ##
+    #   @brief          True if all the positions were measured.
+    def is_complete(self):
+        return all(name in self.means for name, _, _ in CALIBRATION_POSITIONS)
+
+    ##
+    #   @brief          Compute the calibration profile.
+    #
+    #   A ValueError is raised if an axis did not measure about 2 g
+    #   between its up and down positions, e.g. if the board was not turned.
+    #   @return         the \ref CalibrationProfile of the measured positions.
+    def compute(self):
+        offsets = np.zeros(3)
+        gains = np.ones(3)
+        for axis in range(3):
+            up, down = [self.means[name][axis] for name, column, _ in CALIBRATION_POSITIONS
+                        if column == axis]
+            if (up - down < MIN_CALIBRATION_SPAN):
+                raise ValueError(f'Axis {"XYZ"[axis]} measured {up - down:.2f} g '
+                                 'between its up and down positions')
+            offsets[axis] = (up + down) / 2.
+            gains[axis] = 2. / (up - down)
+        return CalibrationProfile(offsets, gains)
+
+
+##
+#   @brief          Store of calibration profiles on disk.
+#
+#   All the profiles are kept in a single JSON file, with the identity
+#   of the board as key.
+#
+class CalibrationStore():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      path: path of the JSON file.
+    def __init__(self, path=CALIBRATION_FILE):
+        self.path = path
+
+    def load_all(self):
+        if (not os.path.exists(self.path)):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    ##
+    #   @brief          Load the profile of a board.
+    #   @return         the \ref CalibrationProfile, None if the board was never calibrated.
+    def load(self, board_id):
+        values = self.load_all().get(board_id)
+        if (values is None):
+            return None
+        return CalibrationProfile.from_dict(values)
+
+    ##
+    #   @brief          Save the profile of a board, replacing the previous one.
+    def save(self, board_id, profile):
+        profiles = self.load_all()
+        profiles[board_id] = profile.to_dict()
+        with open(self.path, 'w') as f:
+            json.dump(profiles, f, indent=4)
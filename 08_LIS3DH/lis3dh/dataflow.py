@@ -0,0 +1,202 @@
+##
+# @package lis3dh.dataflow
+#
+#   Dataflow graph of channels derived from the acceleration samples.
+#
+#   Each \ref DataflowNode computes a channel from the batch of x, y, z
+#   samples or from other channels. A \ref Dataflow evaluates only the
+#   channels that are requested and their inputs, once per batch, so
+#   that channels shared by several consumers are never computed twice,
+#   and channels nobody looks at are not computed at all.
+#
+#   Stateful nodes (filters) are reset when they were not computed on the
+#   previous batch, so that they restart cleanly when shown again.
+
+from abc import ABC, abstractmethod
+import numpy as np
+
+##
+#   @brief          Name of the source channel, with x, y, z acceleration in g.
+SOURCE_CHANNEL = 'xyz'
+
+##
+#   @brief          Standard gravity in m/s^2.
+STANDARD_GRAVITY = 9.80665
+
+##
+#   @brief          Cutoff frequency in Hz of the high-pass filters of the velocity.
+HIGH_PASS_CUTOFF = 0.5
+
+##
+#   @brief          Maximum ratio between powers of the pole in \ref leaky_integrate.
+_MAX_POLE_RATIO = 1e12
+
+
+##
+#   @brief          Pole of a first order filter with the given cutoff frequency.
+def first_order_pole(cutoff, sample_rate):
+    return float(np.exp(-2. * np.pi * cutoff / max(sample_rate, 1)))
+
+
+##
+#   @brief          Compute y[n] = a * y[n-1] + u[n] on a batch, without a Python loop.
+#
+#   The recursion is solved in closed form, y[n] = a^(n+1) * (y0 + sum(u[k] / a^(k+1))),
+#   over blocks short enough to keep the powers of a in range.
+#
+#   @param[in]      u: array of shape (n, channels).
+#   @param[in]      a: pole of the filter, 0 < a < 1.
+#   @param[in]      y0: value of y before the batch, array of shape (channels,).
+#   @return         tuple with y and its last value.
+def leaky_integrate(u, a, y0):
+    y = np.empty_like(u)
+    block_size = int(min(1024, max(1, np.log(_MAX_POLE_RATIO) / -np.log(a))))
+    for start in range(0, len(u), block_size):
+        block = u[start:start + block_size]
+        powers = (a ** np.arange(1, len(block) + 1))[:, None]
+        y[start:start + len(block)] = powers * (y0 + np.cumsum(block / powers, axis=0))
+        y0 = y[start + len(block) - 1]
+    return y, y0
+
+
+##
+#   @brief          Base class of the nodes of a \ref Dataflow.
+class DataflowNode(ABC):
+
+    ##
+    #   @brief          Names of the input channels.
+    inputs = (SOURCE_CHANNEL,)
+
+    ##
+    #   @brief          Reset the state of the node.
+    #   @param[in]      sample_rate: current sample rate in Hz.
+    def reset(self, sample_rate):
+        pass
+
+    ##
+    #   @brief          Compute the channel on a batch.
+    #
+    #   @param[in]      values: arrays of the input channels, of shape (n, channels).
+    #   @return         array of shape (n, channels) of the computed channel.
+    @abstractmethod
+    def compute(self, *values):
+        pass
+
+
+##
+#   @brief          Magnitude sqrt(x^2 + y^2 + z^2) in g.
+class MagnitudeNode(DataflowNode):
+
+    def compute(self, xyz):
+        return np.sqrt(np.square(xyz, dtype=np.float64).sum(axis=1, keepdims=True))
+
+
+##
+#   @brief          Pitch and roll angles in degrees, from the direction of gravity.
+class TiltNode(DataflowNode):
+
+    def compute(self, xyz):
+        xyz = xyz.astype(np.float64)
+        x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+        pitch = np.arctan2(-x, np.sqrt(y * y + z * z))
+        roll = np.arctan2(y, z)
+        return np.degrees(np.column_stack((pitch, roll)))
+
+
+##
+#   @brief          First order high-pass filter, removing gravity from x, y, z.
+class HighPassNode(DataflowNode):
+
+    def reset(self, sample_rate):
+        self.a = first_order_pole(HIGH_PASS_CUTOFF, sample_rate)
+        self.last_input = None
+        self.last_output = np.zeros(3)
+
+    def compute(self, xyz):
+        xyz = xyz.astype(np.float64)
+        if (self.last_input is None):
+            self.last_input = xyz[0]
+        # y[n] = a * (y[n-1] + x[n] - x[n-1])
+        u = self.a * np.diff(xyz, axis=0, prepend=self.last_input[None, :])
+        self.last_input = xyz[-1]
+        y, self.last_output = leaky_integrate(u, self.a, self.last_output)
+        return y
+
+
+##
+#   @brief          Velocity in m/s, as leaky integral of the high-passed acceleration.
+class VelocityNode(DataflowNode):
+    inputs = ('dynamic',)
+
+    def reset(self, sample_rate):
+        self.a = first_order_pole(HIGH_PASS_CUTOFF, sample_rate)
+        self.dt = 1. / max(sample_rate, 1)
+        self.last_output = np.zeros(3)
+
+    def compute(self, dynamic):
+        y, self.last_output = leaky_integrate(dynamic * (STANDARD_GRAVITY * self.dt),
+                                              self.a, self.last_output)
+        return y
+
+
+##
+#   @brief          Graph of derived channels, evaluated lazily once per batch.
+class Dataflow():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      sample_rate: sample rate in Hz.
+    def __init__(self, sample_rate=1):
+        self.sample_rate = sample_rate
+        self.nodes = {}
+        self.batch = 0              # index of the current batch
+        self.computed = {}          # index of the last batch computed by each node
+
+    ##
+    #   @brief          Add a node computing the channel with the given name.
+    def add(self, name, node):
+        self.nodes[name] = node
+
+    ##
+    #   @brief          Set the sample rate, resetting all the nodes.
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.computed = {}
+
+    ##
+    #   @brief          Process a batch of samples.
+    #
+    #   @param[in]      samples: array of shape (n, 3) of x, y, z samples.
+    #   @param[in]      channels: names of the requested channels.
+    #   @return         dictionary with the array of each requested channel.
+    def process(self, samples, channels):
+        cache = {SOURCE_CHANNEL: samples}
+        outputs = {name: self.evaluate(name, cache) for name in channels}
+        self.batch += 1
+        return outputs
+
+    ##
+    #   @brief          Compute a channel, and its inputs, if not computed yet in this batch.
+    def evaluate(self, name, cache):
+        if (name not in cache):
+            node = self.nodes[name]
+            values = [self.evaluate(input_name, cache) for input_name in node.inputs]
+            if (self.computed.get(name) != self.batch - 1):
+                node.reset(self.sample_rate)
+            cache[name] = node.compute(*values)
+            self.computed[name] = self.batch
+        return cache[name]
+
+
+##
+#   @brief          Create the dataflow of the derived channels shown by the GUI.
+#
+#   Channels are 'magnitude', 'tilt' (pitch, roll) and 'velocity' (x, y, z),
+#   the latter computed from the high-passed acceleration 'dynamic'.
+def create_dataflow(sample_rate=1):
+    dataflow = Dataflow(sample_rate)
+    dataflow.add('magnitude', MagnitudeNode())
+    dataflow.add('tilt', TiltNode())
+    dataflow.add('dynamic', HighPassNode())
+    dataflow.add('velocity', VelocityNode())
+    return dataflow
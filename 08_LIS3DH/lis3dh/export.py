@@ -0,0 +1,276 @@
+##
+# @package lis3dh.export
+#
+#   Export of recordings to CSV or Parquet files.
+#
+#   Recordings written by \ref lis3dh.acquire.Recorder are converted chunk
+#   by chunk: chunks are read from disk, optionally decimated or resampled,
+#   and formatted by a pool of processes, while the main process writes
+#   them to the output file in order. At most a few chunks are in memory
+#   at any time, whatever the length of the recording:
+#
+#       python -m lis3dh.export capture.bin capture.csv --decimate 10
+#
+#   Parquet export requires pyarrow.
+
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import io
+import os
+import sys
+import numpy as np
+
+from lis3dh.acquire import SAMPLE_DTYPE, Recorder
+
+##
+#   @brief          Data type of the records of a recording file.
+RECORD_DTYPE = SAMPLE_DTYPE
+
+##
+#   @brief          Default number of records read for each chunk.
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+##
+#   @brief          Supported output formats.
+EXPORT_FORMATS = ('csv', 'parquet')
+
+##
+#   @brief          Header of the CSV files.
+CSV_HEADER = 'time,x,y,z\n'
+
+##
+#   @brief          Format of a row of the CSV files.
+CSV_FORMAT = '%.6f,%.4f,%.4f,%.4f'
+
+
+##
+#   @brief          Read the header of a recording.
+#
+#   @param[in]      path: path of the recording file.
+#   @return         tuple with sample rate set on the board and number of records.
+def read_recording_header(path):
+    with open(path, 'rb') as f:
+        header = f.read(Recorder.HEADER_STRUCT.size)
+    if (len(header) < Recorder.HEADER_STRUCT.size):
+        raise ValueError(f'{path} is not a recording')
+    magic, sample_rate = Recorder.HEADER_STRUCT.unpack(header)
+    if (magic != Recorder.MAGIC):
+        raise ValueError(f'{path} is not a recording')
+    n_records = (os.path.getsize(path) - Recorder.HEADER_STRUCT.size) // RECORD_DTYPE.itemsize
+    return sample_rate, n_records
+
+
+##
+#   @brief          Read a range of records of a recording.
+#
+#   @param[in]      path: path of the recording file.
+#   @param[in]      start: index of the first record.
+#   @param[in]      stop: index after the last record.
+#   @return         structured array with t, x, y, z fields.
+def read_records(path, start, stop):
+    return np.fromfile(path, dtype=RECORD_DTYPE, count=stop - start,
+                       offset=Recorder.HEADER_STRUCT.size + start * RECORD_DTYPE.itemsize)
+
+
+##
+#   @brief          Average blocks of samples.
+#
+#   @param[in]      records: structured array of records.
+#   @param[in]      factor: number of records averaged for each output sample.
+#   @return         tuple with time and x, y, z arrays.
+def decimate_records(records, factor):
+    n_blocks = -(-len(records) // factor)
+    boundaries = np.arange(n_blocks) * factor
+    counts = np.diff(np.append(boundaries, len(records)))
+    return tuple(np.add.reduceat(records[name].astype(np.float64), boundaries) / counts
+                 for name in RECORD_DTYPE.names)
+
+
+##
+#   @brief          Convert a chunk of a recording.
+#
+#   This function runs in the worker processes: the chunk is read from
+#   disk, so that only its description is sent to the worker.
+#
+#   @param[in]      task: tuple with path, start, stop, number of records,
+#                   output format, decimation factor, input and output sample rates.
+#   @return         CSV bytes, or dictionary of arrays for Parquet.
+def export_chunk(task):
+    path, start, stop, n_records, fmt, decimate, sample_rate, resample = task
+    if (resample):
+        # Output samples whose position in the input falls in the chunk
+        ratio = sample_rate / float(resample)
+        first = int(np.ceil(start / ratio))
+        last = int(np.ceil(stop / ratio))
+        positions = np.arange(first, last) * ratio
+        records = read_records(path, start, min(stop + 1, n_records))
+        indices = np.arange(start, start + len(records))
+        columns = (np.arange(first, last) / float(resample),) + tuple(
+            np.interp(positions, indices, records[name]) for name in ('x', 'y', 'z'))
+    else:
+        records = read_records(path, start, stop)
+        if (decimate > 1):
+            columns = decimate_records(records, decimate)
+        else:
+            columns = tuple(records[name] for name in RECORD_DTYPE.names)
+    if (fmt == 'csv'):
+        output = io.BytesIO()
+        np.savetxt(output, np.column_stack(columns), fmt=CSV_FORMAT)
+        return output.getvalue()
+    return dict(zip(RECORD_DTYPE.names, columns))
+
+
+##
+#   @brief          Writer of CSV files.
+class _CSVWriter():
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(CSV_HEADER.encode('utf-8'))
+
+    def write(self, result):
+        self.file.write(result)
+
+    def close(self):
+        self.file.close()
+
+
+##
+#   @brief          Writer of Parquet files.
+class _ParquetWriter():
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet export requires pyarrow')
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(name, pyarrow.float64()) for name in RECORD_DTYPE.names])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, result):
+        self.writer.write_table(self.pyarrow.table(
+            {name: np.asarray(values, dtype=np.float64) for name, values in result.items()},
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+##
+#   @brief          Check the decimation factor and resample rate of an export.
+#
+#   @param[in]      decimate: number of samples averaged for each output sample.
+#   @param[in]      resample: output sample rate in Hz, None to keep the recorded samples.
+#   @throws         ValueError with a message for the user if the options are not valid.
+def check_export_options(decimate, resample):
+    if (decimate < 1):
+        raise ValueError('Decimation must be at least 1')
+    if (resample is not None):
+        if (not np.isfinite(resample) or resample <= 0):
+            raise ValueError('Resample rate must be greater than 0 Hz')
+        if (decimate > 1):
+            raise ValueError('Decimation and resampling cannot be combined')
+
+
+##
+#   @brief          Export a recording to a CSV or Parquet file.
+#
+#   @param[in]      path: path of the recording file.
+#   @param[in]      out_path: path of the output file.
+#   @param[in]      fmt: 'csv' or 'parquet', guessed from out_path if None.
+#   @param[in]      decimate: number of samples averaged for each output sample.
+#   @param[in]      resample: output sample rate in Hz, None to keep the recorded samples.
+#                   Decimation and resampling cannot be combined.
+#   @param[in]      chunk_size: number of records of each chunk.
+#   @param[in]      workers: number of worker processes, None for one per CPU.
+#   @param[in]      progress: optional function called with chunks done and total chunks.
+#   @return         number of chunks written.
+#   @throws         ValueError if the options are not valid, or the file is not a recording.
+def export_recording(path, out_path, fmt=None, decimate=1, resample=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, workers=None, progress=None):
+    if (fmt is None):
+        fmt = 'parquet' if out_path.endswith('.parquet') else 'csv'
+    if (fmt not in EXPORT_FORMATS):
+        raise ValueError(f'Unknown format: {fmt}')
+    check_export_options(decimate, resample)
+    sample_rate, n_records = read_recording_header(path)
+    if (resample and not sample_rate):
+        raise ValueError('The recording has no sample rate, it cannot be resampled')
+    decimate = int(decimate)
+    # Chunks are made of whole decimation blocks
+    chunk_size = max(decimate, chunk_size // decimate * decimate)
+    tasks = [(path, start, min(start + chunk_size, n_records), n_records, fmt,
+              decimate, sample_rate, resample)
+             for start in range(0, n_records, chunk_size)]
+
+    writer = _ParquetWriter(out_path) if (fmt == 'parquet') else _CSVWriter(out_path)
+    done = 0
+
+    def write(result):
+        nonlocal done
+        writer.write(result)
+        done += 1
+        if (progress is not None):
+            progress(done, len(tasks))
+    try:
+        if (workers == 1 or len(tasks) <= 1):
+            for task in tasks:
+                write(export_chunk(task))
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(workers) as pool:
+                # Bound the number of chunks in flight, so memory does not grow
+                pending = collections.deque()
+                for task in tasks:
+                    pending.append(pool.submit(export_chunk, task))
+                    if (len(pending) >= 2 * workers):
+                        write(pending.popleft().result())
+                while (pending):
+                    write(pending.popleft().result())
+    finally:
+        writer.close()
+    return len(tasks)
+
+
+##
+#   @brief          Parse command line arguments of the exporter.
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m lis3dh.export',
+        description='Export a LIS3DH recording to CSV or Parquet.')
+    parser.add_argument('recording', help='path of the recording file')
+    parser.add_argument('output', help='path of the output file (.csv or .parquet)')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                        help='output format (default: from the output extension)')
+    parser.add_argument('--decimate', type=int, default=1,
+                        help='number of samples averaged for each output sample (default: %(default)s)')
+    parser.add_argument('--resample', type=float, default=None,
+                        help='output sample rate in Hz (default: recorded samples)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='number of records of each chunk (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    return parser.parse_args(argv)
+
+
+##
+#   @brief          Entry point of the exporter.
+def main(argv=None):
+    args = parse_args(argv)
+
+    def print_progress(done, total):
+        print(f'Exported chunk {done:d}/{total:d}', file=sys.stderr)
+    try:
+        export_recording(args.recording, args.output, args.format, args.decimate,
+                         args.resample, args.chunk_size, args.workers, print_progress)
+    except (OSError, ValueError, RuntimeError) as error:
+        print(f'Export failed: {error}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+##
+# @package lis3dh.linkbench
+#
+#   Benchmark of the serial link with the PSoC-LIS3DH board.
+#
+#   The benchmark owns the port, without the acquisition threads, so that
+#   it measures the board and the USB CDC link rather than the app:
+#       - round-trip time of the \ref lis3dh.acquire.CONNECTION_CMD handshake;
+#       - round-trip time of the acknowledged commands, if the firmware
+#         acknowledges them;
+#       - for each sample rate: frames received against frames expected,
+#         bytes skipped by the decoder, time from the start command to the
+#         first frame, and jitter of the arrivals;
+#       - command-to-effect latency of a sample rate change while streaming,
+#         located where the arrival rate of the frames changes.
+#
+#   The report is written as JSON. It runs against a board, or against
+#   a lis3dh.simulator.SimulatedBoard started in the same process:
+#
+#       python -m lis3dh.linkbench --port /dev/ttyACM0 --out link.json
+#       python -m lis3dh.linkbench --simulate --command-delay 2
+
+import argparse
+import sys
+import time
+import serial
+
+from common.frames import FrameDecoder
+from common.linkbench import (DEFAULT_RESPONSE_TIMEOUT, ArrivalLog, arrival_jitter, change_time,
+                              measure_round_trips, read_response, summarize, write_report)
+from lis3dh.acquire import (ACK_CAPABILITY, ACK_FRAME, CONNECTION_CMD, DATA_FRAME,
+                            SAMPLE_RATE_CMDS, START_STREAMING_CMD, STOP_STREAMING_CMD,
+                            WRITE_TIMEOUT)
+
+##
+#   @brief          Read timeout in seconds of the port while measuring.
+READ_TIMEOUT = 0.002
+
+##
+#   @brief          Minimum number of frames received at each sample rate.
+MIN_FRAMES_PER_RATE = 10
+
+##
+#   @brief          Fraction of the expected frames that a sustained rate must deliver.
+SUSTAINED_FRACTION = 0.98
+
+##
+#   @brief          Time in seconds waited for the stream to stop.
+DRAIN_TIME = 0.2
+
+##
+#   @brief          Time in seconds streamed before and after each rate change.
+RATE_CHANGE_PHASE = 1.0
+
+##
+#   @brief          Bits on the line for each byte: start bit, 8 data bits, stop bit.
+BITS_PER_BYTE = 10
+
+
+##
+#   @brief          Sample rate in Hz of a label of lis3dh.acquire.SAMPLE_RATE_CMDS.
+def rate_of(label):
+    return int(label.split(' ')[0])
+
+
+##
+#   @brief          Measurements on an open port of the board.
+class LinkBenchmark():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      port: open serial port of the board.
+    def __init__(self, port):
+        self.port = port
+        self.decoder = FrameDecoder([DATA_FRAME, ACK_FRAME])
+        self.arrivals = ArrivalLog()
+        self.acks = []              # (time, command, status) of the acknowledgements
+        self.ack_round_trips = []   # round-trip times of the acknowledged commands
+        self.ack_enabled = False
+
+    ##
+    #   @brief          Read the frames received until a given time.
+    def poll(self, until):
+        port = self.port
+        while (time.perf_counter() < until):
+            data = port.read(max(1, port.in_waiting))
+            if (not data):
+                continue
+            now = time.perf_counter()
+            frames = self.decoder.feed(data)
+            self.arrivals.add(now, len(frames['data']))
+            for ack in frames['ack']:
+                self.acks.append((now, int(ack['command']), int(ack['status'])))
+
+    ##
+    #   @brief          Discard the frames received so far, and the counters.
+    def reset(self):
+        self.decoder.reset()
+        self.arrivals = ArrivalLog()
+        self.acks = []
+
+    ##
+    #   @brief          Write a command.
+    #
+    #   If the firmware acknowledges commands, frames are read until the
+    #   acknowledgement, whose round-trip time is recorded.
+    #
+    #   @return         time at which the command was written.
+    def command(self, command):
+        start = time.perf_counter()
+        self.port.write(command.encode('ascii'))
+        if (self.ack_enabled):
+            n_acks = len(self.acks)
+            deadline = start + DEFAULT_RESPONSE_TIMEOUT
+            while (time.perf_counter() < deadline):
+                self.poll(time.perf_counter() + READ_TIMEOUT)
+                acked = [ack for ack in self.acks[n_acks:] if (ack[1] == ord(command))]
+                if (acked):
+                    self.ack_round_trips.append(acked[0][0] - start)
+                    break
+        return start
+
+    ##
+    #   @brief          Stop streaming and discard the frames still arriving.
+    def stop_streaming(self):
+        self.command(STOP_STREAMING_CMD)
+        self.poll(time.perf_counter() + DRAIN_TIME)
+        self.port.reset_input_buffer()
+        self.reset()
+
+    ##
+    #   @brief          Round trips of the connection handshake.
+    #   @return         dictionary of the report.
+    def measure_handshake(self, n):
+        markers = [b'$$$', b'LIS']
+        self.port.reset_input_buffer()
+        self.port.write(CONNECTION_CMD.encode('ascii'))
+        _, banner = read_response(self.port, markers)
+        banner = banner.decode('utf-8', errors='replace')
+        self.ack_enabled = ACK_CAPABILITY in banner
+        round_trips, n_timeouts = measure_round_trips(self.port, CONNECTION_CMD.encode('ascii'),
+                                                      markers, n)
+        report = summarize(round_trips)
+        report['timeouts'] = n_timeouts
+        return banner.strip(), report
+
+    ##
+    #   @brief          Stream at a sample rate for a given duration.
+    #   @return         dictionary of the report.
+    def measure_rate(self, label, duration, baudrate):
+        rate = rate_of(label)
+        duration = max(duration, MIN_FRAMES_PER_RATE / rate)
+        self.command(SAMPLE_RATE_CMDS[label])
+        self.reset()
+        start = self.command(START_STREAMING_CMD)
+        self.poll(start + duration)
+        times, counts = self.arrivals.arrays()
+        skipped_bytes = self.decoder.skipped_bytes
+        self.stop_streaming()
+        report = {
+            'rate_hz': rate,
+            'duration_s': round(duration, 3),
+            'frames': int(counts[-1]) if (len(counts)) else 0,
+            'skipped_bytes': skipped_bytes,
+            'line_usage': round(rate * DATA_FRAME.size * BITS_PER_BYTE / baudrate, 4),
+        }
+        if (len(times) == 0):
+            report['sustained'] = False
+            return report
+        # Frames expected from the first one, so that the start latency is not counted
+        expected = int((start + duration - times[0]) * rate) + 1
+        report['expected_frames'] = expected
+        report['first_frame_ms'] = round((times[0] - start) * 1000, 3)
+        report['jitter'] = arrival_jitter(times, counts)
+        report['sustained'] = bool(counts[-1] >= SUSTAINED_FRACTION * expected and
+                                   skipped_bytes == 0)
+        return report
+
+    ##
+    #   @brief          Latency of sample rate changes while streaming.
+    #   @return         dictionary of the report.
+    def measure_rate_change(self, old_label, new_label, n):
+        old_rate = rate_of(old_label)
+        latencies = []
+        for _ in range(n):
+            self.command(SAMPLE_RATE_CMDS[old_label])
+            self.reset()
+            start = self.command(START_STREAMING_CMD)
+            self.poll(start + RATE_CHANGE_PHASE)
+            command_time = self.command(SAMPLE_RATE_CMDS[new_label])
+            self.poll(command_time + RATE_CHANGE_PHASE)
+            times, counts = self.arrivals.arrays()
+            self.stop_streaming()
+            changed = change_time(times, counts, command_time, old_rate)
+            if (changed is not None):
+                latencies.append(changed - command_time)
+        report = {'from_hz': old_rate, 'to_hz': rate_of(new_label)}
+        report['latency'] = summarize(latencies)
+        report['not_detected'] = n - len(latencies)
+        return report
+
+
+##
+#   @brief          Run all the measurements.
+#   @return         dictionary of the report.
+def run_benchmark(port, args):
+    benchmark = LinkBenchmark(port)
+    benchmark.port.write(STOP_STREAMING_CMD.encode('ascii'))
+    time.sleep(DRAIN_TIME)
+    port.reset_input_buffer()
+    report = {'port': port.port, 'baudrate': port.baudrate}
+    print('Handshake round trips...', file=sys.stderr)
+    report['banner'], report['handshake'] = benchmark.measure_handshake(args.round_trips)
+    report['acknowledgements'] = benchmark.ack_enabled
+
+    labels = [label for label in SAMPLE_RATE_CMDS if (rate_of(label) in args.rates)]
+    report['rates'] = []
+    for label in labels:
+        print(f'Streaming at {label}...', file=sys.stderr)
+        report['rates'].append(benchmark.measure_rate(label, args.duration, port.baudrate))
+    sustained = [rate['rate_hz'] for rate in report['rates'] if (rate['sustained'])]
+    report['max_sustained_rate_hz'] = max(sustained) if (sustained) else None
+
+    if (len(labels) >= 2 and args.rate_changes > 0):
+        print(f'Rate changes from {labels[0]} to {labels[-1]}...', file=sys.stderr)
+        report['rate_change'] = benchmark.measure_rate_change(labels[0], labels[-1],
+                                                              args.rate_changes)
+    if (benchmark.ack_enabled):
+        report['command_ack'] = summarize(benchmark.ack_round_trips)
+    return report
+
+
+##
+#   @brief          Parse command line arguments of the link benchmark.
+def parse_args(argv=None):
+    rates = [rate_of(label) for label in SAMPLE_RATE_CMDS]
+    parser = argparse.ArgumentParser(
+        prog='python -m lis3dh.linkbench',
+        description='Latency, jitter and throughput of the link with a LIS3DH board.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--port',
+                        help='serial port of the board')
+    target.add_argument('--simulate', action='store_true',
+                        help='measure a simulated board on a pseudo-terminal')
+    parser.add_argument('--command-delay', type=float, default=0,
+                        help='time in ms taken by the simulated board to apply a command '
+                             '(default: %(default)s)')
+    parser.add_argument('--baudrate', type=int, default=115200,
+                        help='baudrate (default: %(default)s)')
+    parser.add_argument('--round-trips', type=int, default=100,
+                        help='number of handshake round trips (default: %(default)s)')
+    parser.add_argument('--rates', type=int, nargs='+', default=[r for r in rates if (r >= 10)],
+                        choices=rates, metavar='RATE',
+                        help='sample rates in Hz, stepped in increasing order '
+                             '(default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=3,
+                        help='streaming duration in seconds at each rate (default: %(default)s)')
+    parser.add_argument('--rate-changes', type=int, default=10,
+                        help='number of changes from the lowest to the highest rate '
+                             '(default: %(default)s)')
+    parser.add_argument('--out', default=None,
+                        help='path of the JSON report (default: printed)')
+    return parser.parse_args(argv)
+
+
+##
+#   @brief          Entry point of the link benchmark.
+def main(argv=None):
+    args = parse_args(argv)
+    board = None
+    port_name = args.port
+    if (args.simulate):
+        from lis3dh.simulator import SimulatedBoard
+        board = SimulatedBoard(ack=True, command_delay=args.command_delay / 1000)
+        board.start()
+        port_name = board.port_name
+    try:
+        port = serial.Serial(port=port_name, baudrate=args.baudrate, timeout=READ_TIMEOUT,
+                             write_timeout=WRITE_TIMEOUT)
+    except serial.SerialException as e:
+        print(f'Error when opening port: {e}', file=sys.stderr)
+        return 1
+    try:
+        report = run_benchmark(port, args)
+    finally:
+        port.write(STOP_STREAMING_CMD.encode('ascii'))
+        port.close()
+        if (board is not None):
+            board.stop()
+    write_report(report, args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
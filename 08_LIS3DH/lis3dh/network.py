@@ -0,0 +1,487 @@
+##
+# @package lis3dh.network
+#
+#   Local network streaming of acquired samples.
+#
+#   Only one process can own the serial port of the board. The
+#   \ref SamplePublisher serves the decoded batches of that process over
+#   a local TCP or Unix socket, so that other processes (loggers,
+#   notebooks, a second GUI) can receive the same live stream through
+#   a \ref NetworkSource.
+#
+#   Addresses are given as 'tcp://host:port' or 'unix:///path/to/socket'.
+#
+#   Each message on the socket is made of a header (2 bytes magic
+#   string, 1 byte message type, 4 bytes payload length, little-endian)
+#   followed by the payload:
+#       - \ref MSG_BATCH: index of the first sample (uint64) followed by
+#         x, y, z acceleration in g (3 x float32) for each sample
+#       - \ref MSG_SAMPLE_RATE: sample rate set on the board (uint32)
+#       - \ref MSG_MODE: full scale range in g and resolution in bits set
+#         on the board (2 x uint32)
+
+import collections
+import os
+import socket
+import struct
+import threading
+import time
+import numpy as np
+
+from lis3dh.acquire import (CONNECTION_STATE_CONNECTED, CONNECTION_STATE_DISCONNECTED,
+                            LIS3DHAcquisition, record_values)
+
+##
+#   @brief          Magic string at the start of each message.
+MSG_MAGIC = b'L3'
+
+##
+#   @brief          Message carrying a batch of samples.
+MSG_BATCH = 1
+
+##
+#   @brief          Message carrying the sample rate set on the board.
+MSG_SAMPLE_RATE = 2
+
+##
+#   @brief          Message carrying the full scale range and resolution set on the board.
+MSG_MODE = 3
+
+##
+#   @brief          Struct of the message header.
+MSG_HEADER_STRUCT = struct.Struct('<2sBI')
+
+##
+#   @brief          Struct of the header of a batch payload.
+BATCH_HEADER_STRUCT = struct.Struct('<Q')
+
+##
+#   @brief          Struct of a single sample in a batch payload.
+SAMPLE_STRUCT = struct.Struct('<fff')
+
+##
+#   @brief          Struct of a sample rate payload.
+SAMPLE_RATE_STRUCT = struct.Struct('<I')
+
+##
+#   @brief          Struct of a mode payload.
+MODE_STRUCT = struct.Struct('<II')
+
+##
+#   @brief          Default number of messages queued for each client.
+DEFAULT_QUEUE_SIZE = 256
+
+##
+#   @brief          Interval in seconds between two connection attempts to the publisher.
+RECONNECT_INTERVAL = 2
+
+
+##
+#   @brief          Parse a 'tcp://host:port' or 'unix:///path' address.
+#
+#   @param[in]      address: the address to be parsed.
+#   @return         tuple with socket family and socket address.
+#
+def parse_address(address):
+    if (address.startswith('unix://')):
+        return socket.AF_UNIX, address[len('unix://'):]
+    if (address.startswith('tcp://')):
+        host, _, port = address[len('tcp://'):].rpartition(':')
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    raise ValueError(f'Invalid address: {address}')
+
+
+##
+#   @brief          Encode a message with the given type and payload.
+def encode_message(msg_type, payload):
+    return MSG_HEADER_STRUCT.pack(MSG_MAGIC, msg_type, len(payload)) + payload
+
+
+##
+#   @brief          Encode a batch of samples into a \ref MSG_BATCH message.
+#
+#   @param[in]      first_index: index of the first sample in the stream.
+#   @param[in]      values: array of shape (n, 3) of x, y, z values.
+def encode_batch(first_index, values):
+    payload = BATCH_HEADER_STRUCT.pack(first_index) + np.ascontiguousarray(
+        values, dtype='<f4').tobytes()
+    return encode_message(MSG_BATCH, payload)
+
+
+##
+#   @brief          Decode the payload of a \ref MSG_BATCH message.
+#
+#   @return         tuple with index of the first sample and array of shape (n, 3) of x, y, z values.
+def decode_batch(payload):
+    first_index, = BATCH_HEADER_STRUCT.unpack_from(payload)
+    values = np.frombuffer(payload, dtype='<f4', offset=BATCH_HEADER_STRUCT.size)
+    return first_index, values.reshape(-1, SAMPLE_STRUCT.size // 4)
+
+
+##
+#   @brief          Connection of a client to the \ref SamplePublisher.
+#
+#   Messages are sent by a dedicated thread. Batches are kept in a bounded
+#   queue: when it is full, the oldest batch is dropped, so that a slow
+#   client never blocks the publisher. State messages (e.g., the sample
+#   rate) are few and small: they are kept in a separate queue, which
+#   is never dropped, and are sent before the queued batches.
+#
+class _PublisherClient():
+
+    def __init__(self, sock, queue_size):
+        self.socket = sock
+        self.queue = collections.deque(maxlen=queue_size)
+        self.control_queue = collections.deque()
+        self.event = threading.Event()
+        self.is_open = True
+        self.dropped_messages = 0
+
+    ##
+    #   @brief          Queue a batch message, dropping the oldest one if full.
+    def put(self, message):
+        if (len(self.queue) == self.queue.maxlen):
+            self.dropped_messages += 1
+        self.queue.append(message)
+        self.event.set()
+
+    ##
+    #   @brief          Queue a state message, which is never dropped.
+    def put_control(self, message):
+        self.control_queue.append(message)
+        self.event.set()
+
+    ##
+    #   @brief          Next message to be sent, None if no message is queued.
+    def next_message(self):
+        if (self.control_queue):
+            return self.control_queue.popleft()
+        if (self.queue):
+            return self.queue.popleft()
+        return None
+
+    ##
+    #   @brief          Target function of the thread sending messages.
+    def send_loop(self):
+        try:
+            while (self.is_open):
+                self.event.wait()
+                self.event.clear()
+                message = self.next_message()
+                while (message is not None):
+                    self.socket.sendall(message)
+                    message = self.next_message()
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.is_open = False
+        self.event.set()
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+##
+#   @brief          In-process publisher of acquired samples.
+#
+#   The publisher is attached to a \ref lis3dh.acquire.LIS3DHAcquisition:
+#   each batch of packets is encoded once and queued for every connected
+#   client. Publishing never blocks the reader thread.
+#
+class SamplePublisher():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      address: 'tcp://host:port' or 'unix:///path' address to serve.
+    #   @param[in]      queue_size: maximum number of messages queued for each client.
+    def __init__(self, address, queue_size=DEFAULT_QUEUE_SIZE):
+        self.address = address
+        self.queue_size = queue_size
+        self.clients = []
+        self.clients_lock = threading.Lock()
+        self.server_socket = None
+        self.samples_published = 0
+        self.sample_rate = 0
+        self.full_scale_range = 0
+        self.resolution = 0
+
+    ##
+    #   @brief          Publish data and state of an acquisition object.
+    def attach(self, acquisition):
+        self.sample_rate = acquisition.sample_rate
+        self.full_scale_range = acquisition.full_scale_range
+        self.resolution = acquisition.resolution
+        acquisition.add_record_callback(self.publish)
+        acquisition.add_listener(self.acquisition_event)
+
+    ##
+    #   @brief          Start serving clients in a background thread.
+    def start(self):
+        family, address = parse_address(self.address)
+        self.server_socket = socket.socket(family, socket.SOCK_STREAM)
+        if (family == socket.AF_UNIX):
+            try:
+                os.unlink(address)
+            except OSError:
+                pass
+        else:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(address)
+        self.server_socket.listen()
+        accept_thread = threading.Thread(target=self.accept_loop,
+                                         args=(self.server_socket,), daemon=True)
+        accept_thread.start()
+
+    ##
+    #   @brief          Target function of the thread accepting clients.
+    def accept_loop(self, server_socket):
+        while (True):
+            try:
+                sock, _ = server_socket.accept()
+            except OSError:
+                break
+            client = _PublisherClient(sock, self.queue_size)
+            client.put_control(encode_message(MSG_SAMPLE_RATE,
+                                              SAMPLE_RATE_STRUCT.pack(int(self.sample_rate))))
+            client.put_control(self.encode_mode())
+            with self.clients_lock:
+                self.clients = self.clients + [client]
+            threading.Thread(target=client.send_loop, daemon=True).start()
+
+    ##
+    #   @brief          Queue a message for all the connected clients.
+    #
+    #   @param[in]      message: the encoded message.
+    #   @param[in]      control: True for a state message, which is never dropped.
+    def broadcast(self, message, control=False):
+        clients = self.clients
+        if (any(not client.is_open for client in clients)):
+            with self.clients_lock:
+                self.clients = [client for client in self.clients if client.is_open]
+                clients = self.clients
+        for client in clients:
+            if (control):
+                client.put_control(message)
+            else:
+                client.put(message)
+
+    ##
+    #   @brief          Publish a batch of samples.
+    #
+    #   @param[in]      records: structured array of \ref lis3dh.acquire.SAMPLE_DTYPE.
+    def publish(self, records):
+        if (self.clients):
+            self.broadcast(encode_batch(self.samples_published, record_values(records)))
+        self.samples_published += len(records)
+
+    ##
+    #   @brief          Encode the full scale range and resolution into a \ref MSG_MODE message.
+    def encode_mode(self):
+        return encode_message(MSG_MODE, MODE_STRUCT.pack(int(self.full_scale_range),
+                                                         int(self.resolution)))
+
+    ##
+    #   @brief          Listener of state changes of the acquisition object.
+    def acquisition_event(self, name, value):
+        if (name == 'sample_rate'):
+            self.sample_rate = value
+            self.broadcast(encode_message(MSG_SAMPLE_RATE, SAMPLE_RATE_STRUCT.pack(int(value))),
+                           control=True)
+        elif (name in ('full_scale_range', 'resolution')):
+            setattr(self, name, value)
+            self.broadcast(self.encode_mode(), control=True)
+
+    ##
+    #   @brief          Stop serving and disconnect all the clients.
+    #
+    #   The file of a Unix socket is removed.
+    def close(self):
+        if (self.server_socket is not None):
+            self.server_socket.close()
+            self.server_socket = None
+            family, address = parse_address(self.address)
+            if (family == socket.AF_UNIX):
+                try:
+                    os.unlink(address)
+                except OSError:
+                    pass
+        for client in self.clients:
+            client.close()
+        self.clients = []
+
+
+##
+#   @brief          Acquisition source receiving samples from a \ref SamplePublisher.
+#
+#   This class has the same interface as \ref lis3dh.acquire.LIS3DHAcquisition,
+#   so it can stand in for it (e.g., in communication.KivySerial). Port
+#   discovery is replaced by connecting to the publisher, and reconnecting
+#   when it goes away, while the sample rate can only be changed by the
+#   process owning the board.
+#
+class NetworkSource(LIS3DHAcquisition):
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      address: 'tcp://host:port' or 'unix:///path' address of the publisher.
+    def __init__(self, address):
+        super(NetworkSource, self).__init__()
+        self.address = address
+        self.port_name = address
+        self.socket = None
+        self.next_index = None      # index of the next expected sample
+        self.lost_samples = 0       # samples dropped by the publisher
+        self.discovery_stop = None  # event stopping the discovery thread, while running
+
+    ##
+    #   @brief          Connect to the publisher in a background thread.
+    #
+    #   The connection is attempted every \ref RECONNECT_INTERVAL seconds
+    #   while disconnected, also after the publisher went away, until
+    #   \ref stop_discovery is called. No serial port is monitored.
+    def start_discovery(self):
+        if (self.discovery_stop is None):
+            self.discovery_stop = threading.Event()
+            discovery_thread = threading.Thread(target=self.discovery_loop,
+                                                args=(self.discovery_stop,), daemon=True)
+            discovery_thread.start()
+
+    ##
+    #   @brief          Stop connecting to the publisher.
+    def stop_discovery(self):
+        discovery_stop = self.discovery_stop
+        self.discovery_stop = None
+        if (discovery_stop is not None):
+            discovery_stop.set()
+
+    ##
+    #   @brief          Target function of the discovery thread.
+    #   @param[in]      stop: event set by \ref stop_discovery.
+    def discovery_loop(self, stop):
+        while (not stop.is_set()):
+            if (self.connected != CONNECTION_STATE_CONNECTED):
+                self.connect()
+            stop.wait(RECONNECT_INTERVAL)
+
+    ##
+    #   @brief          Connect to the publisher, retrying until it is available.
+    def find_port(self):
+        while (self.connect() != 0):
+            time.sleep(RECONNECT_INTERVAL)
+
+    ##
+    #   @brief          Connect to the publisher.
+    #
+    #   @return         0 if connection was successful, -1 otherwise
+    def connect(self):
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            self.message_string = f'Could not connect to {self.address}'
+            return -1
+        self.socket = sock
+        self.message_string = f'Connected to {self.address}'
+        self.connected = CONNECTION_STATE_CONNECTED
+        receive_thread = threading.Thread(target=self.receive_loop, daemon=True)
+        receive_thread.start()
+        return 0
+
+    ##
+    #   @brief          Disconnect from the publisher.
+    def disconnect(self):
+        if (self.socket is not None):
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    ##
+    #   @brief          Read exactly n bytes from the socket.
+    def recv_exactly(self, n):
+        data = bytearray()
+        while (len(data) < n):
+            chunk = self.socket.recv(n - len(data))
+            if (not chunk):
+                raise ConnectionError('Connection closed by publisher')
+            data.extend(chunk)
+        return data
+
+    ##
+    #   @brief          Target function of the thread receiving messages.
+    def receive_loop(self):
+        try:
+            while (True):
+                magic, msg_type, length = MSG_HEADER_STRUCT.unpack(
+                    self.recv_exactly(MSG_HEADER_STRUCT.size))
+                if (magic != MSG_MAGIC):
+                    raise ConnectionError('Invalid message from publisher')
+                payload = self.recv_exactly(length)
+                if (msg_type == MSG_BATCH):
+                    first_index, values = decode_batch(payload)
+                    if (self.next_index is not None and first_index > self.next_index):
+                        self.lost_samples += first_index - self.next_index
+                    self.next_index = first_index + len(values)
+                    if (len(values)):
+                        self.deliver_values(values)
+                elif (msg_type == MSG_SAMPLE_RATE):
+                    self.sample_rate, = SAMPLE_RATE_STRUCT.unpack(payload)
+                elif (msg_type == MSG_MODE):
+                    full_scale_range, resolution = MODE_STRUCT.unpack(payload)
+                    self.full_scale_range = full_scale_range
+                    self.resolution = resolution
+        except (OSError, struct.error):
+            pass
+        self.socket.close()
+        self.is_streaming = False
+        self.message_string = f'Disconnected from {self.address}'
+        self.connected = CONNECTION_STATE_DISCONNECTED
+
+    ##
+    #   @brief          Start delivering received samples to the callbacks.
+    def start_streaming(self):
+        if (self.connected == CONNECTION_STATE_CONNECTED):
+            if (not (self.is_streaming)):
+                self.message_string = 'Starting data streaming'
+                self.stats.reset()
+                self.lost_samples = 0
+                self.start_latency = None
+                self.start_time = time.monotonic()
+                self.is_streaming = True
+        else:
+            self.message_string = 'Device is not connected.'
+
+    ##
+    #   @brief          Stop delivering received samples to the callbacks.
+    def stop_streaming(self):
+        stop_time = time.monotonic()
+        self.is_streaming = False
+        self.stop_latency = self.wait_quiet(stop_time)
+        self.message_string = f'Stopped streaming data. Collected {self.samples_counter:d} samples, {self.lost_samples:d} lost.'
+
+    ##
+    #   @brief          The sample rate can only be set by the process owning the board.
+    #   @return         None, as no command is sent.
+    def update_sample_rate_on_board(self, value):
+        self.message_string = 'Sample rate is set by the acquisition process'
+        return None
+
+    ##
+    #   @brief          The full scale range can only be set by the process owning the board.
+    #   @return         None, as no command is sent.
+    def select_range(self, value):
+        self.message_string = 'Full scale range is set by the acquisition process'
+        return None
+
+    ##
+    #   @brief          The resolution can only be set by the process owning the board.
+    #   @return         None, as no command is sent.
+    def select_resolution(self, value):
+        self.message_string = 'Resolution is set by the acquisition process'
+        return None
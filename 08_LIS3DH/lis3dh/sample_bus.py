@@ -0,0 +1,202 @@
+##
+# @package lis3dh.sample_bus
+#
+#   Single-producer/multi-consumer ring of samples in shared memory.
+#
+#   The acquisition writes each batch of samples once into the ring,
+#   and every consumer (plot, recorder, DSP, other processes) reads them
+#   through its own \ref SampleBusReader, as NumPy views over the shared
+#   buffer. No consumer needs to copy samples into its own lists.
+#
+#   The shared memory block starts with a header of four uint64 values
+#   (total number of samples written, capacity, number of channels and a
+#   reserved value), followed by a float32 array of capacity x channels.
+
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+##
+#   @brief          Default capacity of the ring, in samples.
+DEFAULT_CAPACITY = 1 << 16
+
+##
+#   @brief          Size in bytes of the header of the shared memory block.
+HEADER_SIZE = 32
+
+_WRITE_INDEX = 0
+_CAPACITY = 1
+_N_CHANNELS = 2
+
+
+##
+#   @brief          Ring of samples in shared memory.
+#
+#   Samples are identified by a monotonic index: the sample with index i
+#   is stored in row i % capacity. Only one producer may call \ref write,
+#   while any number of readers can be created with \ref reader, in this
+#   or in other processes (see \ref attach).
+#
+class SampleBus():
+
+    ##
+    #   @brief          Create a new ring in shared memory.
+    #
+    #   @param[in]      capacity: number of samples kept in the ring.
+    #   @param[in]      n_channels: number of values for each sample.
+    #   @param[in]      name: optional name of the shared memory block.
+    def __init__(self, capacity=DEFAULT_CAPACITY, n_channels=3, name=None):
+        size = HEADER_SIZE + capacity * n_channels * np.dtype(np.float32).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.owner = True
+        self._map(capacity, n_channels)
+        self.header[:] = 0
+        self.header[_CAPACITY] = capacity
+        self.header[_N_CHANNELS] = n_channels
+
+    ##
+    #   @brief          Attach to a ring created by another process.
+    #
+    #   @param[in]      name: name of the shared memory block.
+    #   @return         \ref SampleBus instance sharing the same memory.
+    @classmethod
+    def attach(cls, name):
+        bus = cls.__new__(cls)
+        bus.shm = shared_memory.SharedMemory(name=name)
+        # The block is owned by the creating process: do not let the
+        # resource tracker of this process remove it at exit.
+        resource_tracker.unregister(bus.shm._name, 'shared_memory')
+        bus.owner = False
+        header = np.ndarray((HEADER_SIZE // 8,), dtype=np.uint64, buffer=bus.shm.buf)
+        bus._map(int(header[_CAPACITY]), int(header[_N_CHANNELS]))
+        return bus
+
+    def _map(self, capacity, n_channels):
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self.header = np.ndarray((HEADER_SIZE // 8,), dtype=np.uint64, buffer=self.shm.buf)
+        self.data = np.ndarray((capacity, n_channels), dtype=np.float32,
+                               buffer=self.shm.buf, offset=HEADER_SIZE)
+
+    ##
+    #   @brief          Name of the shared memory block.
+    @property
+    def name(self):
+        return self.shm.name
+
+    ##
+    #   @brief          Total number of samples written to the ring.
+    @property
+    def write_index(self):
+        return int(self.header[_WRITE_INDEX])
+
+    ##
+    #   @brief          Append samples to the ring.
+    #
+    #   Data are copied before the write index is updated, so readers
+    #   never see samples that were not written yet.
+    #
+    #   @param[in]      samples: array-like of shape (n, n_channels).
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        n = len(samples)
+        if (n == 0):
+            return
+        write_index = self.write_index
+        if (n > self.capacity):
+            write_index += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        start = write_index % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        if (first < n):
+            self.data[:n - first] = samples[first:]
+        self.header[_WRITE_INDEX] = write_index + n
+
+    ##
+    #   @brief          Get views over the samples in the given index range.
+    #
+    #   @param[in]      start: index of the first sample.
+    #   @param[in]      stop: index after the last sample.
+    #   @return         list with up to two contiguous views, in order.
+    def views(self, start, stop):
+        if (stop <= start):
+            return []
+        begin = start % self.capacity
+        end = begin + (stop - start)
+        if (end <= self.capacity):
+            return [self.data[begin:end]]
+        return [self.data[begin:], self.data[:end - self.capacity]]
+
+    ##
+    #   @brief          Get views over the most recent samples.
+    #
+    #   @param[in]      n: number of samples.
+    #   @return         list with up to two contiguous views, in order.
+    def latest(self, n):
+        stop = self.write_index
+        return self.views(max(0, stop - min(n, self.capacity)), stop)
+
+    ##
+    #   @brief          Create a new reader, starting from the next sample written.
+    def reader(self):
+        return SampleBusReader(self)
+
+    ##
+    #   @brief          Release the shared memory, removing it if owned.
+    def close(self):
+        self.header = None
+        self.data = None
+        self.shm.close()
+        if (self.owner):
+            self.shm.unlink()
+
+
+##
+#   @brief          Consumer of a \ref SampleBus, with its own read cursor.
+#
+#   If the consumer falls behind by more than the capacity of the ring,
+#   the overwritten samples are skipped and counted in \ref lost_samples.
+#
+class SampleBusReader():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      bus: the \ref SampleBus to be read.
+    def __init__(self, bus):
+        self.bus = bus
+        self.cursor = bus.write_index   # index of the next sample to be read
+        self.last_read = self.cursor    # index of the first sample of the last read
+        self.lost_samples = 0
+
+    ##
+    #   @brief          Number of samples available for reading.
+    def available(self):
+        return self.bus.write_index - self.cursor
+
+    ##
+    #   @brief          Read new samples.
+    #
+    #   The returned views point directly into shared memory: they are
+    #   valid until the producer wraps around them, which can be checked
+    #   with \ref overrun after processing.
+    #
+    #   @param[in]      max_samples: optional maximum number of samples to read.
+    #   @return         list with up to two contiguous views, in order.
+    def read(self, max_samples=None):
+        write_index = self.bus.write_index
+        if (write_index - self.cursor > self.bus.capacity):
+            self.lost_samples += write_index - self.bus.capacity - self.cursor
+            self.cursor = write_index - self.bus.capacity
+        stop = write_index
+        if (max_samples is not None):
+            stop = min(stop, self.cursor + max_samples)
+        self.last_read = self.cursor
+        self.cursor = stop
+        return self.bus.views(self.last_read, stop)
+
+    ##
+    #   @brief          Check if the samples of the last read were overwritten.
+    #   @return         True if the producer wrote over them meanwhile.
+    def overrun(self):
+        return self.bus.write_index - self.last_read > self.bus.capacity
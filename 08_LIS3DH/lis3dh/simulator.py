@@ -0,0 +1,182 @@
+##
+# @package lis3dh.simulator
+#
+#   Simulated PSoC-LIS3DH board on a pseudo-terminal.
+#
+#   The simulator opens a pty and prints the path of its serial side,
+#   which the GUI, lis3dh.acquire and lis3dh.linkbench open as the port of
+#   a real board (POSIX only):
+#
+#       python -m lis3dh.simulator --ack --command-delay 2
+#
+#   It answers \ref lis3dh.acquire.CONNECTION_CMD, applies the streaming
+#   and sample rate commands after a configurable delay (the time taken
+#   by the firmware), acknowledges commands if enabled, and streams data
+#   frames at the sample rate, in bursts every \ref USB_FRAME_INTERVAL as
+#   a USB CDC device does.
+
+import argparse
+import math
+import os
+import select
+import sys
+import threading
+import time
+import tty
+
+from lis3dh.acquire import (ACK_CAPABILITY, ACK_FRAME, CONNECTION_CMD, DATA_FRAME,
+                            FULL_SCALE_RANGE_CMDS, RESOLUTION_CMDS, SAMPLE_RATE_CMDS,
+                            START_STREAMING_CMD, STOP_STREAMING_CMD)
+
+##
+#   @brief          Time in seconds between two bursts of frames.
+USB_FRAME_INTERVAL = 0.001
+
+##
+#   @brief          Sample rate in Hz of each sample rate command.
+SIMULATED_RATES = {ord(cmd): int(label.split(' ')[0]) for label, cmd in SAMPLE_RATE_CMDS.items()}
+
+##
+#   @brief          Commands known by the simulated board, acknowledged with status 0.
+SIMULATED_COMMANDS = set((START_STREAMING_CMD + STOP_STREAMING_CMD +
+                          ''.join(SAMPLE_RATE_CMDS.values()) +
+                          ''.join(FULL_SCALE_RANGE_CMDS.values()) +
+                          ''.join(RESOLUTION_CMDS.values())).encode('ascii'))
+
+##
+#   @brief          Status acknowledging an unknown command.
+UNKNOWN_COMMAND_STATUS = 1
+
+##
+#   @brief          Left-justified code of 1 g, at the default range and resolution.
+ONE_G_CODE = 250 << 6
+
+
+##
+#   @brief          Board streaming frames on a pseudo-terminal.
+class SimulatedBoard():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      ack: acknowledge the commands.
+    #   @param[in]      command_delay: time in seconds taken to apply a command.
+    #   @param[in]      sample_rate: initial sample rate in Hz.
+    def __init__(self, ack=False, command_delay=0.0, sample_rate=1):
+        self.ack = ack
+        self.command_delay = command_delay
+        self.sample_rate = sample_rate
+        self.streaming = False
+        self.start_time = 0         # time at which streaming started at the sample rate
+        self.n_sent = 0             # frames sent since start_time
+        self.n_frames = 0           # frames sent in total, phase of the waveform
+        self.pending = []           # (time, command) to be applied
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port_name = os.ttyname(self.slave_fd)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    ##
+    #   @brief          Start the board in a background thread.
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='SimulatedBoard', daemon=True)
+        self.thread.start()
+
+    ##
+    #   @brief          Stop the board and close the pty.
+    def stop(self):
+        self.stop_event.set()
+        if (self.thread is not None):
+            self.thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    ##
+    #   @brief          Target function of the thread of the board.
+    def run(self):
+        while (not self.stop_event.is_set()):
+            readable, _, _ = select.select([self.master_fd], [], [], USB_FRAME_INTERVAL)
+            now = time.perf_counter()
+            if (readable):
+                for command in os.read(self.master_fd, 1024):
+                    self.pending.append((now + self.command_delay, command))
+            while (self.pending and self.pending[0][0] <= now):
+                self.apply(self.pending.pop(0)[1], now)
+            if (self.streaming):
+                due = int((now - self.start_time) * self.sample_rate)
+                if (due > self.n_sent):
+                    self.write(self.make_frames(due - self.n_sent))
+                    self.n_sent = due
+
+    ##
+    #   @brief          Apply a command.
+    def apply(self, command, now):
+        if (command == ord(CONNECTION_CMD)):
+            banner = 'LIS3DH ' + (ACK_CAPABILITY + ' ' if (self.ack) else '') + '$$$\r\n'
+            self.write(banner.encode('ascii'))
+            return
+        if (command == ord(START_STREAMING_CMD)):
+            self.streaming = True
+            self.restart(now)
+        elif (command == ord(STOP_STREAMING_CMD)):
+            self.streaming = False
+        elif (command in SIMULATED_RATES):
+            self.sample_rate = SIMULATED_RATES[command]
+            self.restart(now)
+        if (self.ack):
+            status = 0 if (command in SIMULATED_COMMANDS) else UNKNOWN_COMMAND_STATUS
+            self.write(ACK_FRAME.encode({'command': command, 'status': status}))
+
+    def restart(self, now):
+        self.start_time = now
+        self.n_sent = 0
+
+    ##
+    #   @brief          Data frames with a slow sine on x and y, and gravity on z.
+    def make_frames(self, n):
+        angles = [(self.n_frames + i) / 100 for i in range(n)]
+        self.n_frames += n
+        x = [int(ONE_G_CODE * math.sin(a)) & 0xffc0 for a in angles]
+        y = [int(ONE_G_CODE * math.cos(a)) & 0xffc0 for a in angles]
+        return DATA_FRAME.encode({'x': x, 'y': y, 'z': ONE_G_CODE}, n)
+
+    def write(self, data):
+        try:
+            os.write(self.master_fd, data)
+        except OSError:
+            # Nobody reads the port: the bytes are lost, as with a real board
+            pass
+
+
+##
+#   @brief          Parse command line arguments of the simulator.
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m lis3dh.simulator',
+        description='Simulated LIS3DH board on a pseudo-terminal.')
+    parser.add_argument('--ack', action='store_true',
+                        help='acknowledge the commands')
+    parser.add_argument('--command-delay', type=float, default=0,
+                        help='time in ms taken to apply a command (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+##
+#   @brief          Entry point of the simulator.
+def main(argv=None):
+    args = parse_args(argv)
+    board = SimulatedBoard(ack=args.ack, command_delay=args.command_delay / 1000)
+    board.start()
+    print(board.port_name, flush=True)
+    try:
+        while (True):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    board.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+##
+# @package lis3dh.triggers
+#
+#   Trigger engine for threshold and shock detection on the live stream.
+#
+#   Triggers are evaluated on whole batches of x, y, z samples with NumPy,
+#   so that the cost per batch does not depend on Python per-sample work.
+#   When a trigger fires, the \ref TriggerEngine captures a window of
+#   samples before and after the trigger point, and stores it as a
+#   \ref TriggerEvent.
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+import glob
+import logging
+import os
+import zipfile
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+##
+#   @brief          Column of each axis in the arrays of samples.
+AXIS_COLUMNS = {'X': 0, 'Y': 1, 'Z': 2}
+
+
+##
+#   @brief          Base class of the triggers.
+#
+#   Subclasses implement \ref evaluate, which receives the samples of the
+#   current batch preceded by \ref context samples of the previous batches.
+#   Samples not received yet are NaN, so that they never fire a trigger.
+#   A subclass missing \ref evaluate cannot be instantiated.
+#
+class Trigger(ABC):
+
+    ##
+    #   @brief          Number of previous samples required by the trigger.
+    context = 0
+
+    ##
+    #   @brief          Evaluate the trigger on a batch of samples.
+    #
+    #   @param[in]      data: array of shape (context + n, 3).
+    #   @param[in]      sample_rate: current sample rate in Hz.
+    #   @return         boolean array of shape (n,), True where the trigger fires.
+    @abstractmethod
+    def evaluate(self, data, sample_rate):
+        pass
+
+
+##
+#   @brief          Fire when an axis crosses a level.
+class LevelTrigger(Trigger):
+    context = 1
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      axis: 'X', 'Y' or 'Z'.
+    #   @param[in]      level: level in g.
+    #   @param[in]      rising: True to fire on rising crossings, False on falling ones.
+    def __init__(self, axis, level, rising=True):
+        self.column = AXIS_COLUMNS[axis]
+        self.level = level
+        self.rising = rising
+        self.description = f'{axis} {"rising" if rising else "falling"} through {level:g} g'
+
+    def evaluate(self, data, sample_rate):
+        values = data[:, self.column]
+        if (self.rising):
+            return (values[:-1] < self.level) & (values[1:] >= self.level)
+        return (values[:-1] > self.level) & (values[1:] <= self.level)
+
+
+##
+#   @brief          Fire when the slope of an axis exceeds a value.
+class SlopeTrigger(Trigger):
+    context = 1
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      axis: 'X', 'Y' or 'Z'.
+    #   @param[in]      slope: absolute slope in g/s.
+    def __init__(self, axis, slope):
+        self.column = AXIS_COLUMNS[axis]
+        self.slope = slope
+        self.description = f'{axis} slope above {slope:g} g/s'
+
+    def evaluate(self, data, sample_rate):
+        return np.abs(np.diff(data[:, self.column])) * sample_rate >= self.slope
+
+
+##
+#   @brief          Fire when the RMS of an axis over a sliding window exceeds a level.
+class RMSTrigger(Trigger):
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      axis: 'X', 'Y' or 'Z'.
+    #   @param[in]      level: RMS level in g.
+    #   @param[in]      window: number of samples of the sliding window.
+    def __init__(self, axis, level, window):
+        self.column = AXIS_COLUMNS[axis]
+        self.level = level
+        self.context = max(1, int(window)) - 1
+        self.description = f'{axis} RMS over {self.context + 1} samples above {level:g} g'
+
+    def evaluate(self, data, sample_rate):
+        window = self.context + 1
+        squares = np.square(data[:, self.column], dtype=np.float64)
+        sums = np.cumsum(np.concatenate(([0.], squares)))
+        return np.sqrt((sums[window:] - sums[:-window]) / window) >= self.level
+
+
+##
+#   @brief          Fire when the magnitude sqrt(x^2 + y^2 + z^2) exceeds a level.
+class MagnitudeTrigger(Trigger):
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      level: magnitude level in g.
+    def __init__(self, level):
+        self.level = level
+        self.description = f'Magnitude above {level:g} g'
+
+    def evaluate(self, data, sample_rate):
+        return np.sqrt(np.square(data, dtype=np.float64).sum(axis=1)) >= self.level
+
+
+##
+#   @brief          Samples captured around a trigger point.
+class TriggerEvent():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      samples: array of x, y, z samples around the trigger.
+    #   @param[in]      pre_samples: number of samples before the trigger point.
+    #   @param[in]      sample_rate: sample rate in Hz.
+    #   @param[in]      description: description of the trigger.
+    #   @param[in]      timestamp: date and time of the trigger.
+    def __init__(self, samples, pre_samples, sample_rate, description, timestamp):
+        self.samples = samples
+        self.pre_samples = pre_samples
+        self.sample_rate = sample_rate
+        self.description = description
+        self.timestamp = timestamp
+        self.path = ''
+
+    ##
+    #   @brief          Peak magnitude of the captured samples.
+    #
+    #   Samples captured before the start of the stream are NaN and ignored.
+    def peak_magnitude(self):
+        return float(np.nanmax(np.sqrt(np.square(self.samples, dtype=np.float64).sum(axis=1))))
+
+
+##
+#   @brief          Evaluate a trigger on batches of samples and capture events.
+#
+#   The engine keeps the last samples of the stream, so that the
+#   pre-trigger window is available as soon as the trigger fires.
+#   Samples after the trigger point are collected across batches until
+#   the post-trigger window is complete.
+#
+class TriggerEngine():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      trigger: the \ref Trigger to be evaluated.
+    #   @param[in]      pre_samples: number of samples captured before the trigger point.
+    #   @param[in]      post_samples: number of samples captured from the trigger point on.
+    #   @param[in]      sample_rate: sample rate in Hz.
+    #   @param[in]      single: if True, disarm after the first event.
+    def __init__(self, trigger, pre_samples, post_samples, sample_rate, single=False):
+        self.trigger = trigger
+        self.pre_samples = pre_samples
+        self.post_samples = max(1, post_samples)
+        self.sample_rate = sample_rate
+        self.single = single
+        self.armed = True
+        self.history = np.full((max(pre_samples, trigger.context), 3), np.nan, dtype=np.float32)
+        self.capture = None         # list of arrays captured for the current event
+        self.captured = 0           # samples captured after the trigger point
+        self.timestamp = None
+
+    ##
+    #   @brief          Process a batch of samples.
+    #
+    #   The batch is consumed in a loop: once an event is complete, the
+    #   trigger is evaluated again on the samples after it, so that several
+    #   events can be captured from one batch. The time of each event is
+    #   that of its trigger point, assuming the last sample arrived now.
+    #
+    #   @param[in]      samples: array of shape (n, 3).
+    #   @return         list of \ref TriggerEvent completed in this batch.
+    def process(self, samples):
+        events = []
+        now = datetime.now()
+        n_history = len(self.history)
+        data = np.concatenate((self.history, samples))
+        position = n_history        # first sample of data not processed yet
+        while (position < len(data)):
+            if (self.capture is not None):
+                position += self.collect(data[position:], events)
+            elif (self.armed):
+                context = self.trigger.context
+                fired = self.trigger.evaluate(data[position - context:], self.sample_rate)
+                if (not fired.any()):
+                    break
+                idx = position + int(np.argmax(fired))
+                self.timestamp = now - timedelta(seconds=(len(data) - 1 - idx) / self.sample_rate)
+                self.capture = [data[idx - self.pre_samples:idx].copy()]
+                self.captured = 0
+                position = idx
+            else:
+                break
+        if (n_history):
+            self.history = data[-n_history:]
+        return events
+
+    ##
+    #   @brief          Collect post-trigger samples, completing the event if possible.
+    #   @return         number of samples collected.
+    def collect(self, samples, events):
+        needed = self.post_samples - self.captured
+        self.capture.append(samples[:needed].copy())
+        n_collected = min(needed, len(samples))
+        self.captured += n_collected
+        if (self.captured >= self.post_samples):
+            events.append(TriggerEvent(np.concatenate(self.capture), self.pre_samples,
+                                       self.sample_rate, self.trigger.description,
+                                       self.timestamp))
+            self.capture = None
+            if (self.single):
+                self.armed = False
+        return n_collected
+
+
+##
+#   @brief          Store of captured events on disk.
+#
+#   Each event is saved as a NumPy .npz file, containing the samples
+#   and the information needed to plot them.
+#
+class EventStore():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      directory: directory where events are saved.
+    def __init__(self, directory):
+        self.directory = directory
+
+    ##
+    #   @brief          Save an event, setting its path.
+    def save(self, event):
+        os.makedirs(self.directory, exist_ok=True)
+        name = event.timestamp.strftime('event_%Y%m%d_%H%M%S_%f.npz')
+        event.path = os.path.join(self.directory, name)
+        np.savez(event.path, samples=event.samples, pre_samples=event.pre_samples,
+                 sample_rate=event.sample_rate, description=event.description,
+                 timestamp=event.timestamp.isoformat())
+        return event.path
+
+    ##
+    #   @brief          Load an event from file.
+    def load(self, path):
+        with np.load(path) as data:
+            event = TriggerEvent(data['samples'], int(data['pre_samples']),
+                                 float(data['sample_rate']), str(data['description']),
+                                 datetime.fromisoformat(str(data['timestamp'])))
+        event.path = path
+        return event
+
+    ##
+    #   @brief          Load all the stored events, oldest first.
+    #
+    #   Files that cannot be read (e.g., truncated or corrupt) are skipped
+    #   with a warning.
+    def load_all(self):
+        events = []
+        for path in sorted(glob.glob(os.path.join(self.directory, 'event_*.npz'))):
+            try:
+                events.append(self.load(path))
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                _LOGGER.warning('Skipping event file %s: %s', path, e)
+        return events
@@ -1,5 +1,28 @@
 #!/usr/bin/python3
 
+import argparse
+import sys
+from startup_profile import PROFILE_STARTUP_FLAG, StartupProfile
+from benchmark import add_benchmark_arguments, use_offscreen_window
+
+# Arguments of the GUI are parsed before Kivy is imported, and removed
+# from the command line so that Kivy does not reject them.
+arg_parser = argparse.ArgumentParser(add_help=False)
+arg_parser.add_argument(PROFILE_STARTUP_FLAG, action='store_true',
+                        help='print a startup profile report')
+arg_parser.add_argument('--source', default='',
+                        help='receive samples from a publisher at tcp://host:port or unix:///path')
+arg_parser.add_argument('--serve', default='',
+                        help='publish samples on tcp://host:port or unix:///path')
+add_benchmark_arguments(arg_parser)
+args, sys.argv[1:] = arg_parser.parse_known_args()
+
+if (args.benchmark):
+    use_offscreen_window()
+
+# Startup profiling must be set up before Kivy is imported.
+startup_profile = StartupProfile(args.profile_startup)
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.lang import Builder
@@ -8,17 +31,21 @@ from communication import KivySerial
 
 from kivy.config import Config
 
+startup_profile.mark('Kivy imported')
+
 # Configure GUI for desktop usage
 Config.set('kivy', 'desktop', 1)
 Config.set('input', 'mouse', 'mouse,disable_multitouch')
 Config.set('kivy', 'exit_on_escape', '0')
 
-# Load all required kv files
+# Load kv files required for the first frame. Dialogs
+# rules are loaded when the first popup is opened.
 Builder.load_file('toolbar.kv')
 Builder.load_file('bottom_bar.kv')
-Builder.load_file('dialogs.kv')
 Builder.load_file('graph_tabs.kv')
 
+startup_profile.mark('kv rules loaded')
+
 ##
 #   @brief          Root widget of the GUI.
 #   
@@ -62,11 +89,20 @@ class ContainerLayout(BoxLayout):
     ##
     #   @brief          Initialization function.
     #
-    #   In the init function the serial object is instantied.
+    #   In the init function the serial object is instantied. If a
+    #   --source address is given, samples are received from a
+    #   \ref lis3dh.network.SamplePublisher instead of the serial port.
     def __init__(self, **kwargs):
-        self.serial = KivySerial()
-        self.serial.bind(connected=self.connection_event)
+        if (args.source):
+            from lis3dh.network import NetworkSource
+            self.serial = KivySerial(acquisition=NetworkSource(args.source))
+        else:
+            self.serial = KivySerial()
         super(ContainerLayout, self).__init__(**kwargs)
+        # Bind once all the widgets are available, since the board may
+        # already be connected at this point.
+        self.serial.bind(connected=self.connection_event)
+        self.connection_event(self.serial, self.serial.connected)
 
     ##
     #   @brief          Callback called when bottom bar widget is displayed on the screen.
@@ -85,8 +121,20 @@ class ContainerLayout(BoxLayout):
     #   In this function some properties are bound to the graph widgets so
     #   that it is automatically updated.
     def on_graph_w(self, instance, value):
-        self.serial.add_callback(self.graph_w.update_plot)
+        self.graph_w.attach_sample_bus(self.serial.acquisition.enable_sample_bus())
         self.serial.bind(sample_rate=self.graph_w.update_sample_rate)
+        self.graph_w.update_sample_rate(self.serial, self.serial.sample_rate)
+        self.serial.bind(full_scale_range=self.graph_w.update_full_scale_range)
+        if (startup_profile.enabled):
+            self.serial.add_callback(self.first_sample_received)
+
+    ##
+    #   @brief          Record the first sample in the startup profile.
+    #
+    #   @param[in]      packet: the first packet received.
+    def first_sample_received(self, packet):
+        startup_profile.mark('First sample received')
+        self.serial.remove_callback(self.first_sample_received)
 
     ##
     #   @brief          Callback called when the connection status changes.
@@ -95,6 +143,7 @@ class ContainerLayout(BoxLayout):
     #   widgets of the GUI are either enabled/disabled.
     def connection_event(self, instance, value):
         if (self.serial.is_connected()):
+            startup_profile.mark('Device connected')
             self.streaming_button.disabled = False
             self.toolbar.disabled = False
         else:
@@ -108,19 +157,55 @@ class ContainerLayout(BoxLayout):
     #   streaming is either started or stopped.
     def streaming(self):
         if (not self.serial.is_streaming):
+            startup_profile.mark('Streaming started')
             self.serial.start_streaming()
             self.streaming_button.text = 'Stop'
-            self.toolbar.disabled = True
+            self.toolbar.streaming = True
         else:
             self.serial.stop_streaming()
             self.streaming_button.text = 'Start'
-            self.toolbar.disabled = False
+            self.toolbar.streaming = False
 
 ##
 #   @brief          Kivy App main class
 class LIS3DHApp(App):
     def build(self):
-        return ContainerLayout()
+        root = ContainerLayout()
+        self.publisher = None
+        if (args.serve):
+            from lis3dh.network import SamplePublisher
+            self.publisher = SamplePublisher(args.serve)
+            self.publisher.attach(root.serial.acquisition)
+            self.publisher.start()
+        startup_profile.mark('Root widget built')
+        return root
+
+    ##
+    #   @brief          Callback called when the app is closed.
+    def on_stop(self):
+        if (self.root.serial.is_streaming):
+            self.root.serial.stop_streaming()
+        self.root.serial.stop_recording()
+        if (self.publisher is not None):
+            self.publisher.close()
+        self.root.serial.acquisition.disable_sample_bus()
+
+    ##
+    #   @brief          Callback called when the app starts, before the first frame.
+    def on_start(self):
+        if (startup_profile.enabled):
+            from kivy.core.window import Window
+            Window.bind(on_flip=self.first_frame_drawn)
+        if (args.benchmark):
+            from benchmark import start_benchmark
+            self.benchmark = start_benchmark(self.root, args)
+
+    ##
+    #   @brief          Record the first frame in the startup profile.
+    def first_frame_drawn(self, window):
+        window.unbind(on_flip=self.first_frame_drawn)
+        startup_profile.mark('First frame drawn')
+        startup_profile.stop_profiler()
 
 
 if __name__ == '__main__':
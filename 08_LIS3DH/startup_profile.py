@@ -0,0 +1,65 @@
+##
+# @package startup_profile
+#
+#   Startup profiling of the GUI, enabled with the --profile-startup flag.
+#
+#   This module must be imported before Kivy, so that the time spent
+#   importing Kivy itself is accounted for.
+
+import cProfile
+import io
+import pstats
+import time
+
+##
+#   @brief          Command line flag enabling the startup profile.
+PROFILE_STARTUP_FLAG = '--profile-startup'
+
+
+##
+#   @brief          Collect startup milestones and a profile of the main thread.
+#
+#   Milestones (e.g., first frame, first sample) are printed as soon as
+#   they are reached, with the time elapsed since the process started.
+#   When \ref stop_profiler is called, the functions with the highest
+#   cumulative time spent in the main thread are printed as well.
+#   When disabled, all methods return immediately.
+#
+class StartupProfile():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      enabled: True to enable profiling.
+    #   @param[in]      n_functions: number of functions shown in the report.
+    def __init__(self, enabled, n_functions=20):
+        self.enabled = enabled
+        self.n_functions = n_functions
+        self.start_time = time.perf_counter()
+        self.milestones = {}
+        self.profiler = None
+        if (self.enabled):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    ##
+    #   @brief          Record a milestone, only the first time it is reached.
+    #   @param[in]      name: name of the milestone.
+    def mark(self, name):
+        if (not self.enabled or name in self.milestones):
+            return
+        elapsed = time.perf_counter() - self.start_time
+        self.milestones[name] = elapsed
+        print(f'[startup] {elapsed * 1000:9.1f} ms  {name}')
+
+    ##
+    #   @brief          Stop the profiler and print the report.
+    def stop_profiler(self):
+        if (self.profiler is None):
+            return
+        self.profiler.disable()
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.n_functions)
+        self.profiler = None
+        print('[startup] Main thread profile up to first frame:')
+        print(stream.getvalue())
@@ -0,0 +1,55 @@
+import numpy as np
+import serial
+
+from lis3dh.acquire import ACK_FRAME, DATA_FRAME, LIS3DHAcquisition, LIS3DHPacketParser
+from common.hotplug import PortMonitor
+
+
+def data_frames(code, n):
+    return DATA_FRAME.encode({'x': code, 'y': code, 'z': code}, n)
+
+
+def test_mode_acknowledged_mid_chunk_applies_to_following_packets():
+    parser = None
+
+    def on_ack(command_byte, status):
+        parser.set_mode(4, parser.resolution)
+
+    parser = LIS3DHPacketParser(on_ack=on_ack)
+    before = LIS3DHPacketParser().feed_values(data_frames(1 << 12, 1))[0, 0]
+    chunk = (data_frames(1 << 12, 3) + ACK_FRAME.encode({'command': ord('m'), 'status': 0})
+             + data_frames(1 << 12, 2))
+    values = parser.feed_values(chunk)
+    assert values.shape == (5, 3)
+    assert np.all(values[:3] == before)
+    assert np.allclose(values[3:], 2 * before)
+
+
+def test_acks_collected_without_callback():
+    parser = LIS3DHPacketParser()
+    parser.feed_values(ACK_FRAME.encode({'command': ord('b'), 'status': 0}) + data_frames(0, 2))
+    assert parser.pop_acks() == [(ord('b'), 0)]
+
+
+class FailingPort():
+    in_waiting = 0
+
+    def read(self, size=1):
+        raise serial.SerialException('device reports readiness to read but returned no data')
+
+    def close(self):
+        pass
+
+
+def test_port_probed_again_after_disconnect():
+    scans = []
+    acquisition = LIS3DHAcquisition()
+    acquisition.port_monitor = PortMonitor(lambda added, removed: scans.append(added),
+                                           list_ports=lambda: {'/dev/ttyACM0'})
+    acquisition.port_monitor.scan()
+    acquisition.port_name = '/dev/ttyACM0'
+    acquisition.port = port = FailingPort()
+    acquisition.io_loop(port)
+    assert not acquisition.is_connected()
+    acquisition.port_monitor.scan()
+    assert scans == [['/dev/ttyACM0'], ['/dev/ttyACM0']]
@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from lis3dh.calibration import board_identity
+from common import hotplug
+
+
+def test_boards_with_same_banner_have_different_identities():
+    assert board_identity('LIS3DH ACK $$$\r\n', 'A1') != board_identity('LIS3DH ACK $$$', 'B2')
+    assert board_identity('LIS3DH ACK $$$') == 'LIS3DH ACK'
+
+
+def test_usb_port_identity(monkeypatch):
+    ports = [SimpleNamespace(device='/dev/ttyACM0', serial_number='0F1A2B', vid=0x04B4,
+                             pid=0xF139, location='1-2'),
+             SimpleNamespace(device='/dev/ttyACM1', serial_number=None, vid=0x04B4,
+                             pid=0xF139, location='1-3'),
+             SimpleNamespace(device='/dev/ttyS0', serial_number=None, vid=None,
+                             pid=None, location=None)]
+    monkeypatch.setattr(hotplug.list_ports, 'comports', lambda: ports)
+    assert hotplug.usb_port_identity('/dev/ttyACM0') == '0F1A2B'
+    assert hotplug.usb_port_identity('/dev/ttyACM1') == '04B4:F139:1-3'
+    assert hotplug.usb_port_identity('/dev/ttyS0') == ''
+    assert hotplug.usb_port_identity('/dev/ttyUSB9') == ''
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from lis3dh.acquire import SAMPLE_DTYPE, Recorder
+from lis3dh.export import export_recording
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = str(tmp_path / 'capture.bin')
+    recorder = Recorder(path, sample_rate=100)
+    records = np.zeros(100, dtype=SAMPLE_DTYPE)
+    records['t'] = np.arange(100) / 100.
+    recorder.write(records)
+    recorder.close()
+    return path
+
+
+@pytest.mark.parametrize('decimate, resample', [(0, None), (-2, None), (1, 0.), (1, -5.),
+                                                (1, float('inf')), (10, 50.)])
+def test_invalid_options_rejected(recording, tmp_path, decimate, resample):
+    out_path = str(tmp_path / 'capture.csv')
+    with pytest.raises(ValueError):
+        export_recording(recording, out_path, 'csv', decimate, resample, workers=1)
+
+
+def test_decimate(recording, tmp_path):
+    out_path = str(tmp_path / 'capture.csv')
+    export_recording(recording, out_path, 'csv', 10, workers=1)
+    rows = np.loadtxt(out_path, delimiter=',', skiprows=1)
+    assert rows.shape == (10, 4)
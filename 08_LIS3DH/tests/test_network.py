@@ -0,0 +1,59 @@
+import os
+import socket
+import time
+
+from lis3dh.acquire import LIS3DHAcquisition
+from lis3dh.network import NetworkSource, SamplePublisher, _PublisherClient
+
+
+def wait_for(condition, timeout=2.):
+    deadline = time.monotonic() + timeout
+    while (not condition() and time.monotonic() < deadline):
+        time.sleep(0.01)
+    return condition()
+
+
+def test_state_messages_never_dropped():
+    sock, peer = socket.socketpair()
+    client = _PublisherClient(sock, queue_size=2)
+    client.put_control(b'rate')
+    for i in range(5):
+        client.put(b'batch%d' % i)
+    client.put_control(b'mode')
+    messages = []
+    message = client.next_message()
+    while (message is not None):
+        messages.append(message)
+        message = client.next_message()
+    assert messages == [b'rate', b'mode', b'batch3', b'batch4']
+    assert client.dropped_messages == 3
+    client.close()
+    peer.close()
+
+
+def test_source_follows_mode_of_publisher(tmp_path):
+    acquisition = LIS3DHAcquisition()
+    acquisition.full_scale_range = 4
+    address = 'unix://' + str(tmp_path / 'lis3dh.sock')
+    publisher = SamplePublisher(address)
+    publisher.attach(acquisition)
+    publisher.start()
+    source = NetworkSource(address)
+    try:
+        assert source.connect() == 0
+        assert wait_for(lambda: source.full_scale_range == 4)
+        acquisition.full_scale_range = 16
+        acquisition.resolution = 8
+        assert wait_for(lambda: (source.full_scale_range, source.resolution) == (16, 8))
+    finally:
+        source.disconnect()
+        publisher.close()
+
+
+def test_close_removes_unix_socket(tmp_path):
+    path = str(tmp_path / 'lis3dh.sock')
+    publisher = SamplePublisher('unix://' + path)
+    publisher.start()
+    assert os.path.exists(path)
+    publisher.close()
+    assert not os.path.exists(path)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from lis3dh.triggers import EventStore, LevelTrigger, TriggerEngine
+
+
+def make_batch(n, pulses):
+    samples = np.zeros((n, 3), dtype=np.float32)
+    for start in pulses:
+        samples[start:start + 5, 0] = 1.
+    return samples
+
+
+def test_two_events_in_one_batch():
+    engine = TriggerEngine(LevelTrigger('X', 0.5), pre_samples=10, post_samples=20, sample_rate=100)
+    events = engine.process(make_batch(200, [50, 120]))
+    assert len(events) == 2
+    for event in events:
+        assert event.samples.shape == (30, 3)
+        # Trigger point right after the pre-trigger window
+        assert event.samples[event.pre_samples - 1, 0] == 0.
+        assert event.samples[event.pre_samples, 0] == 1.
+    assert events[0].timestamp < events[1].timestamp
+
+
+def test_event_completed_in_next_batch_then_new_event():
+    engine = TriggerEngine(LevelTrigger('X', 0.5), pre_samples=10, post_samples=20, sample_rate=100)
+    assert engine.process(make_batch(100, [95])) == []
+    events = engine.process(make_batch(100, [60]))
+    assert len(events) == 2
+    assert events[0].samples[10, 0] == 1.
+    assert events[1].samples[10, 0] == 1.
+
+
+def test_single_disarms_after_first_event():
+    engine = TriggerEngine(LevelTrigger('X', 0.5), pre_samples=10, post_samples=20, sample_rate=100,
+                           single=True)
+    assert len(engine.process(make_batch(200, [50, 120]))) == 1
+    assert not engine.armed
+
+
+def test_load_all_skips_corrupt_files(tmp_path):
+    store = EventStore(str(tmp_path))
+    engine = TriggerEngine(LevelTrigger('X', 0.5), pre_samples=10, post_samples=20, sample_rate=100)
+    event, = engine.process(make_batch(100, [50]))
+    store.save(event)
+    (tmp_path / 'event_00000000_000000_000000.npz').write_bytes(b'PK\x03\x04truncated')
+    events = store.load_all()
+    assert len(events) == 1
+    assert np.array_equal(events[0].samples, event.samples)
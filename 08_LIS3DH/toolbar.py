@@ -1,7 +1,48 @@
-from kivy.properties import NumericProperty, ObjectProperty, StringProperty
+from datetime import datetime
+import os
+import threading
+from kivy.clock import Clock
+from kivy.core.window import Keyboard, Window
+from kivy.lang import Builder
+from kivy.logger import Logger
+from kivy.properties import BooleanProperty, NumericProperty, ObjectProperty, StringProperty
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.popup import Popup
 from communication import KivySerial
+from lis3dh.acquire import full_scale_range_label, resolution_label
+from lis3dh.calibration import CALIBRATION_POSITIONS
+from lis3dh.export import check_export_options, export_recording
+from common.profiler import DEFAULT_PROFILE_DURATION, StackSampler
+
+##
+#   @brief          kv file with the rules of the dialogs.
+DIALOGS_KV_FILE = 'dialogs.kv'
+
+_dialogs_kv_loaded = False
+
+##
+#   @brief          Directory of the recordings started from the toolbar.
+RECORDINGS_DIRECTORY = 'recordings'
+
+##
+#   @brief          Name of the recordings, formatted with their start time.
+RECORDING_NAME_FORMAT = 'recording_%Y%m%d_%H%M%S.bin'
+
+##
+#   @brief          Key starting and stopping the profiler, also while the toolbar is disabled.
+PROFILE_HOTKEY = 'f12'
+
+##
+#   @brief          Load kv rules of the dialogs, if not loaded yet.
+#
+#   Dialogs are only needed when a popup is opened, so their rules
+#   are not loaded at startup but right before the first dialog
+#   is created.
+def load_dialogs_kv():
+    global _dialogs_kv_loaded
+    if (not _dialogs_kv_loaded):
+        Builder.load_file(DIALOGS_KV_FILE)
+        _dialogs_kv_loaded = True
 
 class Toolbar(BoxLayout):
     """
@@ -16,8 +57,84 @@ class Toolbar(BoxLayout):
     """
     message_string = StringProperty("")
 
+    """
+    @brief Button starting and stopping the profiler.
+    """
+    profile_button = ObjectProperty(None)
+
+    """
+    @brief Toggle button starting and stopping the recording.
+    """
+    record_button = ObjectProperty(None)
+
+    """
+    @brief True while streaming: settings are disabled, recording is not.
+    """
+    streaming = BooleanProperty(False)
+
     def __init__(self, **kwargs):
+        self.sampler = None     # profiler, while a profile is being taken
         super(Toolbar, self).__init__(**kwargs)
+        Window.bind(on_key_down=self.on_key_down)
+
+    def on_key_down(self, window, key, scancode, codepoint, modifiers):
+        """
+        @brief Toggle the profiler with the hotkey.
+        """
+        if (key == Keyboard.keycodes[PROFILE_HOTKEY]):
+            self.toggle_profile()
+            return True
+        return False
+
+    def toggle_profile(self):
+        """
+        @brief Start a profile of all the threads, or end the current one.
+
+        Stacks of the main and I/O threads are sampled for
+        DEFAULT_PROFILE_DURATION seconds, and written as collapsed
+        stacks with a report of the memory allocations.
+        """
+        if (self.sampler is not None):
+            self.sampler.stop()
+            return
+        self.sampler = StackSampler(DEFAULT_PROFILE_DURATION, callback=self.profile_written)
+        self.sampler.start()
+        self.profile_button.text = 'Stop Profile'
+        KivySerial().message_string = f'Profiling for {DEFAULT_PROFILE_DURATION:.0f} s...'
+
+    def profile_written(self, paths):
+        """
+        @brief Called by the thread of the profiler once the files are written.
+        """
+        Clock.schedule_once(lambda dt: self.profile_done(paths))
+
+    def profile_done(self, paths):
+        self.sampler = None
+        self.profile_button.text = 'Profile'
+        message = 'Profile written to ' + ', '.join(paths)
+        Logger.info(f'Profiler: {message}')
+        KivySerial().message_string = message
+
+    def toggle_recording(self):
+        """
+        @brief Start or stop recording, following the state of the record button.
+
+        Recordings are written in RECORDINGS_DIRECTORY, where the
+        export dialog lists them.
+        """
+        board = KivySerial()
+        if (self.record_button.state == 'normal'):
+            board.stop_recording()
+            board.message_string = 'Recording stopped'
+            return
+        path = os.path.join(RECORDINGS_DIRECTORY, datetime.now().strftime(RECORDING_NAME_FORMAT))
+        try:
+            os.makedirs(RECORDINGS_DIRECTORY, exist_ok=True)
+            board.start_recording(path)
+        except OSError as error:
+            Logger.warning(f'Toolbar: could not start recording: {error}')
+            board.message_string = f'Could not record to {path}'
+            self.record_button.state = 'normal'
 
     def sample_rate_dialog(self):
         """
@@ -27,6 +144,30 @@ class Toolbar(BoxLayout):
         popup = SampleRateDialog()
         popup.open()
 
+    def output_file_dialog(self):
+        """
+        @brief Open popup for the export of recordings.
+        """
+        self.message_string = "Data Export Dialog"
+        popup = ExportDialog()
+        popup.open()
+
+    def full_scale_range_dialog(self):
+        """
+        @brief Open popup for full scale range and resolution selection.
+        """
+        self.message_string = "Full Scale Range Dialog"
+        popup = RangeSelectDialog()
+        popup.open()
+
+    def calibration_dialog(self):
+        """
+        @brief Open popup for the calibration of the axes.
+        """
+        self.message_string = "Calibration Dialog"
+        popup = CalibrationDialog()
+        popup.open()
+
 
 
 class SampleRateDialog(Popup):
@@ -36,7 +177,9 @@ class SampleRateDialog(Popup):
     sample_rate_spinner = ObjectProperty(None)
 
     def __init__(self, **kwargs):
+        load_dialogs_kv()
         self.board = KivySerial()
+        self.command = None     # sample rate command waiting for completion
         super(SampleRateDialog, self).__init__(**kwargs)
 
     def on_sample_rate_spinner(self, instance, value):
@@ -45,30 +188,268 @@ class SampleRateDialog(Popup):
     ##
     #   @brief          Callback called when update button is pressed.
     #
-    #   If the board is connected, update the sample rate.
+    #   If the board is connected, update the sample rate. The dialog
+    #   is dismissed once the board has confirmed the new value.
     #
     def update_pressed(self):
-        
         if (self.board.is_connected()):
-           self.board.update_sample_rate_on_board(self.sample_rate_spinner.text)
+            self.command = self.board.update_sample_rate_on_board(self.sample_rate_spinner.text)
+            if (self.command is not None):
+                self.title = 'Updating sample rate...'
+                self.content.disabled = True
+                self.board.bind(on_command_complete=self.command_completed)
+                return
         self.dismiss()
 
+    ##
+    #   @brief          Callback called when a command sent to the board is completed.
+    #
+    def command_completed(self, instance, command):
+        if (command is not self.command):
+            return
+        self.board.unbind(on_command_complete=self.command_completed)
+        self.command = None
+        if (command.succeeded()):
+            self.dismiss()
+        else:
+            self.title = f'Could not update sample rate ({command.status})'
+            self.content.disabled = False
+
 class RangeSelectDialog(Popup):
     """
-    @brief Popup to allow range selection 
+    @brief Popup to allow full scale range and resolution selection 
     """
     range_spinner = ObjectProperty(None)
 
+    resolution_spinner = ObjectProperty(None)
+
     def __init__(self, **kwargs):
-        super(RangeSelectDialog, self).__init__(**kwargs)
+        load_dialogs_kv()
         self.board = KivySerial()
+        self.commands = []      # commands waiting for completion
+        self.failed = False     # True if any of the commands failed
+        super(RangeSelectDialog, self).__init__(**kwargs)
+
+    def on_range_spinner(self, instance, value):
+        self.range_spinner.text = full_scale_range_label(self.board.full_scale_range)
+
+    def on_resolution_spinner(self, instance, value):
+        self.resolution_spinner.text = resolution_label(self.board.resolution)
 
     def update_pressed(self):
         """
         @brief Callback called when update button is pressed.
 
-        If the board is connected, update the range selection.
+        If the board is connected, update the range and resolution
+        selection. The dialog is dismissed once the board has
+        confirmed the new values.
         """
         if (self.board.is_connected()):
-            self.board.select_range(self.range_spinner.text)
-        self.dismiss()
\ No newline at end of file
+            commands = []
+            if (self.range_spinner.text != full_scale_range_label(self.board.full_scale_range)):
+                commands.append(self.board.select_range(self.range_spinner.text))
+            if (self.resolution_spinner.text != resolution_label(self.board.resolution)):
+                commands.append(self.board.select_resolution(self.resolution_spinner.text))
+            self.commands = [command for command in commands if command is not None]
+            if (self.commands):
+                self.title = 'Updating full scale range...'
+                self.failed = False
+                self.content.disabled = True
+                self.board.bind(on_command_complete=self.command_completed)
+                return
+        self.dismiss()
+
+    def command_completed(self, instance, command):
+        """
+        @brief Callback called when a command sent to the board is completed.
+        """
+        if (command not in self.commands):
+            return
+        self.commands.remove(command)
+        self.failed = self.failed or not command.succeeded()
+        if (self.commands):
+            return
+        self.board.unbind(on_command_complete=self.command_completed)
+        if (not self.failed):
+            self.dismiss()
+        else:
+            self.title = 'Could not update full scale range'
+            self.content.disabled = False
+
+
+class CalibrationDialog(Popup):
+    """
+    @brief Popup to guide the six-position calibration of the axes.
+
+    Data are streamed while the dialog is open: the user places the
+    board in each position and presses Measure, then saves the new
+    calibration profile of the board.
+    """
+    position_label = ObjectProperty(None)
+
+    progress_bar = ObjectProperty(None)
+
+    measure_button = ObjectProperty(None)
+
+    save_button = ObjectProperty(None)
+
+    def __init__(self, **kwargs):
+        load_dialogs_kv()
+        self.board = KivySerial()
+        self.session = None
+        self.position_index = 0     # index of the position in CALIBRATION_POSITIONS
+        self.progress_event = None
+        super(CalibrationDialog, self).__init__(**kwargs)
+
+    def on_open(self):
+        self.session = self.board.start_calibration()
+        self.board.start_streaming()
+        self.show_position()
+        self.progress_event = Clock.schedule_interval(self.update_progress, 0.1)
+
+    def on_dismiss(self):
+        if (self.progress_event is not None):
+            self.progress_event.cancel()
+        self.board.stop_streaming()
+        if (self.session is not None):
+            # Dismissed without saving: restore the previous calibration
+            self.board.stop_calibration()
+
+    def show_position(self):
+        name = CALIBRATION_POSITIONS[self.position_index][0]
+        self.position_label.text = (f'Step {self.position_index + 1} of {len(CALIBRATION_POSITIONS)}: '
+                                    f'place the board still with the {name} axis pointing up, '
+                                    'then press Measure.')
+        self.progress_bar.value = 0
+        self.measure_button.disabled = False
+
+    def measure_pressed(self):
+        """
+        @brief Start measuring the current position.
+        """
+        self.measure_button.disabled = True
+        self.session.start_position(CALIBRATION_POSITIONS[self.position_index][0])
+
+    def update_progress(self, dt):
+        """
+        @brief Show the progress of the measurement, moving to the next position when done.
+        """
+        name = CALIBRATION_POSITIONS[self.position_index][0]
+        self.progress_bar.value = self.session.progress()
+        if (name not in self.session.means):
+            return
+        if (self.session.is_complete()):
+            self.progress_event.cancel()
+            try:
+                profile = self.session.compute()
+            except ValueError as error:
+                self.position_label.text = f'Calibration failed: {error}.'
+                return
+            offsets = ', '.join(f'{1000 * value:.0f}' for value in profile.offsets)
+            gains = ', '.join(f'{value:.3f}' for value in profile.gains)
+            self.position_label.text = (f'Offsets (mg): {offsets}\nGains: {gains}\n'
+                                        'Press Save to store the calibration of the board.')
+            self.save_button.disabled = False
+        else:
+            self.position_index += 1
+            self.show_position()
+
+    def save_pressed(self):
+        """
+        @brief Store the new calibration profile and apply it.
+        """
+        profile = self.session.compute()
+        self.session = None
+        self.board.stop_calibration(profile)
+        self.dismiss()
+
+
+class ExportDialog(Popup):
+    """
+    @brief Popup to export a recording to CSV or Parquet.
+
+    The export runs in a background thread, which converts the
+    recording chunk by chunk with a pool of processes. The output
+    file is written next to the recording.
+    """
+    file_chooser = ObjectProperty(None)
+
+    format_spinner = ObjectProperty(None)
+
+    decimate_input = ObjectProperty(None)
+
+    resample_input = ObjectProperty(None)
+
+    progress_bar = ObjectProperty(None)
+
+    export_button = ObjectProperty(None)
+
+    def __init__(self, **kwargs):
+        load_dialogs_kv()
+        super(ExportDialog, self).__init__(**kwargs)
+        if (os.path.isdir(RECORDINGS_DIRECTORY)):
+            self.file_chooser.path = os.path.abspath(RECORDINGS_DIRECTORY)
+
+    def export_pressed(self):
+        """
+        @brief Start exporting the selected recording.
+        """
+        if (not self.file_chooser.selection):
+            self.title = 'Select a recording to export'
+            return
+        try:
+            decimate, resample = self.export_options()
+        except ValueError as error:
+            self.title = str(error)
+            return
+        path = self.file_chooser.selection[0]
+        fmt = self.format_spinner.text.lower()
+        out_path = os.path.splitext(path)[0] + '.' + fmt
+        self.export_button.disabled = True
+        self.progress_bar.value = 0
+        self.title = f'Exporting to {out_path}...'
+        export_thread = threading.Thread(target=self.export,
+                                         args=(path, out_path, fmt, decimate, resample),
+                                         daemon=True)
+        export_thread.start()
+
+    def export_options(self):
+        """
+        @brief Decimation factor and resample rate entered in the dialog.
+
+        @return tuple with the decimation factor, and the resample rate in Hz
+            or None to keep the recorded samples.
+        @throws ValueError with a message for the user if a value is not valid.
+        """
+        text = self.decimate_input.text.strip()
+        try:
+            decimate = int(text) if text else 1
+        except ValueError:
+            raise ValueError(f'Invalid decimation: {text}') from None
+        text = self.resample_input.text.strip()
+        try:
+            resample = float(text) if text else None
+        except ValueError:
+            raise ValueError(f'Invalid resample rate: {text}') from None
+        check_export_options(decimate, resample)
+        return decimate, resample
+
+    def export(self, path, out_path, fmt, decimate, resample):
+        """
+        @brief Target function of the thread exporting the recording.
+        """
+        try:
+            export_recording(path, out_path, fmt, decimate, resample,
+                             progress=self.export_progress)
+        except (OSError, ValueError, RuntimeError) as error:
+            message = f'Export failed: {error}'
+        else:
+            message = f'Exported to {out_path}'
+        Clock.schedule_once(lambda dt: self.export_done(message))
+
+    def export_progress(self, done, total):
+        Clock.schedule_once(lambda dt: setattr(self.progress_bar, 'value', done / float(total)))
+
+    def export_done(self, message):
+        self.title = message
+        self.export_button.disabled = False
@@ -0,0 +1,7 @@
+##
+# @package common
+#
+#   Modules shared by the GUI examples.
+#
+#   The examples are run from their own folder, so they append the root
+#   of the repository to sys.path before importing this package.
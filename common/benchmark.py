@@ -0,0 +1,339 @@
+##
+# @package common.benchmark
+#
+#   End-to-end benchmark of the GUIs.
+#
+#   The whole app runs as usual, usually with an offscreen window, while a
+#   \ref SyntheticPort stands in for the board: it answers the connection
+#   command and streams packets at the requested rate once streaming is
+#   started, so that samples go through the same threads, parser and plots
+#   as with the real board. A \ref FrameBenchmark then measures, over a
+#   fixed duration, the frame times of the Kivy main loop, the dropped
+#   frames, the CPU usage of each thread and the growth of the resident
+#   memory, and writes them as JSON.
+#
+#   Kivy is imported by \ref FrameBenchmark only, so that this module can
+#   be imported before Kivy is configured.
+
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+##
+#   @brief          Command starting the streaming of a synthetic board.
+SYNTHETIC_START_CMD = ord('b')
+
+##
+#   @brief          Command stopping the streaming of a synthetic board.
+SYNTHETIC_STOP_CMD = ord('s')
+
+##
+#   @brief          Command asking the identity of a synthetic board.
+SYNTHETIC_CONNECTION_CMD = ord('v')
+
+##
+#   @brief          Minimum time in seconds between two chunks of a synthetic port.
+#
+#   Like a USB serial port, which delivers bytes once per millisecond frame.
+SYNTHETIC_CHUNK_INTERVAL = 0.001
+
+##
+#   @brief          Default time in seconds before the measurements start.
+DEFAULT_WARMUP = 2.0
+
+##
+#   @brief          Default duration in seconds of the measurements.
+DEFAULT_DURATION = 30.0
+
+##
+#   @brief          Frame rate assumed when Kivy does not limit it.
+DEFAULT_FRAME_RATE = 60
+
+##
+#   @brief          Time in seconds between two samples of the resident memory.
+MEMORY_SAMPLE_INTERVAL = 0.5
+
+##
+#   @brief          Frame time percentiles of the report.
+FRAME_TIME_PERCENTILES = (50, 90, 95, 99)
+
+
+##
+#   @brief          In-process stand-in for the serial port of a board.
+#
+#   It implements the subset of the pyserial interface used by the apps:
+#   blocking reads with an optional timeout, cancel_read, reset_input_buffer,
+#   in_waiting, write and close. Packets are generated on demand, according
+#   to the time elapsed since streaming started.
+class SyntheticPort():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      make_packets: function returning the bytes of n packets,
+    #                   called with the index of the first packet and n.
+    #   @param[in]      sample_rate: number of packets per second.
+    #   @param[in]      banner: response to the connection command.
+    #   @param[in]      timeout: read timeout in seconds, None to block.
+    def __init__(self, make_packets, sample_rate, banner=b'', timeout=None):
+        self.make_packets = make_packets
+        self.sample_rate = float(sample_rate)
+        self.banner = banner
+        self.timeout = timeout
+        self.is_open = True
+        self.streaming = False
+        self.start_time = 0         # time at which streaming started
+        self.next_index = 0         # index of the next packet to be generated
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+
+    def isOpen(self):
+        return self.is_open
+
+    def generate(self):
+        if (self.streaming):
+            due = int((time.monotonic() - self.start_time) * self.sample_rate)
+            if (due > self.next_index):
+                self.buffer.extend(self.make_packets(self.next_index, due - self.next_index))
+                self.next_index = due
+
+    @property
+    def in_waiting(self):
+        with self.lock:
+            self.generate()
+            return len(self.buffer)
+
+    def read(self, size=1):
+        deadline = None if (self.timeout is None) else time.monotonic() + self.timeout
+        while (True):
+            with self.lock:
+                self.generate()
+                if (len(self.buffer) >= size or not self.is_open):
+                    break
+                wait = SYNTHETIC_CHUNK_INTERVAL
+                if (self.streaming):
+                    next_time = self.start_time + (self.next_index + 1) / self.sample_rate
+                    wait = max(wait, next_time - time.monotonic())
+                elif (deadline is None):
+                    wait = 0.1
+            if (deadline is not None):
+                wait = min(wait, deadline - time.monotonic())
+                if (wait <= 0):
+                    break
+            if (self.cancel_event.wait(wait)):
+                self.cancel_event.clear()
+                break
+        with self.lock:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def cancel_read(self):
+        self.cancel_event.set()
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self.generate()
+            self.buffer.clear()
+
+    def write(self, data):
+        with self.lock:
+            for byte in bytes(data):
+                if (byte == SYNTHETIC_CONNECTION_CMD):
+                    self.buffer.extend(self.banner)
+                elif (byte == SYNTHETIC_START_CMD and not self.streaming):
+                    self.streaming = True
+                    self.start_time = time.monotonic()
+                    self.next_index = 0
+                elif (byte == SYNTHETIC_STOP_CMD):
+                    self.streaming = False
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self.cancel_event.set()
+
+
+##
+#   @brief          Names of the Python threads, by native thread id.
+def python_thread_names():
+    return {thread.native_id: thread.name for thread in threading.enumerate()}
+
+
+##
+#   @brief          CPU time in seconds used by each thread of the process.
+#
+#   Threads are read from /proc on Linux. Elsewhere, the CPU time of the
+#   whole process is returned as a single 'process' thread.
+#
+#   @return         dictionary with (name, CPU time) for each thread id.
+def thread_cpu_times():
+    tick = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+    names = python_thread_names()
+    times = {}
+    try:
+        tids = os.listdir('/proc/self/task')
+    except OSError:
+        return {0: ('process', time.process_time())}
+    for tid in tids:
+        try:
+            with open(f'/proc/self/task/{tid}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue    # thread exited
+        # The name may contain spaces: fields are counted after its parenthesis
+        comm = stat[stat.index('(') + 1:stat.rindex(')')]
+        fields = stat[stat.rindex(')') + 2:].split()
+        utime, stime = int(fields[11]), int(fields[12])
+        times[int(tid)] = (names.get(int(tid), comm), (utime + stime) / tick)
+    return times
+
+
+##
+#   @brief          Resident memory of the process in bytes, None if unknown.
+def resident_memory():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak resident memory: kilobytes on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if (sys.platform == 'darwin') else maxrss * 1024
+
+
+##
+#   @brief          Measure frame times, CPU and memory of the running Kivy app.
+#
+#   Frames are timed between consecutive iterations of the Kivy main loop,
+#   and a frame taking longer than the frame period counts as the frames
+#   it prevented from being drawn. Once the duration elapses, the report
+#   is written and the app is stopped.
+class FrameBenchmark():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      duration: duration in seconds of the measurements.
+    #   @param[in]      warmup: time in seconds before the measurements start.
+    #   @param[in]      output: path of the JSON report, None to print it.
+    #   @param[in]      info: dictionary of settings copied in the report.
+    #   @param[in]      collect: optional function returning a dictionary added to the report.
+    def __init__(self, duration=DEFAULT_DURATION, warmup=DEFAULT_WARMUP, output=None,
+                 info=None, collect=None):
+        self.duration = duration
+        self.warmup = warmup
+        self.output = output
+        self.info = dict(info or {})
+        self.collect = collect
+        self.frame_times = []
+        self.frames_drawn = 0
+        self.last_frame = None
+        self.report = None
+
+    ##
+    #   @brief          Start the measurements after the warmup.
+    def start(self):
+        from kivy.clock import Clock
+        Clock.schedule_once(self.begin, self.warmup)
+
+    def begin(self, dt):
+        from kivy.clock import Clock
+        from kivy.config import Config
+        from kivy.core.window import Window
+        frame_rate = Config.getint('graphics', 'maxfps') or DEFAULT_FRAME_RATE
+        self.frame_period = 1. / frame_rate
+        self.start_cpu = thread_cpu_times()
+        self.start_process_cpu = time.process_time()
+        self.start_rss = resident_memory()
+        self.peak_rss = self.start_rss
+        self.start_time = time.perf_counter()
+        self.last_frame = self.start_time
+        self.frame_event = Clock.schedule_interval(self.frame, 0)
+        self.memory_event = Clock.schedule_interval(self.sample_memory, MEMORY_SAMPLE_INTERVAL)
+        Window.bind(on_flip=self.flip)
+        Clock.schedule_once(self.finish, self.duration)
+
+    def frame(self, dt):
+        now = time.perf_counter()
+        self.frame_times.append(now - self.last_frame)
+        self.last_frame = now
+
+    def sample_memory(self, dt):
+        rss = resident_memory()
+        if (rss is not None and rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def flip(self, window):
+        self.frames_drawn += 1
+
+    def finish(self, dt):
+        from kivy.app import App
+        from kivy.core.window import Window
+        elapsed = time.perf_counter() - self.start_time
+        self.frame_event.cancel()
+        self.memory_event.cancel()
+        Window.unbind(on_flip=self.flip)
+        self.report = self.make_report(elapsed)
+        text = json.dumps(self.report, indent=2)
+        if (self.output):
+            with open(self.output, 'w') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        App.get_running_app().stop()
+
+    ##
+    #   @brief          Build the report of the measurements.
+    #   @param[in]      elapsed: duration in seconds of the measurements.
+    #   @return         dictionary serializable as JSON.
+    def make_report(self, elapsed):
+        frame_times = np.asarray(self.frame_times) * 1000
+        frame_period = self.frame_period * 1000
+        report = dict(self.info)
+        report['duration_s'] = round(elapsed, 3)
+        report['frames'] = len(frame_times)
+        report['frames_drawn'] = self.frames_drawn
+        report['target_frame_time_ms'] = round(frame_period, 3)
+        if (len(frame_times)):
+            report['frame_time_ms'] = dict(
+                [('mean', round(float(frame_times.mean()), 3))] +
+                [(f'p{p}', round(float(np.percentile(frame_times, p)), 3))
+                 for p in FRAME_TIME_PERCENTILES] +
+                [('max', round(float(frame_times.max()), 3))])
+            # A frame lasting k periods prevented k - 1 frames from being drawn
+            report['dropped_frames'] = int(np.maximum(
+                np.floor(frame_times / frame_period + 0.5) - 1, 0).sum())
+        report['cpu_percent'] = self.cpu_report(elapsed)
+        if (self.start_rss is not None):
+            end_rss = resident_memory()
+            report['rss_mb'] = {
+                'start': round(self.start_rss / 2 ** 20, 2),
+                'end': round(end_rss / 2 ** 20, 2),
+                'peak': round(max(self.peak_rss, end_rss) / 2 ** 20, 2),
+                'growth': round((end_rss - self.start_rss) / 2 ** 20, 2),
+            }
+        if (self.collect is not None):
+            report.update(self.collect())
+        return report
+
+    ##
+    #   @brief          CPU usage of the process and of each thread, in percent of one CPU.
+    def cpu_report(self, elapsed):
+        threads = {}
+        for tid, (name, cpu_time) in thread_cpu_times().items():
+            start_time = self.start_cpu.get(tid, (name, 0.))[1]
+            usage = (cpu_time - start_time) / elapsed * 100
+            threads[name] = round(threads.get(name, 0.) + usage, 2)
+        process = (time.process_time() - self.start_process_cpu) / elapsed * 100
+        return {'process': round(process, 2),
+                'threads': dict(sorted(threads.items(), key=lambda item: -item[1]))}
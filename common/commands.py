@@ -0,0 +1,181 @@
+##
+# @package common.commands
+#
+#   Non-blocking command channel towards the boards.
+#
+#   Commands are not written to the serial port by the caller (e.g., the
+#   Kivy UI thread), but queued and written by the thread owning the port,
+#   so that a wedged USB endpoint can never freeze the UI. When the board
+#   supports acknowledgements, each command is matched with the ack frame
+#   sent back by the board, otherwise it is completed as soon as it is
+#   written. Either way, the caller is notified upon completion.
+
+import queue
+import threading
+import time
+
+##
+#   @brief          Command waiting to be written or acknowledged.
+COMMAND_PENDING = 'pending'
+
+##
+#   @brief          Command acknowledged by the board.
+COMMAND_OK = 'ok'
+
+##
+#   @brief          Command written, for boards without acknowledgements.
+COMMAND_SENT = 'sent'
+
+##
+#   @brief          Command not acknowledged in time.
+COMMAND_TIMEOUT = 'timeout'
+
+##
+#   @brief          Command rejected by the board, or that could not be written.
+COMMAND_ERROR = 'error'
+
+##
+#   @brief          Default time in seconds to wait for an acknowledgement.
+DEFAULT_COMMAND_TIMEOUT = 1.0
+
+
+##
+#   @brief          Command sent to the board.
+class Command():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      data: bytes to be written to the board.
+    #   @param[in]      timeout: time in seconds to wait for an acknowledgement.
+    #   @param[in]      callback: optional function called with the command upon completion.
+    #   @param[in]      before_write: optional function called with the port just before writing.
+    def __init__(self, data, timeout=DEFAULT_COMMAND_TIMEOUT, callback=None, before_write=None):
+        self.data = data
+        self.timeout = timeout
+        self.callback = callback
+        self.before_write = before_write
+        self.status = COMMAND_PENDING
+        self.deadline = None        # time by which the ack must be received
+        self.sent_time = None       # time at which the command was written
+        self.completed_time = None  # time at which the command was completed
+        self.event = threading.Event()
+
+    ##
+    #   @brief          True if the command was applied by the board.
+    def succeeded(self):
+        return self.status in (COMMAND_OK, COMMAND_SENT)
+
+    ##
+    #   @brief          Time in seconds between writing and completion.
+    def latency(self):
+        if (self.sent_time is None or self.completed_time is None):
+            return None
+        return self.completed_time - self.sent_time
+
+    ##
+    #   @brief          Complete the command and notify the caller.
+    def complete(self, status):
+        self.status = status
+        self.completed_time = time.monotonic()
+        self.event.set()
+        if (self.callback is not None):
+            self.callback(self)
+
+    ##
+    #   @brief          Wait for the command to be completed.
+    #   @return         True if completed, False on timeout.
+    def wait(self, timeout=None):
+        return self.event.wait(timeout)
+
+
+##
+#   @brief          Queue of commands serviced by the thread owning the port.
+#
+#   Commands are written one at a time: when acknowledgements are enabled,
+#   the next command is written only after the previous one is
+#   acknowledged or timed out.
+#
+class CommandQueue():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      ack_enabled: True if the board acknowledges commands.
+    def __init__(self, ack_enabled=False):
+        self.ack_enabled = ack_enabled
+        self.queue = queue.Queue()
+        self.pending = None         # command waiting for an acknowledgement
+
+    ##
+    #   @brief          Queue a new command.
+    #
+    #   @param[in]      data: bytes to be written to the board.
+    #   @param[in]      timeout: time in seconds to wait for an acknowledgement.
+    #   @param[in]      callback: optional function called with the command upon completion.
+    #   @param[in]      before_write: optional function called with the port just before
+    #                   writing, by the thread owning the port (e.g., to flush its input).
+    #   @return         the queued \ref Command.
+    def put(self, data, timeout=DEFAULT_COMMAND_TIMEOUT, callback=None, before_write=None):
+        command = Command(data, timeout, callback, before_write)
+        self.queue.put(command)
+        return command
+
+    ##
+    #   @brief          Write the next command, if possible.
+    #
+    #   This function must be called periodically by the thread owning
+    #   the port. It also expires the pending command after its timeout.
+    #
+    #   @param[in]      port: the port commands are written to.
+    #   @param[in]      block_timeout: time in seconds to wait for a new command.
+    def service(self, port, block_timeout=0):
+        pending = self.pending
+        if (pending is not None):
+            if (time.monotonic() < pending.deadline):
+                return
+            self.pending = None
+            pending.complete(COMMAND_TIMEOUT)
+        try:
+            if (block_timeout):
+                command = self.queue.get(timeout=block_timeout)
+            else:
+                command = self.queue.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            if (command.before_write is not None):
+                command.before_write(port)
+            port.write(command.data)
+        except OSError:
+            # Includes serial.SerialTimeoutException on a wedged endpoint
+            command.complete(COMMAND_ERROR)
+            return
+        command.sent_time = time.monotonic()
+        if (self.ack_enabled):
+            command.deadline = command.sent_time + command.timeout
+            self.pending = command
+        else:
+            command.complete(COMMAND_SENT)
+
+    ##
+    #   @brief          Match an acknowledgement with the pending command.
+    #
+    #   @param[in]      command_byte: first byte of the acknowledged command.
+    #   @param[in]      status: 0 if the command was applied, error code otherwise.
+    def acknowledge(self, command_byte, status):
+        pending = self.pending
+        if (pending is not None and pending.data[0] == command_byte):
+            self.pending = None
+            pending.complete(COMMAND_OK if status == 0 else COMMAND_ERROR)
+
+    ##
+    #   @brief          Fail the pending and queued commands, e.g. upon disconnection.
+    def cancel_all(self):
+        pending = self.pending
+        self.pending = None
+        if (pending is not None):
+            pending.complete(COMMAND_ERROR)
+        while (True):
+            try:
+                self.queue.get_nowait().complete(COMMAND_ERROR)
+            except queue.Empty:
+                break
@@ -0,0 +1,103 @@
+##
+# @package common.conversion
+#
+#   Lookup-table based conversion of raw codes into physical values.
+#
+#   Both boards send 16-bit codes, so every possible code of a channel
+#   can be converted in advance into a table of 65536 values. A whole
+#   batch of codes is then converted with a single NumPy indexing
+#   operation, with no Python work per sample. Calibration (offset and
+#   gain of each channel) is folded into the tables, so it comes for free.
+
+import numpy as np
+
+##
+#   @brief          Number of possible 16-bit codes.
+N_CODES = 1 << 16
+
+
+##
+#   @brief          Converter of 16-bit codes into physical values.
+#
+#   The conversion of a channel is defined by a function of the codes,
+#   evaluated once on all the possible codes (as uint16 values). The
+#   calibrated value of a channel is (value - offset) * gain.
+#
+class LookupTableConverter():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      function: function converting an array of uint16 codes
+    #                   into an array of physical values.
+    #   @param[in]      n_channels: number of channels converted together.
+    #   @param[in]      dtype: data type of the converted values.
+    def __init__(self, function, n_channels=1, dtype=np.float32):
+        self.function = function
+        self.n_channels = n_channels
+        self.dtype = dtype
+        self.offsets = np.zeros(n_channels)
+        self.gains = np.ones(n_channels)
+        self.channels = np.arange(n_channels)
+        self.build()
+
+    ##
+    #   @brief          Compute the tables of all the channels.
+    def build(self):
+        values = np.asarray(self.function(np.arange(N_CODES, dtype=np.uint16)), dtype=np.float64)
+        self.tables = ((values[None, :] - self.offsets[:, None]) *
+                       self.gains[:, None]).astype(self.dtype)
+
+    ##
+    #   @brief          Change the conversion function, keeping the calibration.
+    def set_function(self, function):
+        self.function = function
+        self.build()
+
+    ##
+    #   @brief          Set the calibration of the channels.
+    #
+    #   @param[in]      offsets: offset of each channel, in physical units.
+    #   @param[in]      gains: gain of each channel, applied after the offset.
+    def set_calibration(self, offsets=None, gains=None):
+        self.offsets = (np.zeros(self.n_channels) if offsets is None
+                        else np.asarray(offsets, dtype=np.float64).reshape(self.n_channels))
+        self.gains = (np.ones(self.n_channels) if gains is None
+                      else np.asarray(gains, dtype=np.float64).reshape(self.n_channels))
+        self.build()
+
+    ##
+    #   @brief          Convert a batch of codes.
+    #
+    #   @param[in]      codes: array of shape (n, n_channels) of 16-bit codes;
+    #                   signed codes are reinterpreted as unsigned.
+    #   @return         array of shape (n, n_channels) of physical values.
+    def convert(self, codes):
+        codes = np.asarray(codes)
+        if (codes.dtype != np.uint16):
+            codes = codes.astype(np.int64) & 0xFFFF
+        return self.tables[self.channels, codes]
+
+    ##
+    #   @brief          Convert a single code of a channel.
+    def convert_code(self, code, channel=0):
+        return float(self.tables[channel, code & 0xFFFF])
+
+
+##
+#   @brief          Conversion function of left-justified two's complement codes.
+#
+#   @param[in]      resolution: number of significant bits.
+#   @param[in]      scale: physical value of one digit.
+#   @return         function suitable for \ref LookupTableConverter.
+def left_justified(resolution, scale):
+    shift = 16 - resolution
+    return lambda codes: (codes.view(np.int16) >> shift) * scale
+
+
+##
+#   @brief          Conversion function of unsigned codes over a full scale.
+#
+#   @param[in]      full_scale: physical value of the maximum code.
+#   @return         function suitable for \ref LookupTableConverter.
+def unsigned_full_scale(full_scale):
+    return lambda codes: codes / float(N_CODES - 1) * full_scale
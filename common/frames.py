@@ -0,0 +1,340 @@
+##
+# @package common.frames
+#
+#   Declarative description of the binary frames sent by the boards.
+#
+#   A \ref FrameSpec describes the layout of a frame:
+#
+#       header | [sequence] | fields... | [check] | [tail]
+#
+#   with a constant header byte, an optional sequence counter, payload
+#   fields given as (name, struct format character) in a common byte
+#   order, an optional check byte computed over the sequence and the
+#   fields, and an optional constant tail byte. For example, the data
+#   frames of the LIS3DH board are:
+#
+#       FrameSpec('data', header=0xA0, fields=[('x', 'h'), ('y', 'h'), ('z', 'h')],
+#                 tail=0xC0, byteorder='>')
+#
+#   The spec is compiled once into a struct.Struct, to encode or decode
+#   a single frame, and into a NumPy structured dtype. A \ref FrameDecoder
+#   then parses a byte stream made of the frames of one or more specs:
+#   runs of consecutive frames of the same spec are validated and decoded
+#   with a few array operations, and after garbage the decoder jumps to
+#   the next header byte instead of looking at one byte at a time. A new
+#   board only needs a spec, not a new parser.
+
+import struct
+import numpy as np
+from numpy.lib import recfunctions
+
+##
+#   @brief          Maximum number of frames validated at once by a \ref FrameDecoder.
+#
+#   Bounds the work wasted when a run of frames is broken early.
+MAX_RUN_FRAMES = 4096
+
+
+##
+#   @brief          Check byte: XOR of the bytes.
+#   @param[in]      columns: array of shape (n, n_bytes) of uint8.
+def xor8(columns):
+    return np.bitwise_xor.reduce(columns, axis=1).astype(np.uint8)
+
+
+##
+#   @brief          Check byte: sum of the bytes modulo 256.
+def sum8(columns):
+    return (columns.sum(axis=1) & 0xFF).astype(np.uint8)
+
+
+def make_crc8_table(polynomial):
+    table = np.zeros(256, dtype=np.uint8)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) if (crc & 0x80) else (crc << 1)
+        table[byte] = crc & 0xFF
+    return table
+
+
+_CRC8_TABLE = make_crc8_table(0x07)
+
+
+##
+#   @brief          Check byte: CRC-8 (polynomial 0x07, initial value 0).
+#
+#   Computed for all the frames at once, one byte column at a time.
+def crc8(columns):
+    crc = np.zeros(len(columns), dtype=np.uint8)
+    for column in columns.T:
+        crc = _CRC8_TABLE[crc ^ column]
+    return crc
+
+
+##
+#   @brief          Check byte functions available to the specs, by name.
+CHECKS = {'xor8': xor8, 'sum8': sum8, 'crc8': crc8}
+
+
+##
+#   @brief          Description of a frame, compiled into its struct and dtype.
+class FrameSpec():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      name: name of the frame, key of the frames returned by \ref FrameDecoder.
+    #   @param[in]      header: value of the first byte.
+    #   @param[in]      fields: list of (name, format) of the payload, with struct
+    #                   format characters of fixed size (e.g. 'B', 'h', 'H', 'i', 'f').
+    #   @param[in]      tail: value of the last byte, None if the frame has no tail.
+    #   @param[in]      byteorder: '>' for big-endian fields, '<' for little-endian.
+    #   @param[in]      check: name of a function of \ref CHECKS, computing a byte
+    #                   over the sequence and the fields, None for no check.
+    #   @param[in]      sequence: format of a counter following the header ('B' or 'H'),
+    #                   incremented by one for each frame, None for no counter.
+    def __init__(self, name, header, fields, tail=None, byteorder='>', check=None,
+                 sequence=None):
+        if (byteorder not in '<>'):
+            raise ValueError(f'Byte order must be < or >, not {byteorder!r}')
+        if (check is not None and check not in CHECKS):
+            raise ValueError(f'Unknown check {check!r}, expected one of {sorted(CHECKS)}')
+        self.name = name
+        self.header = header
+        self.fields = list(fields)
+        self.tail = tail
+        self.byteorder = byteorder
+        self.check = check
+        self.sequence = sequence
+        self.field_names = tuple(field_name for field_name, _ in self.fields)
+        # Layout of the whole frame, header and tail included
+        layout = [('header', 'B')]
+        if (sequence is not None):
+            layout.append(('sequence', sequence))
+        layout += self.fields
+        if (check is not None):
+            layout.append(('check', 'B'))
+        if (tail is not None):
+            layout.append(('tail', 'B'))
+        self.struct = struct.Struct(byteorder + ''.join(fmt for _, fmt in layout))
+        self.dtype = np.dtype([(field_name, byteorder + fmt) for field_name, fmt in layout])
+        if (self.dtype.itemsize != self.struct.size):
+            raise ValueError('Fields must have a fixed size')
+        self.size = self.struct.size
+        self.header_byte = bytes([header])
+        self.tail_byte = bytes([tail]) if (tail is not None) else b''
+        self.check_offset = self.size - (2 if (tail is not None) else 1)
+        self.sequence_modulo = (1 << (8 * struct.calcsize(sequence))) if (sequence is not None) else 0
+
+    ##
+    #   @brief          Check which frames are valid.
+    #
+    #   @param[in]      frames: array of shape (n, size) of uint8, candidate frames.
+    #   @return         boolean array of the frames with valid header, tail and check.
+    def validate(self, frames):
+        valid = frames[:, 0] == self.header
+        if (self.tail is not None):
+            valid &= frames[:, -1] == self.tail
+        if (self.check is not None):
+            valid &= CHECKS[self.check](frames[:, 1:self.check_offset]) == frames[:, self.check_offset]
+        return valid
+
+    ##
+    #   @brief          Encode frames, filling header, check and tail.
+    #
+    #   @param[in]      values: dictionary of the arrays (or scalars) of each field,
+    #                   and of 'sequence' if the frame has a counter.
+    #   @param[in]      n: number of frames.
+    #   @return         bytes of the frames.
+    def encode(self, values, n=1):
+        records = np.zeros(n, dtype=self.dtype)
+        records['header'] = self.header
+        for field_name, value in values.items():
+            records[field_name] = value
+        if (self.check is not None):
+            frames = records.view(np.uint8).reshape(n, self.size)
+            records['check'] = CHECKS[self.check](frames[:, 1:self.check_offset])
+        if (self.tail is not None):
+            records['tail'] = self.tail
+        return records.tobytes()
+
+    ##
+    #   @brief          Decode a single frame.
+    #   @return         dictionary of the values of the fields, None if the frame is not valid.
+    def decode(self, frame):
+        frame = bytes(frame)
+        if (len(frame) != self.size or
+                not self.validate(np.frombuffer(frame, dtype=np.uint8).reshape(1, -1))[0]):
+            return None
+        return dict(zip(self.dtype.names, self.struct.unpack(frame)))
+
+
+##
+#   @brief          Values of some fields of decoded frames, as a plain array.
+#
+#   @param[in]      records: structured array returned by \ref FrameDecoder.feed.
+#   @param[in]      names: names of the fields, e.g. FrameSpec.field_names.
+#   @param[in]      dtype: data type of the array, native byte order.
+#   @return         array of shape (n, number of fields).
+def field_values(records, names, dtype=None):
+    key = (records.dtype, tuple(names))
+    layout = _field_layouts.get(key)
+    if (layout is None):
+        layout = _field_layouts[key] = field_layout(records.dtype, names)
+    if (layout is False):
+        return recfunctions.structured_to_unstructured(records[list(names)], dtype=dtype)
+    # Consecutive fields of the same type: the columns of bytes are reinterpreted at once
+    field_dtype, start, stop = layout
+    raw = records.view(np.uint8).reshape(len(records), records.dtype.itemsize)[:, start:stop]
+    values = np.ascontiguousarray(raw).view(field_dtype)
+    return values.astype(field_dtype.newbyteorder('=') if (dtype is None) else dtype)
+
+
+_field_layouts = {}
+
+
+##
+#   @brief          Type and byte range of fields, if consecutive and of the same type.
+#   @return         (field dtype, start, stop), or False.
+def field_layout(dtype, names):
+    fields = [dtype.fields[name] for name in names]
+    field_dtype, start = fields[0][:2]
+    for i, field in enumerate(fields):
+        if (field[:2] != (field_dtype, start + i * field_dtype.itemsize)):
+            return False
+    return field_dtype, start, start + len(fields) * field_dtype.itemsize
+
+
+##
+#   @brief          Incremental decoder of a stream of frames of one or more specs.
+#
+#   Bytes can be fed in chunks of arbitrary size: an incomplete frame is
+#   kept until the next call. Bytes that do not start a valid frame of any
+#   spec are skipped and counted in \ref skipped_bytes; frames with a valid
+#   header and tail but a wrong check byte are counted in \ref check_errors,
+#   and frames missing from the sequence counters in \ref lost_frames.
+class FrameDecoder():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      specs: list of \ref FrameSpec with distinct header bytes.
+    def __init__(self, specs):
+        self.specs = list(specs)
+        self.by_header = {spec.header: spec for spec in self.specs}
+        if (len(self.by_header) != len(self.specs)):
+            raise ValueError('Frame specs must have distinct header bytes')
+        self.headers = bytes(sorted(self.by_header))
+        self.empty = {spec.name: np.empty(0, dtype=spec.dtype) for spec in self.specs}
+        self.reset()
+
+    ##
+    #   @brief          Discard any partially received frame and the counters.
+    def reset(self):
+        self.buffer = bytearray()
+        self.skipped_bytes = 0
+        self.check_errors = 0
+        self.lost_frames = 0
+        self.last_sequence = {}
+
+    ##
+    #   @brief          Offset of the next header byte from start, None if there is none.
+    def find_header(self, data, start):
+        offsets = [offset for offset in (data.find(header, start) for header in self.headers)
+                   if (offset >= 0)]
+        return min(offsets) if (offsets) else None
+
+    ##
+    #   @brief          Parse a new chunk of bytes.
+    #
+    #   @param[in]      data: bytes read from the serial port.
+    #   @return         dictionary of the structured arrays of the frames of
+    #                   each spec, by spec name, in order of arrival.
+    def feed(self, data):
+        decoded = dict(self.empty)
+        runs = self.feed_runs(data)
+        for spec in self.specs:
+            chunks = [records for run_spec, records in runs if (run_spec is spec)]
+            if (chunks):
+                decoded[spec.name] = chunks[0] if (len(chunks) == 1) else np.concatenate(chunks)
+        return decoded
+
+    ##
+    #   @brief          Parse a new chunk of bytes, keeping the order of the frames of different specs.
+    #
+    #   Needed when a frame changes how the following ones are interpreted
+    #   (e.g., an acknowledgement of a change of scale).
+    #
+    #   @param[in]      data: bytes read from the serial port.
+    #   @return         list of (spec, structured array of consecutive frames of
+    #                   the spec), in order of arrival.
+    def feed_runs(self, data):
+        buffer = self.buffer
+        buffer.extend(data)
+        data = bytes(buffer)
+        n_bytes = len(data)
+        runs = []                   # [spec, offset, number of frames] of the valid runs
+        idx = 0
+        while (idx < n_bytes):
+            spec = self.by_header.get(data[idx])
+            if (spec is None):
+                # Jump to the next header byte
+                next_idx = self.find_header(data, idx + 1)
+                if (next_idx is None):
+                    next_idx = n_bytes
+                self.skipped_bytes += next_idx - idx
+                idx = next_idx
+                continue
+            size = spec.size
+            n_frames = min((n_bytes - idx) // size, MAX_RUN_FRAMES)
+            if (n_frames == 0):
+                break   # wait for the rest of the frame
+            n_valid = self.count_valid(spec, data, idx, n_frames)
+            if (n_valid == 0):
+                self.skipped_bytes += 1
+                idx += 1
+                continue
+            if (runs and runs[-1][0] is spec and runs[-1][1] + runs[-1][2] * size == idx):
+                runs[-1][2] += n_valid
+            else:
+                runs.append([spec, idx, n_valid])
+            idx += n_valid * size
+        decoded = []
+        for spec, offset, n in runs:
+            # Slices of the bytearray are copies: the records are writable
+            records = np.frombuffer(buffer[offset:offset + n * spec.size], dtype=spec.dtype)
+            if (spec.sequence is not None):
+                self.count_lost_frames(spec, records['sequence'])
+            decoded.append((spec, records))
+        del buffer[:idx]
+        return decoded
+
+    ##
+    #   @brief          Number of consecutive valid frames of a spec from an offset.
+    #
+    #   Header and tail bytes of the whole run are compared as bytes first,
+    #   which is the common case; the run is validated as an array only if
+    #   it has a check byte or is broken.
+    def count_valid(self, spec, data, idx, n_frames):
+        size = spec.size
+        end = idx + n_frames * size
+        if (spec.check is None and
+                data[idx:end:size] == spec.header_byte * n_frames and
+                (spec.tail is None or data[idx + size - 1:end:size] == spec.tail_byte * n_frames)):
+            return n_frames
+        frames = np.frombuffer(data, dtype=np.uint8, count=n_frames * size, offset=idx)
+        frames = frames.reshape(n_frames, size)
+        valid = spec.validate(frames)
+        n_valid = n_frames if (valid.all()) else int(np.argmin(valid))
+        if (n_valid == 0 and spec.check is not None and
+                (spec.tail is None or frames[0, -1] == spec.tail)):
+            self.check_errors += 1
+        return n_valid
+
+    def count_lost_frames(self, spec, sequence):
+        sequence = sequence.astype(np.int64)
+        last = self.last_sequence.get(spec.name)
+        if (last is not None):
+            sequence = np.concatenate(([last], sequence))
+        gaps = (np.diff(sequence) - 1) % spec.sequence_modulo
+        self.lost_frames += int(gaps.sum())
+        self.last_sequence[spec.name] = int(sequence[-1])
@@ -0,0 +1,183 @@
+##
+# @package common.hotplug
+#
+#   Event-driven discovery of serial ports.
+#
+#   A \ref PortMonitor keeps the list of serial ports up to date and
+#   reports the ports that appeared or disappeared since the previous
+#   scan, so that boards are probed only once, when they are plugged in,
+#   instead of opening every port of the machine in a loop. On Linux,
+#   ports are scanned when the kernel sends a uevent of the tty subsystem
+#   on its netlink socket; elsewhere, or when the socket cannot be opened
+#   (e.g., in some containers), the ports are polled.
+
+import select
+import socket
+import sys
+import threading
+import serial.tools.list_ports as list_ports
+
+##
+#   @brief          Time in seconds between two scans when polling.
+DEFAULT_POLL_INTERVAL = 1.0
+
+##
+#   @brief          Time in seconds waited after a uevent, until the device node is ready.
+HOTPLUG_SETTLE_TIME = 0.2
+
+##
+#   @brief          Netlink protocol of the kernel uevents (Linux only).
+NETLINK_KOBJECT_UEVENT = 15
+
+##
+#   @brief          Netlink multicast group of the kernel uevents.
+UEVENT_KERNEL_GROUP = 1
+
+
+##
+#   @brief          Names of the serial ports currently available.
+def list_port_names():
+    return set(port.device for port in list_ports.comports())
+
+
+##
+#   @brief          Identity of the USB device of a serial port.
+#
+#   @param[in]      port_name: name of the serial port.
+#   @return         the USB serial number of the device, or its VID:PID:location
+#                   if it has none, '' if the port is not found or not a USB port.
+def usb_port_identity(port_name):
+    for port in list_ports.comports():
+        if (port.device == port_name):
+            if (port.serial_number):
+                return port.serial_number
+            if (port.vid is not None):
+                return f'{port.vid:04X}:{port.pid:04X}:{port.location or ""}'
+    return ''
+
+
+##
+#   @brief          Check if a uevent concerns a tty device.
+#
+#   @param[in]      message: uevent received from the netlink socket.
+#   @return         True if the uevent is sent by the tty subsystem.
+def is_tty_uevent(message):
+    return b'SUBSYSTEM=tty' in message.split(b'\0')
+
+
+##
+#   @brief          Monitor of the serial ports plugged and unplugged.
+#
+#   The callback is called from the thread of the monitor with the sorted
+#   lists of added and removed port names. Ports already present when the
+#   monitor starts are reported as added by the first scan.
+class PortMonitor():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      callback: function called with added and removed port names.
+    #   @param[in]      poll_interval: time in seconds between two scans when polling.
+    #   @param[in]      list_ports: function returning the set of port names.
+    def __init__(self, callback, poll_interval=DEFAULT_POLL_INTERVAL, list_ports=list_port_names):
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.list_ports = list_ports
+        self.ports = set()          # ports found by the last scan
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    ##
+    #   @brief          Start monitoring the ports in a background thread.
+    def start(self):
+        if (self.thread is None):
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    ##
+    #   @brief          Stop monitoring the ports.
+    def stop(self):
+        self.stop_event.set()
+        thread = self.thread
+        self.thread = None
+        if (thread is not None and thread is not threading.current_thread()):
+            thread.join()
+
+    ##
+    #   @brief          Scan the ports, and report the changes to the callback.
+    #   @return         sorted list of the ports found.
+    def scan(self):
+        ports = self.list_ports()
+        with self.lock:
+            added = sorted(ports - self.ports)
+            removed = sorted(self.ports - ports)
+            self.ports = ports
+        if (added or removed):
+            self.callback(added, removed)
+        return sorted(ports)
+
+    ##
+    #   @brief          Forget a port, so that it is reported as added by the next scan.
+    #
+    #   Called when a board is disconnected, so that its port is probed again
+    #   also if it never disappeared from the ports (e.g., the board was reset).
+    def forget(self, port_name):
+        with self.lock:
+            self.ports.discard(port_name)
+
+    ##
+    #   @brief          Target function of the thread of the monitor.
+    def run(self):
+        self.scan()
+        uevents = self.open_uevent_socket()
+        try:
+            while (not self.stop_event.is_set()):
+                if (uevents is None):
+                    self.stop_event.wait(self.poll_interval)
+                elif (not self.wait_tty_uevent(uevents)):
+                    continue
+                if (not self.stop_event.is_set()):
+                    self.scan()
+        finally:
+            if (uevents is not None):
+                uevents.close()
+
+    ##
+    #   @brief          Open the netlink socket of the kernel uevents.
+    #   @return         the socket, or None to poll the ports.
+    def open_uevent_socket(self):
+        if (not sys.platform.startswith('linux')):
+            return None
+        try:
+            uevents = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            uevents.bind((0, UEVENT_KERNEL_GROUP))
+        except (AttributeError, OSError):
+            return None
+        return uevents
+
+    ##
+    #   @brief          Wait for a uevent of the tty subsystem.
+    #
+    #   The socket is checked every \ref poll_interval seconds, so that the
+    #   monitor can be stopped. Once a tty uevent is received, the uevents
+    #   of the following \ref HOTPLUG_SETTLE_TIME seconds are drained, so
+    #   that a board creating several devices is scanned once.
+    #
+    #   @param[in]      uevents: the netlink socket.
+    #   @return         True if a tty uevent was received.
+    def wait_tty_uevent(self, uevents):
+        timeout = self.poll_interval
+        tty_changed = False
+        while (not self.stop_event.is_set()):
+            readable, _, _ = select.select([uevents], [], [], timeout)
+            if (not readable):
+                return tty_changed
+            try:
+                message = uevents.recv(16384)
+            except OSError:
+                return tty_changed
+            if (is_tty_uevent(message)):
+                tty_changed = True
+                timeout = HOTPLUG_SETTLE_TIME
+        return tty_changed
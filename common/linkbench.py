@@ -0,0 +1,210 @@
+##
+# @package common.linkbench
+#
+#   Measurements of the serial link with a board: round-trip latency,
+#   arrival jitter, command-to-effect latency and throughput.
+#
+#   The functions of this module only need a pyserial-like port and the
+#   host arrival times of the frames, so they work with any board whose
+#   frames are decoded by a common.frames.FrameDecoder:
+#       - \ref measure_round_trips times a command and its response (e.g.
+#         the connection handshake) many times;
+#       - an \ref ArrivalLog records when each chunk of frames was read,
+#         from which \ref arrival_jitter measures how far arrivals are from
+#         a steady stream, and \ref change_time when the rate of the stream
+#         changed after a command.
+#
+#   Times are in seconds, from time.perf_counter; the reports give
+#   durations in milliseconds. Kivy is not imported.
+
+import json
+import time
+import numpy as np
+
+##
+#   @brief          Percentiles of the distributions of the reports.
+REPORT_PERCENTILES = (50, 90, 99)
+
+##
+#   @brief          Default time in seconds waited for a response.
+DEFAULT_RESPONSE_TIMEOUT = 1.0
+
+##
+#   @brief          Default number of frames above the old rate detecting a change.
+DEFAULT_CHANGE_MARGIN = 3
+
+
+##
+#   @brief          Summary of a distribution of durations.
+#
+#   @param[in]      values: durations in seconds.
+#   @return         dictionary of the count, and of the mean, standard deviation,
+#                   minimum, percentiles and maximum in milliseconds.
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64) * 1000
+    summary = {'count': int(len(values))}
+    if (len(values) == 0):
+        return summary
+    summary['mean_ms'] = round(float(values.mean()), 3)
+    summary['std_ms'] = round(float(values.std()), 3)
+    summary['min_ms'] = round(float(values.min()), 3)
+    for percentile in REPORT_PERCENTILES:
+        summary[f'p{percentile}_ms'] = round(float(np.percentile(values, percentile)), 3)
+    summary['max_ms'] = round(float(values.max()), 3)
+    return summary
+
+
+##
+#   @brief          Read from a port until a response contains all the given markers.
+#
+#   @param[in]      port: open serial port, with a short read timeout.
+#   @param[in]      markers: list of bytes the response must contain.
+#   @param[in]      timeout: time in seconds waited for the response.
+#   @return         (time of the read completing the response, bytes received),
+#                   None as time if the response is incomplete.
+def read_response(port, markers, timeout=DEFAULT_RESPONSE_TIMEOUT):
+    received = bytearray()
+    deadline = time.perf_counter() + timeout
+    while (time.perf_counter() < deadline):
+        received += port.read(max(1, port.in_waiting))
+        if (all(marker in received for marker in markers)):
+            return time.perf_counter(), bytes(received)
+    return None, bytes(received)
+
+
+##
+#   @brief          Time a command and its response, repeatedly.
+#
+#   The port must be idle (not streaming): the bytes received meanwhile
+#   are discarded before each command.
+#
+#   @param[in]      port: open serial port, with a short read timeout.
+#   @param[in]      command: bytes of the command.
+#   @param[in]      markers: list of bytes the response must contain.
+#   @param[in]      n: number of round trips.
+#   @param[in]      interval: time in seconds between two round trips.
+#   @return         (list of the round-trip times in seconds, number of timeouts).
+def measure_round_trips(port, command, markers, n, interval=0.01,
+                        timeout=DEFAULT_RESPONSE_TIMEOUT):
+    round_trips = []
+    n_timeouts = 0
+    for _ in range(n):
+        port.reset_input_buffer()
+        start = time.perf_counter()
+        port.write(command)
+        end, _ = read_response(port, markers, timeout)
+        if (end is None):
+            n_timeouts += 1
+        else:
+            round_trips.append(end - start)
+        # Let the end of the response arrive, to be discarded
+        time.sleep(interval)
+    return round_trips, n_timeouts
+
+
+##
+#   @brief          Arrival times of the frames of a stream.
+#
+#   Frames read together share the time of the read: the log keeps one
+#   entry per chunk, with the number of frames received so far.
+class ArrivalLog():
+
+    def __init__(self):
+        self.times = []         # time of each chunk
+        self.counts = []        # frames received up to each chunk, included
+
+    def __len__(self):
+        return self.counts[-1] if (self.counts) else 0
+
+    ##
+    #   @brief          Record a chunk of frames.
+    #   @param[in]      timestamp: time at which the chunk was read.
+    #   @param[in]      n_frames: number of frames of the chunk.
+    def add(self, timestamp, n_frames):
+        if (n_frames > 0):
+            self.times.append(timestamp)
+            self.counts.append(len(self) + n_frames)
+
+    ##
+    #   @brief          Arrays of the chunks received.
+    #   @return         (times, counts).
+    def arrays(self):
+        return np.asarray(self.times, dtype=np.float64), np.asarray(self.counts, dtype=np.int64)
+
+
+##
+#   @brief          Rate and jitter of a steady stream.
+#
+#   The last frame of each chunk should arrive at t0 + k / rate; t0 and
+#   rate are fitted by least squares, so that the drift between the clocks
+#   of the board and of the host is not counted as jitter. Residuals are
+#   the arrival time of each chunk minus its fitted time.
+#
+#   @param[in]      times: arrival time of each chunk.
+#   @param[in]      counts: frames received up to each chunk, included.
+#   @return         dictionary of the measured rate, the summaries of the
+#                   residuals and of the intervals between chunks, and the
+#                   mean number of frames per chunk; empty if less than 3 chunks.
+def arrival_jitter(times, counts):
+    times = np.asarray(times, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    if (len(times) < 3 or counts[-1] == counts[0]):
+        return {}
+    slope, intercept = np.polyfit(counts, times, 1)
+    residuals = times - (slope * counts + intercept)
+    return {
+        'measured_rate_hz': round(float(1 / slope), 3),
+        'residual': summarize(np.abs(residuals)),
+        'residual_std_ms': round(float(residuals.std() * 1000), 3),
+        'chunk_interval': summarize(np.diff(times)),
+        'frames_per_chunk': round(float(np.diff(counts).mean()), 3),
+    }
+
+
+##
+#   @brief          Time at which a stream changed from one rate to another.
+#
+#   The change is detected when more frames than expected at the old rate
+#   have arrived since the command. It is then located at the intersection
+#   of the line fitted to the arrivals before the command, and of the line
+#   fitted to the arrivals after the detection, so that its time does not
+#   depend on the detection margin. Its resolution is about
+#   1 / (new rate - old rate): the old rate is only sampled once per frame.
+#
+#   @param[in]      times: arrival time of each chunk.
+#   @param[in]      counts: frames received up to each chunk, included.
+#   @param[in]      command_time: time at which the command was written.
+#   @param[in]      old_rate: rate in Hz before the command, lower than the new one.
+#   @param[in]      margin: frames above the old rate detecting the change.
+#   @return         time of the change, None if not detected.
+def change_time(times, counts, command_time, old_rate, margin=DEFAULT_CHANGE_MARGIN):
+    times = np.asarray(times, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    before = times < command_time
+    if (before.sum() < 2):
+        return None
+    old_slope, old_intercept = np.polyfit(times[before], counts[before], 1)
+    expected = old_slope * times + old_intercept
+    detected = ~before & (counts > expected + margin)
+    if (not detected.any()):
+        return None
+    after = np.arange(len(times)) >= np.argmax(detected)
+    if (after.sum() < 2):
+        return None
+    new_slope, new_intercept = np.polyfit(times[after], counts[after], 1)
+    if (new_slope <= old_slope):
+        return None
+    return float((old_intercept - new_intercept) / (new_slope - old_slope))
+
+
+##
+#   @brief          Write a report as JSON.
+#   @param[in]      report: dictionary of the report.
+#   @param[in]      path: path of the file, None to print it.
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2)
+    if (path is None):
+        print(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
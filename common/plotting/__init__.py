@@ -0,0 +1,12 @@
+##
+# @package common.plotting
+#
+#   Streaming plot widget shared by the WaveDAC and LIS3DH GUIs.
+#
+#   \ref common.plotting.buffers holds the Kivy-free ring buffer and
+#   decimation of the plotted samples, \ref common.plotting.streaming_plot
+#   the Kivy widget with its plot settings panel.
+#   \ref common.plotting.statistics keeps the running statistics of each
+#   channel shown in that panel, updated in O(batch).
+#   \ref common.plotting.spectrum computes short-time FFTs in a background
+#   thread for the scrolling spectrogram of \ref common.plotting.spectrogram.
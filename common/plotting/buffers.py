@@ -0,0 +1,169 @@
+##
+# @package common.plotting.buffers
+#
+#   Kivy-free storage and reduction of streamed samples for plotting.
+#
+#   Samples are written into a preallocated \ref RingBuffer, so that adding
+#   a batch costs the size of the batch, not of the plotted window. Before
+#   drawing, windows longer than the number of points the screen can show
+#   are reduced with \ref decimate_min_max, which keeps the peaks.
+
+from math import floor, isclose, log10
+import numpy as np
+
+
+##
+#   @brief          Ring buffer of samples of several channels.
+class RingBuffer():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      capacity: maximum number of samples stored.
+    #   @param[in]      n_channels: number of channels of each sample.
+    #   @param[in]      dtype: data type of the stored values.
+    def __init__(self, capacity, n_channels=1, dtype=np.float32):
+        self.capacity = max(1, int(capacity))
+        self.n_channels = n_channels
+        self.data = np.zeros((self.capacity, n_channels), dtype=dtype)
+        self.index = 0      # position of the next sample written
+        self.count = 0      # number of samples stored
+
+    ##
+    #   @brief          Remove all the samples.
+    def clear(self):
+        self.index = 0
+        self.count = 0
+
+    ##
+    #   @brief          Change the capacity, keeping the latest samples that fit.
+    #   @param[in]      capacity: new maximum number of samples stored.
+    def resize(self, capacity):
+        capacity = max(1, int(capacity))
+        if (capacity == self.capacity):
+            return
+        latest = self.latest(capacity)
+        data = np.zeros((capacity, self.n_channels), dtype=self.data.dtype)
+        data[:len(latest)] = latest
+        self.data = data
+        self.capacity = capacity
+        self.count = len(latest)
+        self.index = self.count % capacity
+
+    ##
+    #   @brief          Add a batch of samples, overwriting the oldest ones.
+    #   @param[in]      samples: array of shape (n, n_channels), or (n,) with one channel.
+    def extend(self, samples):
+        samples = np.asarray(samples).reshape(-1, self.n_channels)
+        n_samples = len(samples)
+        if (n_samples >= self.capacity):
+            self.data[:] = samples[-self.capacity:]
+            self.index = 0
+        else:
+            first = min(n_samples, self.capacity - self.index)
+            self.data[self.index:self.index + first] = samples[:first]
+            self.data[:n_samples - first] = samples[first:]
+            self.index = (self.index + n_samples) % self.capacity
+        self.count = min(self.capacity, self.count + n_samples)
+
+    ##
+    #   @brief          Get the latest samples, from the oldest to the newest.
+    #
+    #   @param[in]      n_samples: maximum number of samples.
+    #   @return         array of shape (n, n_channels), a view when possible.
+    def latest(self, n_samples):
+        n_samples = min(int(n_samples), self.count)
+        start = (self.index - n_samples) % self.capacity
+        if (start + n_samples <= self.capacity):
+            return self.data[start:start + n_samples]
+        return np.concatenate((self.data[start:], self.data[:self.index]))
+
+    ##
+    #   @brief          Get the oldest samples, from the oldest to the newest.
+    #
+    #   @param[in]      n_samples: maximum number of samples.
+    #   @return         array of shape (n, n_channels), a view when possible.
+    def oldest(self, n_samples):
+        n_samples = min(int(n_samples), self.count)
+        start = (self.index - self.count) % self.capacity
+        if (start + n_samples <= self.capacity):
+            return self.data[start:start + n_samples]
+        return np.concatenate((self.data[start:], self.data[:start + n_samples - self.capacity]))
+
+
+##
+#   @brief          Reduce samples to the minimum and maximum of each bucket.
+#
+#   The last samples are split into buckets, and each bucket is replaced by
+#   its minimum and maximum, so that peaks stay visible however long the
+#   window. Samples are returned as they are if they already fit.
+#
+#   @param[in]      x: array of n x values.
+#   @param[in]      y: array of shape (n, channels) of y values.
+#   @param[in]      max_points: maximum number of points returned.
+#   @return         tuple with x and y arrays of at most max_points points.
+def decimate_min_max(x, y, max_points):
+    n_buckets = max(1, int(max_points) // 2)
+    if (len(x) <= 2 * n_buckets):
+        return x, y
+    bucket = -(-len(x) // n_buckets)
+    n_buckets = len(x) // bucket
+    start = len(x) - n_buckets * bucket
+    # Reduce along contiguous memory, one channel at a time, which is much faster
+    buckets = np.ascontiguousarray(y[start:].T).reshape(y.shape[1], n_buckets, bucket)
+    y_out = np.empty((2 * n_buckets, y.shape[1]), dtype=y.dtype)
+    y_out[0::2] = buckets.min(axis=2).T
+    y_out[1::2] = buckets.max(axis=2).T
+    x_buckets = x[start:].reshape(n_buckets, bucket)
+    x_out = np.empty(2 * n_buckets, dtype=x.dtype)
+    x_out[0::2] = x_buckets[:, 0]
+    x_out[1::2] = x_buckets[:, -1]
+    return x_out, y_out
+
+
+##
+#   @brief          Get decimal exponent of a number.
+def fexp(number):
+    if (number == 0):
+        return 0
+    return floor(log10(abs(number)))
+
+
+##
+#   @brief          Get decimal mantissa of a number.
+def fman(number):
+    return number / pow(10.0, fexp(number))
+
+
+##
+#   @brief          Get rounded bounds and ticks of an axis.
+#
+#   @param[in]      minval: minimum value of the plot.
+#   @param[in]      maxval: maximum value of the plot.
+#   @param[in]      nticks: desired number of ticks
+#   @return         tuple with minimum, maximum, major tick and suggested number of minor ticks.
+def get_bounds_and_ticks(minval, maxval, nticks):
+    # amplitude of data
+    amp = maxval - minval
+    # basic tick
+    basictick = fman(amp/float(nticks))
+    # correct basic tick to 1,2,5 as mantissa
+    tickpower = pow(10.0, fexp(amp/float(nticks)))
+    if basictick < 1.5:
+        tick = 1.0*tickpower
+        suggested_minor_tick = 4
+    elif basictick >= 1.5 and basictick < 2.5:
+        tick = 2.0*tickpower
+        suggested_minor_tick = 4
+    elif basictick >= 2.5 and basictick < 7.5:
+        tick = 5.0*tickpower
+        suggested_minor_tick = 5
+    elif basictick >= 7.5:
+        tick = 10.0*tickpower
+        suggested_minor_tick = 4
+    # calculate good (rounded) min and max
+    goodmin = tick * (minval // tick)
+    if not isclose(maxval % tick, 0.0):
+        goodmax = tick * (maxval // tick + 1)
+    else:
+        goodmax = tick * (maxval // tick)
+    return goodmin, goodmax, tick, suggested_minor_tick
@@ -0,0 +1,216 @@
+##
+# @package common.plotting.spectrogram
+#
+#   Kivy widget showing a scrolling spectrogram of streamed samples.
+#
+#   The history is kept in a texture used as a circular buffer of
+#   \ref SpectrogramView.n_columns columns. Each new column of a
+#   common.plotting.spectrum.SpectrumWorker is written over the oldest
+#   one with Texture.blit_buffer. The texture is drawn by two rectangles
+#   split at the oldest column, whose texture coordinates are shifted by
+#   one column, so that the newest column is drawn on the right (a single
+#   rectangle with a repeated texture would need power-of-two sizes on
+#   OpenGL ES). An update costs one column, however many columns are
+#   shown; no widget nor instruction is created.
+
+import os
+from kivy.clock import Clock
+from kivy.factory import Factory
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.lang import Builder
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.widget import Widget
+from kivy.properties import (BooleanProperty, ListProperty, NumericProperty,  # pylint:disable=no-name-in-module
+                             ObjectProperty, StringProperty)
+import numpy as np
+
+from common.plotting import streaming_plot  # pylint:disable=unused-import
+from common.plotting.spectrum import DEFAULT_DYNAMIC_RANGE, DEFAULT_FFT_SIZE, SpectrumWorker
+
+Builder.load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spectrogram.kv'))
+
+##
+#   @brief          Default number of columns of the history, a power of two for the texture.
+DEFAULT_N_COLUMNS = 512
+
+##
+#   @brief          Interval in seconds between two collections of the finished columns.
+COLUMN_UPDATE_INTERVAL = 1 / 30.
+
+
+##
+#   @brief          Circular texture of spectrogram columns.
+class SpectrogramView(Widget):
+
+    ##
+    #   @brief          Number of columns of the history.
+    n_columns = NumericProperty(DEFAULT_N_COLUMNS)
+
+    def __init__(self, **kwargs):
+        self.texture = None
+        self.column_height = 0
+        self.head = 0           # column written next, the oldest one
+        super(SpectrogramView, self).__init__(**kwargs)
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self.old_rectangle = Rectangle()     # columns from head to the end of the texture
+            self.new_rectangle = Rectangle()     # columns from the start of the texture to head
+        self.bind(pos=self.scroll, size=self.scroll)
+
+    ##
+    #   @brief          Create a black texture for columns of a given height.
+    def reset(self, column_height):
+        self.column_height = max(1, int(column_height))
+        self.texture = Texture.create(size=(int(self.n_columns), self.column_height),
+                                      colorfmt='rgba', bufferfmt='ubyte')
+        self.texture.wrap = 'clamp_to_edge'
+        self.texture.mag_filter = 'nearest'
+        self.texture.min_filter = 'nearest'
+        black = np.zeros((self.column_height, int(self.n_columns), 4), dtype=np.uint8)
+        black[:, :, 3] = 255
+        self.texture.blit_buffer(black.tobytes(), colorfmt='rgba', bufferfmt='ubyte')
+        self.head = 0
+        self.old_rectangle.texture = self.texture
+        self.new_rectangle.texture = self.texture
+        self.scroll()
+
+    def on_n_columns(self, instance, value):
+        if (self.texture is not None):
+            self.reset(self.column_height)
+
+    ##
+    #   @brief          Write new columns over the oldest ones.
+    #   @param[in]      columns: list of arrays of shape (column height, 4) of uint8.
+    def add_columns(self, columns):
+        n_columns = int(self.n_columns)
+        # Columns overwritten before being shown are skipped
+        for column in columns[-n_columns:]:
+            self.texture.blit_buffer(column.tobytes(), pos=(self.head, 0),
+                                     size=(1, self.column_height),
+                                     colorfmt='rgba', bufferfmt='ubyte')
+            self.head = (self.head + 1) % n_columns
+        self.scroll()
+
+    ##
+    #   @brief          Draw the texture from the oldest column.
+    def scroll(self, *args):
+        u = self.head / float(self.n_columns)
+        old_width = self.width * (1 - u)
+        self.old_rectangle.pos = self.pos
+        self.old_rectangle.size = (old_width, self.height)
+        self.old_rectangle.tex_coords = (u, 0, 1, 0, 1, 1, u, 1)
+        self.new_rectangle.pos = (self.x + old_width, self.y)
+        self.new_rectangle.size = (self.width - old_width, self.height)
+        self.new_rectangle.tex_coords = (0, 0, u, 0, u, 1, 0, 1)
+        self.canvas.ask_update()
+
+
+##
+#   @brief          Spectrogram of streamed samples with its settings.
+#
+#   Samples are added in batches with \ref Spectrogram.add_samples and
+#   transformed by a common.plotting.spectrum.SpectrumWorker; finished
+#   columns are collected every \ref COLUMN_UPDATE_INTERVAL seconds.
+class Spectrogram(BoxLayout):
+
+    ##
+    #   @brief          Reference to the view of the columns.
+    view = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to the layout of the labels of the bands.
+    band_labels = ObjectProperty(None)
+
+    ##
+    #   @brief          Names of the channels, from the top band.
+    channel_names = ListProperty(['X', 'Y', 'Z'])
+
+    ##
+    #   @brief          Sample rate in Hz of the added samples.
+    sample_rate = NumericProperty(1)
+
+    ##
+    #   @brief          Choices of FFT sizes.
+    fft_size_options = ListProperty(['64', '128', '256', '512'])
+
+    ##
+    #   @brief          Number of samples of each FFT.
+    fft_size = NumericProperty(DEFAULT_FFT_SIZE)
+
+    ##
+    #   @brief          Choices of dynamic ranges in dB.
+    dynamic_range_options = ListProperty(['40', '60', '80', '100'])
+
+    ##
+    #   @brief          Range in dB of the colors, below an amplitude of 1.
+    dynamic_range = NumericProperty(DEFAULT_DYNAMIC_RANGE)
+
+    ##
+    #   @brief          Description of the frequency and time resolution.
+    resolution_string = StringProperty('')
+
+    ##
+    #   @brief          False to queue the columns without drawing them.
+    visible = BooleanProperty(True)
+
+    def __init__(self, **kwargs):
+        self.worker = SpectrumWorker(len(self.channel_names), self.fft_size, self.dynamic_range)
+        super(Spectrogram, self).__init__(**kwargs)
+        Clock.schedule_interval(self.collect_columns, COLUMN_UPDATE_INTERVAL)
+
+    def on_view(self, instance, value):
+        self.reset()
+
+    def on_sample_rate(self, instance, value):
+        self.reset()
+
+    def on_fft_size(self, instance, value):
+        self.reset()
+
+    def on_dynamic_range(self, instance, value):
+        self.reset()
+
+    ##
+    #   @brief          Apply the settings, removing the history.
+    def reset(self, *args):
+        self.worker.configure(self.fft_size, self.dynamic_range)
+        if (self.view is None):
+            return
+        self.view.reset(self.worker.height)
+        self.update_band_labels()
+        hop_seconds = self.worker.hop / float(self.sample_rate)
+        self.resolution_string = (f'{self.sample_rate / float(self.fft_size):.3g} Hz per bin\n'
+                                  f'{hop_seconds:.3g} s per column\n'
+                                  f'{hop_seconds * self.view.n_columns:.0f} s shown')
+
+    ##
+    #   @brief          Label each band with its channel and frequency range.
+    def update_band_labels(self):
+        if (self.band_labels is None):
+            return
+        self.band_labels.clear_widgets()
+        for name in self.channel_names:
+            band = Factory.SpectrogramBand()
+            band.name = name
+            band.max_frequency = self.sample_rate / 2.
+            self.band_labels.add_widget(band)
+
+    def on_band_labels(self, instance, value):
+        self.update_band_labels()
+
+    ##
+    #   @brief          Add a batch of samples.
+    #
+    #   @param[in]      samples: array of shape (n, channels).
+    def add_samples(self, samples):
+        self.worker.submit(samples)
+
+    ##
+    #   @brief          Write the columns finished by the worker into the texture.
+    def collect_columns(self, dt):
+        if (not self.visible or self.view is None):
+            return
+        columns = self.worker.columns()
+        if (columns):
+            self.view.add_columns(columns)
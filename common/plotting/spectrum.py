@@ -0,0 +1,166 @@
+##
+# @package common.plotting.spectrum
+#
+#   Kivy-free short-time Fourier transform of streamed samples, computed
+#   in a background thread, for the spectrogram widget.
+#
+#   Batches of samples are queued by the main thread with
+#   \ref SpectrumWorker.submit. The worker splits them into windows of
+#   \ref SpectrumWorker.fft_size samples, one every
+#   \ref SpectrumWorker.hop samples. It then computes the amplitude spectrum
+#   of each channel and maps it to colors. Each window gives one column of
+#   RGBA pixels, with the bands of the channels stacked from the top.
+#   The main thread collects the finished columns with
+#   \ref SpectrumWorker.columns and only has to copy them into a texture.
+
+import collections
+import threading
+import numpy as np
+
+##
+#   @brief          Default number of samples of each FFT.
+DEFAULT_FFT_SIZE = 128
+
+##
+#   @brief          Default range in dB of the colors, below \ref REFERENCE_LEVEL.
+DEFAULT_DYNAMIC_RANGE = 60
+
+##
+#   @brief          Amplitude in dB shown with the brightest color: 0 dB is an amplitude of 1.
+REFERENCE_LEVEL = 0.
+
+##
+#   @brief          Number of windows per FFT size: windows overlap by 75%.
+HOPS_PER_WINDOW = 4
+
+##
+#   @brief          Maximum number of columns kept until they are collected.
+MAX_PENDING_COLUMNS = 4096
+
+##
+#   @brief          Colors of the colormap, from the lowest to the highest level.
+COLORMAP_ANCHORS = np.array([
+    (0, 0, 4), (40, 11, 84), (101, 21, 110), (159, 42, 99),
+    (212, 72, 66), (245, 125, 21), (250, 193, 39), (252, 255, 164)], dtype=np.float64)
+
+
+##
+#   @brief          Lookup table of 256 RGBA colors interpolated between anchors.
+def make_colormap(anchors=COLORMAP_ANCHORS):
+    positions = np.linspace(0, 255, len(anchors))
+    levels = np.arange(256)
+    colormap = np.full((256, 4), 255, dtype=np.uint8)
+    for channel in range(3):
+        colormap[:, channel] = np.round(np.interp(levels, positions, anchors[:, channel]))
+    return colormap
+
+
+##
+#   @brief          Short-time Fourier transform of several channels, in a background thread.
+class SpectrumWorker():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      n_channels: number of channels of the samples.
+    #   @param[in]      fft_size: number of samples of each FFT, even.
+    #   @param[in]      dynamic_range: range in dB of the colors.
+    def __init__(self, n_channels, fft_size=DEFAULT_FFT_SIZE,
+                 dynamic_range=DEFAULT_DYNAMIC_RANGE):
+        self.n_channels = n_channels
+        self.colormap = make_colormap()
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.batches = collections.deque()
+        self.finished = collections.deque(maxlen=MAX_PENDING_COLUMNS)
+        self.thread = None
+        self.generation = 0         # incremented by configure, to discard stale columns
+        self.configure(fft_size, dynamic_range)
+
+    ##
+    #   @brief          Change the settings, discarding the samples and columns not collected.
+    def configure(self, fft_size, dynamic_range=None):
+        with self.lock:
+            self.fft_size = int(fft_size)
+            self.hop = max(1, self.fft_size // HOPS_PER_WINDOW)
+            if (dynamic_range is not None):
+                self.dynamic_range = float(dynamic_range)
+            window = np.hanning(self.fft_size)
+            # Amplitude of a sine of amplitude 1 in the middle of a bin: 1
+            self.scale = 2. / window.sum()
+            self.window = window.astype(np.float32)
+            self.pending = np.empty((0, self.n_channels), dtype=np.float32)
+            self.batches.clear()
+            self.finished.clear()
+            self.generation += 1
+
+    ##
+    #   @brief          Number of frequency bins of each channel, without the DC bin.
+    @property
+    def n_bins(self):
+        return self.fft_size // 2
+
+    ##
+    #   @brief          Height in pixels of a column: the bins of all the channels.
+    @property
+    def height(self):
+        return self.n_bins * self.n_channels
+
+    ##
+    #   @brief          Queue a batch of samples.
+    #   @param[in]      samples: array of shape (n, n_channels).
+    def submit(self, samples):
+        if (self.thread is None):
+            self.thread = threading.Thread(target=self.run, name='SpectrumWorker', daemon=True)
+            self.thread.start()
+        self.batches.append(samples)
+        self.event.set()
+
+    ##
+    #   @brief          Columns finished since the last call, from the oldest.
+    #   @return         list of arrays of shape (height, 4) of uint8 RGBA pixels,
+    #                   from the bottom of the column.
+    def columns(self):
+        columns = []
+        while (self.finished):
+            columns.append(self.finished.popleft())
+        return columns
+
+    ##
+    #   @brief          Target function of the thread of the worker.
+    def run(self):
+        while (True):
+            self.event.wait()
+            self.event.clear()
+            with self.lock:
+                generation = self.generation
+                batches = []
+                while (self.batches):
+                    batches.append(self.batches.popleft())
+                if (not batches):
+                    continue
+                pending = np.concatenate([self.pending] + batches).astype(np.float32, copy=False)
+                n_columns = max(0, (len(pending) - self.fft_size) // self.hop + 1)
+                self.pending = pending[n_columns * self.hop:]
+                settings = (self.fft_size, self.hop, self.window, self.scale, self.dynamic_range)
+            if (n_columns == 0):
+                continue
+            columns = self.compute(pending[:(n_columns - 1) * settings[1] + settings[0]],
+                                   n_columns, *settings)
+            with self.lock:
+                if (generation == self.generation):
+                    self.finished.extend(columns)
+
+    ##
+    #   @brief          Columns of RGBA pixels of consecutive windows of samples.
+    def compute(self, samples, n_columns, fft_size, hop, window, scale, dynamic_range):
+        # (columns, channels, fft_size) windows, without copying the samples
+        windows = np.lib.stride_tricks.sliding_window_view(samples, fft_size, axis=0)[::hop]
+        windows = windows - windows.mean(axis=2, keepdims=True)
+        amplitude = np.abs(np.fft.rfft(windows * window, axis=2)[:, :, 1:]) * scale
+        level = 20 * np.log10(np.maximum(amplitude, 1e-12))
+        indices = (level - (REFERENCE_LEVEL - dynamic_range)) * (255. / dynamic_range)
+        indices = np.clip(indices, 0, 255).astype(np.uint8)
+        # First channel on top: the rows of a texture start from the bottom
+        indices = indices[:, ::-1, :].reshape(n_columns, -1)
+        pixels = self.colormap[indices]
+        return list(pixels)
@@ -0,0 +1,228 @@
+##
+# @package common.plotting.statistics
+#
+#   Kivy-free running statistics of streamed samples, updated per batch.
+#
+#   For each channel, \ref RunningStatistics keeps the statistics of all
+#   the samples since it was reset, and \ref WindowStatistics the
+#   statistics of the samples of a common.plotting.buffers.RingBuffer
+#   (the window shown by a plot). Both are updated in O(batch):
+#       - mean and sum of squared deviations are combined batch by batch,
+#         with the parallel form of Welford's algorithm (Chan et al.); the
+#         window also removes the batches of samples it evicts;
+#       - minimum and maximum of the window are kept for blocks of
+#         samples, so that the extremes of the window are found from the
+#         blocks and the samples of the oldest block only.
+#
+#   Mean, standard deviation, RMS, peak-to-peak and crest factor (peak
+#   over RMS) are derived from these when shown.
+
+from math import isqrt
+import numpy as np
+
+##
+#   @brief          Minimum number of samples of a block of \ref WindowStatistics.
+MIN_BLOCK_SIZE = 64
+
+
+##
+#   @brief          Count, mean and sum of squared deviations of a batch, per channel.
+def batch_moments(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    mean = samples.mean(axis=0)
+    return len(samples), mean, ((samples - mean) ** 2).sum(axis=0)
+
+
+##
+#   @brief          Combine the moments of two sets of samples.
+#   @return         (count, mean, sum of squared deviations) of their union.
+def combine_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    n = n_a + n_b
+    if (n_a == 0 or n_b == 0):
+        return (n, mean_b, m2_b) if (n_a == 0) else (n, mean_a, m2_a)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (n_b / n)
+    return n, mean, m2_a + m2_b + delta ** 2 * (n_a * n_b / n)
+
+
+##
+#   @brief          Remove the moments of a subset of samples from those of a set.
+#   @return         (count, mean, sum of squared deviations) of the remaining samples.
+def remove_moments(n, mean, m2, n_b, mean_b, m2_b):
+    n_a = n - n_b
+    if (n_a <= 0):
+        return 0, np.zeros_like(mean), np.zeros_like(m2)
+    mean_a = (n * mean - n_b * mean_b) / n_a
+    delta = mean_b - mean_a
+    m2_a = m2 - m2_b - delta ** 2 * (n_a * n_b / n)
+    # Rounding errors must not make the variance negative
+    return n_a, mean_a, np.maximum(m2_a, 0)
+
+
+##
+#   @brief          Statistics shown for each channel.
+#
+#   @return         dictionary of arrays of the mean, std (population standard
+#                   deviation), rms, peak_to_peak and crest_factor of each
+#                   channel, None if there are no samples.
+def summarize(n, mean, m2, minimum, maximum):
+    if (n == 0):
+        return None
+    std = np.sqrt(m2 / n)
+    rms = np.sqrt(mean ** 2 + std ** 2)
+    peak = np.maximum(np.abs(minimum), np.abs(maximum))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crest_factor = np.where(rms > 0, peak / rms, np.nan)
+    return {'mean': mean, 'std': std, 'rms': rms, 'peak_to_peak': maximum - minimum,
+            'crest_factor': crest_factor}
+
+
+##
+#   @brief          Statistics of all the samples added since the last reset.
+class RunningStatistics():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      n_channels: number of channels of each sample.
+    def __init__(self, n_channels=1):
+        self.n_channels = n_channels
+        self.reset()
+
+    ##
+    #   @brief          Forget all the samples.
+    def reset(self):
+        self.n = 0
+        self.mean = np.zeros(self.n_channels)
+        self.m2 = np.zeros(self.n_channels)
+        self.minimum = np.full(self.n_channels, np.inf)
+        self.maximum = np.full(self.n_channels, -np.inf)
+
+    ##
+    #   @brief          Add a batch of samples.
+    #   @param[in]      samples: array of shape (n, n_channels), or (n,) with one channel.
+    def add(self, samples):
+        samples = np.asarray(samples).reshape(-1, self.n_channels)
+        if (len(samples) == 0):
+            return
+        self.n, self.mean, self.m2 = combine_moments(self.n, self.mean, self.m2,
+                                                     *batch_moments(samples))
+        self.minimum = np.minimum(self.minimum, samples.min(axis=0))
+        self.maximum = np.maximum(self.maximum, samples.max(axis=0))
+
+    ##
+    #   @brief          Statistics of each channel, see \ref summarize.
+    def summary(self):
+        return summarize(self.n, self.mean, self.m2, self.minimum, self.maximum)
+
+
+##
+#   @brief          Statistics of the samples of a ring buffer.
+#
+#   Samples must be added with \ref extend, which adds them to the buffer
+#   too; \ref rebuild must be called when the buffer is cleared or
+#   resized. Samples are numbered from the oldest sample of the buffer at
+#   the last rebuild, and sample i belongs to block i // block_size.
+class WindowStatistics():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      buffer: the common.plotting.buffers.RingBuffer of the window.
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.rebuild()
+
+    ##
+    #   @brief          Compute the statistics from the samples of the buffer.
+    #
+    #   Costs the size of the buffer: called when it is cleared or resized.
+    def rebuild(self):
+        buffer = self.buffer
+        self.block_size = max(MIN_BLOCK_SIZE, isqrt(buffer.capacity))
+        # Blocks overlapping the window, in a circular array indexed by block % n_blocks
+        n_blocks = buffer.capacity // self.block_size + 2
+        self.block_minimum = np.empty((n_blocks, buffer.n_channels))
+        self.block_maximum = np.empty((n_blocks, buffer.n_channels))
+        self.n, self.mean, self.m2 = 0, np.zeros(buffer.n_channels), np.zeros(buffer.n_channels)
+        self.next_index = 0         # number of the next sample added
+        self.add(buffer.latest(buffer.count))
+
+    ##
+    #   @brief          Add a batch of samples to the statistics and to the buffer.
+    #   @param[in]      samples: array of shape (n, n_channels), or (n,) with one channel.
+    def extend(self, samples):
+        buffer = self.buffer
+        samples = np.asarray(samples).reshape(-1, buffer.n_channels)
+        if (len(samples) >= buffer.capacity):
+            buffer.extend(samples)
+            self.rebuild()
+            return
+        n_evicted = buffer.count + len(samples) - buffer.capacity
+        if (n_evicted > 0):
+            self.n, self.mean, self.m2 = remove_moments(self.n, self.mean, self.m2,
+                                                        *batch_moments(buffer.oldest(n_evicted)))
+        buffer.extend(samples)
+        self.add(samples)
+
+    ##
+    #   @brief          Add a batch of samples to the moments and the blocks only.
+    def add(self, samples):
+        if (len(samples) == 0):
+            return
+        self.n, self.mean, self.m2 = combine_moments(self.n, self.mean, self.m2,
+                                                     *batch_moments(samples))
+        block_size = self.block_size
+        n_blocks = len(self.block_minimum)
+        block = self.next_index // block_size
+        # End of the block being filled
+        start = min(len(samples), -self.next_index % block_size)
+        if (start):
+            head = samples[:start]
+            slot = block % n_blocks
+            self.block_minimum[slot] = np.minimum(self.block_minimum[slot], head.min(axis=0))
+            self.block_maximum[slot] = np.maximum(self.block_maximum[slot], head.max(axis=0))
+            block += 1
+        # Whole blocks, then the start of the next one
+        n_whole = (len(samples) - start) // block_size
+        if (n_whole):
+            whole = samples[start:start + n_whole * block_size].reshape(n_whole, block_size, -1)
+            slots = np.arange(block, block + n_whole) % n_blocks
+            self.block_minimum[slots] = whole.min(axis=1)
+            self.block_maximum[slots] = whole.max(axis=1)
+        tail = samples[start + n_whole * block_size:]
+        if (len(tail)):
+            slot = (block + n_whole) % n_blocks
+            self.block_minimum[slot] = tail.min(axis=0)
+            self.block_maximum[slot] = tail.max(axis=0)
+        self.next_index += len(samples)
+
+    ##
+    #   @brief          Minimum and maximum of each channel of the window.
+    #
+    #   The oldest block is only partially in the window: its samples still
+    #   in the buffer are read, the other blocks are whole.
+    def extremes(self):
+        block_size = self.block_size
+        n_blocks = len(self.block_minimum)
+        window_start = self.next_index - self.n
+        first_block = window_start // block_size + 1
+        head = self.buffer.oldest(min(first_block * block_size, self.next_index) - window_start)
+        minimum = head.min(axis=0)
+        maximum = head.max(axis=0)
+        last_block = (self.next_index - 1) // block_size
+        if (last_block >= first_block):
+            # Slots of the blocks, in at most two contiguous ranges
+            start = first_block % n_blocks
+            stop = start + last_block - first_block + 1
+            ranges = [slice(start, min(stop, n_blocks)), slice(0, max(stop - n_blocks, 0))]
+            for blocks in ranges:
+                if (blocks.stop > blocks.start):
+                    minimum = np.minimum(minimum, self.block_minimum[blocks].min(axis=0))
+                    maximum = np.maximum(maximum, self.block_maximum[blocks].max(axis=0))
+        return minimum, maximum
+
+    ##
+    #   @brief          Statistics of each channel, see \ref summarize.
+    def summary(self):
+        if (self.n == 0):
+            return None
+        return summarize(self.n, self.mean, self.m2, *self.extremes())
@@ -0,0 +1,484 @@
+##
+# @package common.plotting.streaming_plot
+#
+#   Kivy widget plotting streamed samples of N channels.
+#
+#   A \ref StreamingPlot shows a Graph next to a \ref PlotSettings panel
+#   (y range, autoscale, seconds shown). Samples are added in batches
+#   with \ref StreamingPlot.add_samples and stored in a preallocated ring
+#   buffer holding the seconds shown at the full sample rate, which is
+#   resized, keeping its samples, when the seconds shown or the sample
+#   rate change. Windows from 1 s to 10 min are decimated to at most
+#   \ref StreamingPlot.max_points points, and drawn once per batch, only
+#   while the plot is \ref StreamingPlot.visible.
+#
+#   Running statistics of each channel, over the window and since the
+#   plot was cleared, are updated with each batch by the estimators of
+#   \ref common.plotting.statistics, and shown below the plot settings
+#   every \ref STATISTICS_UPDATE_INTERVAL seconds.
+
+from math import ceil
+import os
+import re
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.textinput import TextInput
+from kivy.properties import (BooleanProperty, ListProperty, NumericProperty,  # pylint:disable=no-name-in-module
+                             ObjectProperty, OptionProperty, StringProperty)
+from kivy.utils import get_hex_from_color
+from kivy.garden.graph import LinePlot  # pylint:disable=no-name-in-module, import-error
+import numpy as np
+
+from common.plotting.buffers import RingBuffer, decimate_min_max, get_bounds_and_ticks
+from common.plotting.statistics import RunningStatistics, WindowStatistics
+
+Builder.load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streaming_plot.kv'))
+
+##
+#   @brief          Default maximum number of points drawn for each channel.
+DEFAULT_MAX_POINTS = 2000
+
+##
+#   @brief          Number of major ticks of the y axis when its range is set.
+N_Y_TICKS = 4
+
+##
+#   @brief          Number of major ticks of the y axis when autoscaled.
+N_AUTOSCALE_TICKS = 10
+
+##
+#   @brief          Interval in seconds between two updates of the statistics shown.
+STATISTICS_UPDATE_INTERVAL = 0.25
+
+##
+#   @brief          Rows of the statistics table: (label, key of the summary).
+STATISTICS_ROWS = (('Mean', 'mean'), ('Std', 'std'), ('RMS', 'rms'),
+                   ('P-P', 'peak_to_peak'), ('Crest', 'crest_factor'))
+
+##
+#   @brief          Width in characters of a column of the statistics table.
+STATISTICS_COLUMN_WIDTH = 8
+
+
+##
+#   @brief          Format a statistic right-aligned in a column, at least one space before it.
+#
+#   The precision is lowered from 3 significant digits until the value fits.
+def format_statistic(value, width=STATISTICS_COLUMN_WIDTH):
+    for precision in (3, 2, 1):
+        text = f'{value:.{precision}g}'
+        if (len(text) < width):
+            break
+    return text.rjust(width)
+
+
+##
+#   @brief          Graph of streamed samples with its plot settings.
+#
+class StreamingPlot(BoxLayout):
+
+    ##
+    #   @brief          Reference to graph widget.
+    graph = ObjectProperty(None)
+
+    ##
+    #   @brief          Reference to plot settings widget.
+    plot_settings = ObjectProperty(None)
+
+    ##
+    #   @brief          Colors of the plotted channels, one per channel.
+    plot_colors = ListProperty([(0.75, 0.4, 0.4, 1.0)])
+
+    ##
+    #   @brief          Names of the channels in the statistics, numbers if empty.
+    channel_names = ListProperty([])
+
+    ##
+    #   @brief          Width of the plotted lines.
+    line_width = NumericProperty(1.2)
+
+    ##
+    #   @brief          Label of the y axis.
+    ylabel = StringProperty('')
+
+    ##
+    #   @brief          Sample rate in Hz of the added samples.
+    sample_rate = NumericProperty(1)
+
+    ##
+    #   @brief          Choices of seconds shown in the plot settings.
+    seconds_options = ListProperty(['1', '5', '10', '20', '60', '120', '300', '600'])
+
+    ##
+    #   @brief          Number of seconds shown.
+    n_seconds = NumericProperty(20)
+
+    ##
+    #   @brief          Maximum number of points drawn for each channel.
+    max_points = NumericProperty(DEFAULT_MAX_POINTS)
+
+    ##
+    #   @brief          Autoscale setting.
+    autoscale = BooleanProperty(False)
+
+    ##
+    #   @brief          False to store samples without drawing them.
+    visible = BooleanProperty(True)
+
+    def __init__(self, **kwargs):
+        self.plots = []
+        self.buffer = RingBuffer(1, len(self.plot_colors))
+        self.window_statistics = WindowStatistics(self.buffer)
+        self.total_statistics = RunningStatistics(len(self.plot_colors))
+        self.stale = False                  # True if samples were added while not visible
+        self.statistics_stale = False       # True if samples were added since the statistics were shown
+        super(StreamingPlot, self).__init__(**kwargs)
+        Clock.schedule_interval(self.update_statistics, STATISTICS_UPDATE_INTERVAL)
+
+    ##
+    #   @brief          Callback called when the graph widget is shown on the screen.
+    def on_graph(self, instance, value):
+        self.graph.xlabel = 'Time (s)'
+        self.graph.ylabel = self.ylabel
+        self.graph.xmax = 0
+        self.graph.x_grid_label = True
+        self.graph.y_grid_label = True
+        self.on_n_seconds(self, self.n_seconds)
+        self.create_plots()
+
+    ##
+    #   @brief          Callback called when the plot settings widget is shown on the screen.
+    def on_plot_settings(self, instance, value):
+        self.plot_settings.n_seconds = self.n_seconds
+        self.plot_settings.bind(n_seconds=self.setter('n_seconds'))
+        self.plot_settings.bind(ymin=self.graph.setter('ymin'))
+        self.plot_settings.bind(ymax=self.graph.setter('ymax'))
+        self.plot_settings.bind(autoscale_selected=self.setter('autoscale'))
+        self.plot_settings.bind(statistics_scope=self.show_statistics)
+        self.plot_settings.bind(on_statistics_reset=self.reset_statistics)
+        self.plot_settings.set_range(self.graph.ymin, self.graph.ymax)
+        self.show_statistics()
+
+    def on_ylabel(self, instance, value):
+        if (self.graph is not None):
+            self.graph.ylabel = value
+
+    def on_plot_colors(self, instance, value):
+        if (self.graph is not None):
+            self.create_plots()
+
+    def on_line_width(self, instance, value):
+        for plot in self.plots:
+            plot.line_width = value
+
+    ##
+    #   @brief          Create one line plot for each channel.
+    def create_plots(self):
+        for plot in self.plots:
+            self.graph.remove_plot(plot)
+        self.plots = []
+        for color in self.plot_colors:
+            plot = LinePlot(color=color)
+            plot.line_width = self.line_width
+            self.plots.append(plot)
+            self.graph.add_plot(plot)
+        self.reset()
+
+    ##
+    #   @brief          Number of samples in the seconds shown.
+    def window_size(self):
+        return int(ceil(self.n_seconds * self.sample_rate))
+
+    ##
+    #   @brief          Allocate the buffer for the channels, removing all the samples.
+    def reset(self, *args):
+        self.buffer = RingBuffer(self.window_size(), len(self.plot_colors))
+        self.window_statistics = WindowStatistics(self.buffer)
+        self.total_statistics = RunningStatistics(len(self.plot_colors))
+        self.update()
+
+    ##
+    #   @brief          Resize the buffer for the new sample rate, keeping the samples.
+    def on_sample_rate(self, instance, value):
+        self.buffer.resize(self.window_size())
+        self.window_statistics.rebuild()
+        self.update()
+
+    ##
+    #   @brief          Remove all the samples.
+    def clear(self):
+        self.buffer.clear()
+        self.window_statistics.rebuild()
+        self.total_statistics.reset()
+        self.update()
+
+    ##
+    #   @brief          Add a batch of samples.
+    #
+    #   @param[in]      samples: array of shape (n, channels), or (n,) with one channel.
+    def add_samples(self, samples):
+        self.window_statistics.extend(samples)
+        self.total_statistics.add(samples)
+        self.update()
+
+    ##
+    #   @brief          Redraw the plots if visible, or remember to do it when visible again.
+    def update(self):
+        self.statistics_stale = True
+        if (self.visible):
+            self.redraw()
+        else:
+            self.stale = True
+
+    ##
+    #   @brief          Catch up with the samples added while not visible.
+    def on_visible(self, instance, value):
+        if (value and self.stale):
+            self.redraw()
+
+    ##
+    #   @brief          Redraw the plots with the seconds shown.
+    #
+    #   The newest sample is drawn at t = 0, and windows with more samples
+    #   than \ref max_points are decimated.
+    def redraw(self):
+        self.stale = False
+        if (self.graph is None):
+            return
+        samples = self.buffer.latest(self.window_size())
+        x = (np.arange(len(samples)) - (len(samples) - 1)) / float(self.sample_rate)
+        x, samples = decimate_min_max(x, samples, self.max_points)
+        x = x.tolist()
+        for channel, plot in enumerate(self.plots):
+            plot.points = list(zip(x, samples[:, channel].tolist()))
+        if (self.autoscale):
+            self.autoscale_plots(samples)
+
+    ##
+    #   @brief          Callback called when the \ref autoscale property changes.
+    #
+    #   When disabled, the range of the plot settings is restored.
+    def on_autoscale(self, instance, value):
+        if (value):
+            self.update()
+        elif (self.plot_settings is not None):
+            self.set_range(self.plot_settings.ymin, self.plot_settings.ymax)
+
+    ##
+    #   @brief          Fit the y axis to the samples shown.
+    #   @param[in]      samples: array of the samples shown.
+    def autoscale_plots(self, samples):
+        if (len(samples) == 0):
+            return
+        y_min = float(samples.min())
+        y_max = float(samples.max())
+        if (y_min != y_max):
+            min_val, max_val, major_ticks, minor_ticks = get_bounds_and_ticks(
+                y_min, y_max, N_AUTOSCALE_TICKS)
+            self.graph.ymin = min_val
+            self.graph.ymax = max_val
+            self.graph.y_ticks_major = major_ticks
+            self.graph.y_ticks_minor = minor_ticks
+
+    ##
+    #   @brief          Set the range of the y axis, as if entered on the GUI.
+    def set_range(self, y_min, y_max):
+        self.graph.ymin = y_min
+        self.graph.ymax = y_max
+        min_val, max_val, major_ticks, minor_ticks = get_bounds_and_ticks(y_min, y_max, N_Y_TICKS)
+        self.graph.y_ticks_major = major_ticks
+        self.graph.y_ticks_minor = minor_ticks
+        if (self.plot_settings is not None):
+            self.plot_settings.set_range(y_min, y_max)
+
+    ##
+    #   @brief          Update buffer and x axis when the number of seconds shown changes.
+    #
+    #   The samples already stored are kept, so a longer window starts with
+    #   the samples of the shorter one.
+    def on_n_seconds(self, instance, value):
+        if (self.plot_settings is not None):
+            self.plot_settings.n_seconds = value
+        self.buffer.resize(self.window_size())
+        self.window_statistics.rebuild()
+        if (self.graph is None):
+            return
+        self.graph.xmin = -value
+        min_val, max_val, major_ticks, minor_ticks = get_bounds_and_ticks(-value, 0, N_AUTOSCALE_TICKS)
+        self.graph.x_ticks_major = major_ticks
+        self.graph.x_ticks_minor = minor_ticks
+        self.update()
+
+    ##
+    #   @brief          Show the statistics of the new samples, if visible.
+    def update_statistics(self, dt):
+        if (self.visible and self.statistics_stale):
+            self.show_statistics()
+
+    ##
+    #   @brief          Forget the samples of the statistics since the start.
+    def reset_statistics(self, *args):
+        self.total_statistics.reset()
+        self.show_statistics()
+
+    ##
+    #   @brief          Show the statistics of the scope selected in the plot settings.
+    def show_statistics(self, *args):
+        self.statistics_stale = False
+        if (self.plot_settings is None):
+            return
+        if (self.plot_settings.statistics_scope == 'window'):
+            summary = self.window_statistics.summary()
+        else:
+            summary = self.total_statistics.summary()
+        n_channels = len(self.plot_colors)
+        names = list(self.channel_names) or [f'#{channel + 1}' for channel in range(n_channels)]
+        header = ''.join(f'[color={get_hex_from_color(color)}]{name[:STATISTICS_COLUMN_WIDTH - 1]:>{STATISTICS_COLUMN_WIDTH}}[/color]'
+                         for name, color in zip(names, self.plot_colors))
+        lines = ['     ' + header]
+        for label, key in STATISTICS_ROWS:
+            values = summary[key] if (summary is not None) else [np.nan] * n_channels
+            lines.append(f'{label:<5}' + ''.join(format_statistic(value) for value in values))
+        self.plot_settings.statistics_text = '\n'.join(lines)
+
+
+class PlotSettings(BoxLayout):
+    """
+    @brief Class to show some settings related to the plot.
+    """
+
+    """
+    @brief Number of seconds to show on the plot.
+    """
+    seconds_spinner = ObjectProperty(None)
+
+    autoscale_checkbox = ObjectProperty(None)
+
+    """
+    @brief Minimum value for y axis text input widget.
+    """
+    ymin_input = ObjectProperty(None)
+
+    """
+    @brief Maximum value for y axis text input widget.
+    """
+    ymax_input = ObjectProperty(None)
+
+    """
+    @brief Current number of seconds shown.
+    """
+    n_seconds = NumericProperty(0)
+
+    autoscale_selected = BooleanProperty(False)
+
+    """
+    @brief Choices of seconds to show on the plot.
+    """
+    seconds_options = ListProperty([])
+
+    ymin = NumericProperty()
+    ymax = NumericProperty()
+
+    """
+    @brief Samples of the statistics shown: the window shown, or all since the start.
+    """
+    statistics_scope = OptionProperty('window', options=['window', 'start'])
+
+    """
+    @brief Table of the statistics of each channel.
+    """
+    statistics_text = StringProperty('')
+
+    __events__ = ('on_statistics_reset',)
+
+    def on_statistics_reset(self):
+        """
+        @brief Dispatched when the statistics since the start are reset on the GUI.
+        """
+        pass
+
+    def on_seconds_spinner(self, instance, value):
+        """
+        @brief Bind change on seconds spinner to callback.
+        """
+        self.seconds_spinner.bind(text=self.spinner_updated)
+
+    def on_ymin_input(self, instance, value):
+        """
+        @brief Bind enter pressed on ymin text input to callback.
+        """
+        self.ymin_input.bind(enter_pressed=self.axis_changed)
+
+    def on_ymax_input(self, instance, value):
+        """
+        @brief Bind enter pressed on on ymax text input to callback.
+        """
+        self.ymax_input.bind(enter_pressed=self.axis_changed)
+
+    def on_autoscale_checkbox(self, instance, value):
+        self.autoscale_checkbox.bind(active=self.autoscale_changed)
+
+    def autoscale_changed(self, instance, value):
+        self.ymin_input.disabled = value
+        self.ymax_input.disabled = value
+        self.autoscale_selected = value
+
+    def set_range(self, y_min, y_max):
+        """
+        @brief Set the range of the y axis, as if entered on the GUI.
+        """
+        self.ymin_input.text = f"{y_min:g}"
+        self.ymax_input.text = f"{y_max:g}"
+        self.ymin = y_min
+        self.ymax = y_max
+
+    def spinner_updated(self, instance, value):
+        """
+        @brief Get new value of seconds to show on the plot.
+        """
+        self.n_seconds = float(value)
+
+    def axis_changed(self, instance, focused):
+        """
+        @brief Called when a new value of ymin or ymax is entered on the GUI.
+        """
+        if (not focused):
+            if (not ((self.ymin_input.text == '') or (self.ymax_input.text == ''))):
+                y_min = float(self.ymin_input.text)
+                y_max = float(self.ymax_input.text)
+                if (y_min >= y_max):
+                    self.ymin_input.text = f"{self.ymin:.2f}"
+                    self.ymax_input.text = f"{self.ymax:.2f}"
+                else:
+                    self.ymin = y_min
+                    self.ymax = y_max
+            elif (self.ymin_input.text == ''):
+                self.ymin_input.text = f"{self.ymin:.2f}"
+            elif (self.ymax_input.text == ''):
+                self.ymax_input.text = f"{self.ymax:.2f}"
+
+
+class FloatInput(TextInput):
+    pat = re.compile('[^0-9]')
+    enter_pressed = BooleanProperty(None)
+
+    def __init__(self, **kwargs):
+        super(FloatInput, self).__init__(**kwargs)
+        self.bind(focus=self.on_focus)  # pylint:disable=no-member
+        self.multiline = False
+
+    def insert_text(self, substring, from_undo=False):
+        pat = self.pat
+        if ((len(self.text) == 0) and substring == '-'):
+            s = '-'
+        else:
+            if '.' in self.text:
+                s = re.sub(pat, '', substring)
+            else:
+                s = '.'.join([re.sub(pat, '', s)
+                             for s in substring.split('.', 1)])
+        return super(FloatInput, self).insert_text(s, from_undo=from_undo)
+
+    def on_focus(self, instance, value):
+        self.enter_pressed = value
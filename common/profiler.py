@@ -0,0 +1,165 @@
+##
+# @package common.profiler
+#
+#   Runtime profiler of the GUIs, started on demand from the toolbar.
+#
+#   A \ref StackSampler samples the stacks of the Python threads (Kivy main
+#   thread, reader threads, ...) with sys._current_frames from a thread of
+#   its own, for a given number of seconds, and traces memory allocations
+#   with tracemalloc meanwhile. It writes:
+#       - a .collapsed file, with one line per stack and its number of
+#         samples, in the folded format read by flamegraph.pl or speedscope;
+#       - an .allocations.txt file, with the lines allocating most memory.
+#
+#   Nothing is hooked into the profiled threads, and nothing runs at all
+#   when no profile is being taken, so the profiler has no overhead when
+#   disabled.
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+##
+#   @brief          Default duration in seconds of a profile.
+DEFAULT_PROFILE_DURATION = 10.0
+
+##
+#   @brief          Default time in seconds between two samples of the stacks.
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+##
+#   @brief          Number of frames stored by tracemalloc for each allocation.
+TRACEMALLOC_FRAMES = 10
+
+##
+#   @brief          Number of lines of the allocation report.
+N_TOP_ALLOCATIONS = 30
+
+
+##
+#   @brief          Name of a frame in the collapsed stacks.
+def frame_name(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+##
+#   @brief          Collapsed stack of a frame, from the outermost function.
+#
+#   Semicolons separate the frames in the folded format, so they are
+#   removed from the names.
+#
+#   @param[in]      thread_name: name of the thread, used as root of the stack.
+#   @param[in]      frame: innermost frame of the thread.
+def collapse_stack(thread_name, frame):
+    names = []
+    while (frame is not None):
+        names.append(frame_name(frame).replace(';', ':'))
+        frame = frame.f_back
+    names.append(thread_name.replace(';', ':').replace(' ', '_'))
+    return ';'.join(reversed(names))
+
+
+##
+#   @brief          Sampling profiler of all the Python threads.
+class StackSampler():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      duration: duration in seconds of the profile.
+    #   @param[in]      interval: time in seconds between two samples.
+    #   @param[in]      output_prefix: path of the output files, without extension.
+    #   @param[in]      callback: optional function called, from the thread of the
+    #                   sampler, with the paths of the files written.
+    def __init__(self, duration=DEFAULT_PROFILE_DURATION, interval=DEFAULT_SAMPLE_INTERVAL,
+                 output_prefix=None, callback=None):
+        self.duration = duration
+        self.interval = interval
+        if (output_prefix is None):
+            output_prefix = time.strftime('profile-%Y%m%d-%H%M%S')
+        self.output_prefix = output_prefix
+        self.callback = callback
+        self.stacks = {}            # number of samples of each collapsed stack
+        self.n_samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    ##
+    #   @brief          True while the profile is being taken.
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    ##
+    #   @brief          Start the profile in a background thread.
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='StackSampler', daemon=True)
+        self.thread.start()
+
+    ##
+    #   @brief          End the profile before its duration, writing the files.
+    def stop(self):
+        self.stop_event.set()
+
+    ##
+    #   @brief          Target function of the thread of the sampler.
+    def run(self):
+        started_tracing = not tracemalloc.is_tracing()
+        if (started_tracing):
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        try:
+            deadline = time.monotonic() + self.duration
+            while (time.monotonic() < deadline and not self.stop_event.wait(self.interval)):
+                self.sample()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if (started_tracing):
+                tracemalloc.stop()
+        paths = (self.write_stacks(), self.write_allocations(snapshot))
+        if (self.callback is not None):
+            self.callback(paths)
+
+    ##
+    #   @brief          Sample the stacks of all the threads, except the sampler.
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if (ident == own_ident):
+                continue
+            stack = collapse_stack(names.get(ident, f'thread-{ident}'), frame)
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.n_samples += 1
+
+    ##
+    #   @brief          Write the collapsed stacks.
+    #   @return         path of the file.
+    def write_stacks(self):
+        path = self.output_prefix + '.collapsed'
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+        return path
+
+    ##
+    #   @brief          Write the lines allocating most memory during the profile.
+    #   @return         path of the file.
+    def write_allocations(self, snapshot):
+        path = self.output_prefix + '.allocations.txt'
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        statistics = snapshot.statistics('lineno')
+        total = sum(stat.size for stat in statistics)
+        with open(path, 'w') as f:
+            f.write(f'Memory allocated during the profile and still in use: '
+                    f'{total / 1024:.1f} KiB in {len(statistics)} lines\n')
+            f.write(f'Stack samples: {self.n_samples} every {self.interval * 1000:.1f} ms\n\n')
+            for stat in statistics[:N_TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                f.write(f'{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  '
+                        f'{frame.filename}:{frame.lineno}\n')
+        return path
@@ -0,0 +1,90 @@
+##
+# @package common.stats
+#
+#   Streaming statistics: number of samples and sample rate.
+#
+#   Samples are counted once per batch by the thread receiving them,
+#   while the rate is read at a low rate by whoever displays it (e.g.,
+#   a Kivy Clock on the main thread). The rate is measured with a
+#   monotonic clock over a sliding window, so it follows changes of the
+#   rate instead of averaging the whole stream.
+
+import collections
+import threading
+import time
+
+##
+#   @brief          Default length in seconds of the sliding window of the rate.
+DEFAULT_STATS_WINDOW = 2.
+
+
+##
+#   @brief          Thread-safe counter of received samples and their rate.
+class StreamStats():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      window: length in seconds of the sliding window of the rate.
+    #   @param[in]      clock: function returning the time in seconds.
+    def __init__(self, window=DEFAULT_STATS_WINDOW, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    ##
+    #   @brief          Restart counting, e.g. when streaming starts.
+    def reset(self):
+        with self.lock:
+            self.total = 0                      # samples received since reset
+            self.batches = collections.deque()  # (time, number of samples) in the window
+            self.window_samples = 0             # samples of the batches in the window
+            self.first_time = None              # time of the first batch
+            self.first_samples = 0              # samples of the first batch
+            self.last_time = None               # time of the last batch
+
+    ##
+    #   @brief          Count a batch of received samples.
+    #   @param[in]      n_samples: number of samples of the batch.
+    def add(self, n_samples):
+        now = self.clock()
+        with self.lock:
+            if (self.first_time is None):
+                self.first_time = now
+                self.first_samples = n_samples
+            self.last_time = now
+            self.total += n_samples
+            self.batches.append((now, n_samples))
+            self.window_samples += n_samples
+            self._expire(now)
+
+    def _expire(self, now):
+        batches = self.batches
+        while (batches and now - batches[0][0] > self.window):
+            self.window_samples -= batches.popleft()[1]
+
+    ##
+    #   @brief          Sample rate over the sliding window.
+    #
+    #   Samples of the first batch in the window were received before the
+    #   window started, so they are not counted.
+    #   @return         rate in Hz, 0 if less than two batches are in the window.
+    def rate(self):
+        with self.lock:
+            self._expire(self.clock())
+            if (len(self.batches) < 2):
+                return 0.
+            first_time, first_samples = self.batches[0]
+            elapsed = self.batches[-1][0] - first_time
+            return (self.window_samples - first_samples) / elapsed if (elapsed > 0) else 0.
+
+    ##
+    #   @brief          Average sample rate since reset.
+    #
+    #   As for \ref rate, samples of the first batch are not counted.
+    #   @return         rate in Hz, 0 if less than two batches were received.
+    def mean_rate(self):
+        with self.lock:
+            if (self.first_time is None or self.last_time == self.first_time):
+                return 0.
+            return (self.total - self.first_samples) / (self.last_time - self.first_time)
@@ -0,0 +1,254 @@
+##
+# @package common.terminal
+#
+#   Line-oriented serial terminal, for ASCII logs printed by firmware.
+#
+#   A \ref LineReader reads the serial port in a background thread, in
+#   chunks of all the bytes waiting, decodes them incrementally (a
+#   character split between two chunks is decoded once complete) and
+#   appends the complete lines to a \ref LineLog in batches.
+#
+#   The \ref LineLog keeps the last lines in a fixed-size ring, and an
+#   inverted index from each word to the lines containing it, updated as
+#   lines are appended and evicted. Searches look up the words of the
+#   index containing the words of the query, instead of scanning the text
+#   of all the lines.
+#
+#   Kivy is not imported, so that the log can be filled and searched
+#   without a GUI.
+
+import codecs
+import collections
+import re
+import threading
+from serial.serialutil import SerialException
+
+##
+#   @brief          Default maximum number of lines kept by a \ref LineLog.
+DEFAULT_MAX_LINES = 100000
+
+##
+#   @brief          Maximum number of bytes read at once.
+MAX_READ_SIZE = 65536
+
+##
+#   @brief          Read timeout in seconds of the port, so that the reader can be stopped.
+READ_TIMEOUT = 0.1
+
+##
+#   @brief          Maximum length of a line: longer lines are split.
+#
+#   Bounds the memory used when the port receives no line ending, e.g.
+#   binary data or a wrong baud rate.
+MAX_LINE_LENGTH = 4096
+
+##
+#   @brief          Words indexed by a \ref LineLog and looked up by searches.
+WORD_PATTERN = re.compile(r'\w+')
+
+
+##
+#   @brief          Distinct lowercase words of a text.
+def words(text):
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+##
+#   @brief          Bounded log of lines with an inverted index of their words.
+#
+#   Each line gets an id, increasing by one for each line appended; the ids
+#   of the lines kept go from \ref first_id to \ref next_id (excluded).
+#   The log is thread safe: lines can be appended by a reader thread while
+#   the GUI reads and searches them.
+class LineLog():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      max_lines: number of lines kept; older lines are evicted.
+    def __init__(self, max_lines=DEFAULT_MAX_LINES):
+        self.max_lines = max_lines
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.clear()
+
+    ##
+    #   @brief          Remove all the lines.
+    #
+    #   Ids are not reused, so that lines appended later are seen as new.
+    def clear(self):
+        with self.lock:
+            self.ring = [None] * self.max_lines
+            self.first_id = self.next_id
+            self.index = {}         # ids of the lines containing each word, in increasing order
+
+    def __len__(self):
+        return self.next_id - self.first_id
+
+    ##
+    #   @brief          Append lines, evicting the oldest ones if the log is full.
+    #   @param[in]      lines: list of lines, without line endings.
+    def extend(self, lines):
+        with self.lock:
+            index = self.index
+            for line in lines:
+                if (self.next_id - self.first_id == self.max_lines):
+                    self.evict()
+                self.ring[self.next_id % self.max_lines] = line
+                for word in words(line):
+                    ids = index.get(word)
+                    if (ids is None):
+                        ids = index[word] = collections.deque()
+                    ids.append(self.next_id)
+                self.next_id += 1
+
+    def evict(self):
+        # The oldest line is the first id of the index of each of its words
+        oldest = self.first_id % self.max_lines
+        for word in words(self.ring[oldest]):
+            ids = self.index[word]
+            ids.popleft()
+            if (not ids):
+                del self.index[word]
+        self.ring[oldest] = None
+        self.first_id += 1
+
+    ##
+    #   @brief          Line with the given id, which must be kept by the log.
+    def line(self, line_id):
+        return self.ring[line_id % self.max_lines]
+
+    ##
+    #   @brief          Lines kept by the log, from the oldest.
+    #   @param[in]      start_id: id of the first line returned, None for the oldest.
+    #   @return         (id of the first line returned, list of lines).
+    def lines(self, start_id=None):
+        with self.lock:
+            if (start_id is None or start_id < self.first_id):
+                start_id = self.first_id
+            start = start_id % self.max_lines
+            stop = self.next_id % self.max_lines
+            if (start_id >= self.next_id):
+                return self.next_id, []
+            if (start < stop):
+                return start_id, self.ring[start:stop]
+            return start_id, self.ring[start:] + self.ring[:stop]
+
+    ##
+    #   @brief          Search the lines containing all the words of a query.
+    #
+    #   Words of the query match the words of the lines containing them,
+    #   case insensitively: "adc" matches "ADC_value=12".
+    #
+    #   @param[in]      query: words separated by spaces or punctuation.
+    #   @param[in]      start_id: ids lower than this one are not returned.
+    #   @param[in]      stop_id: ids from this one are not returned, None for no limit.
+    #   @return         (sorted ids, list of lines) of the matching lines.
+    def search(self, query, start_id=None, stop_id=None):
+        terms = words(query)
+        if (not terms):
+            first_id, lines = self.lines(start_id)
+            if (stop_id is not None):
+                lines = lines[:max(stop_id - first_id, 0)]
+            return list(range(first_id, first_id + len(lines))), lines
+        with self.lock:
+            if (start_id is None or start_id < self.first_id):
+                start_id = self.first_id
+            if (stop_id is None):
+                stop_id = self.next_id
+            matches = None
+            for term in terms:
+                term_ids = set()
+                for word, ids in self.index.items():
+                    if (term in word):
+                        # Ids are sorted: newest ids first, until start_id
+                        for line_id in reversed(ids):
+                            if (line_id < start_id):
+                                break
+                            if (line_id < stop_id):
+                                term_ids.add(line_id)
+                matches = term_ids if (matches is None) else matches & term_ids
+                if (not matches):
+                    return [], []
+            ids = sorted(matches)
+            return ids, [self.line(line_id) for line_id in ids]
+
+    ##
+    #   @brief          Check if a line contains all the words of a query.
+    #
+    #   Used to filter a few new lines, with the same rules as \ref search.
+    def matches(self, query, line):
+        line_words = words(line)
+        return all(any(term in word for word in line_words) for term in words(query))
+
+
+##
+#   @brief          Background reader of the lines received on a serial port.
+class LineReader():
+
+    ##
+    #   @brief          Initialization function.
+    #   @param[in]      port: open serial port; its read timeout is set to READ_TIMEOUT.
+    #   @param[in]      log: \ref LineLog receiving the lines.
+    #   @param[in]      encoding: encoding of the text; invalid bytes are replaced.
+    #   @param[in]      error_callback: optional function called, from the thread of
+    #                   the reader, with the exception ending the reading.
+    def __init__(self, port, log, encoding='utf-8', error_callback=None):
+        self.port = port
+        self.log = log
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.error_callback = error_callback
+        self.pending = ''           # start of the line being received
+        self.n_bytes = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    ##
+    #   @brief          Start reading in a background thread.
+    def start(self):
+        self.port.timeout = READ_TIMEOUT
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='LineReader', daemon=True)
+        self.thread.start()
+
+    ##
+    #   @brief          Stop reading, before the port is closed.
+    #
+    #   The line being received, if any, is appended to the log.
+    def stop(self):
+        self.stop_event.set()
+        if (hasattr(self.port, 'cancel_read')):
+            self.port.cancel_read()
+        if (self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join(2 * READ_TIMEOUT)
+        self.thread = None
+
+    ##
+    #   @brief          Target function of the thread of the reader.
+    def run(self):
+        try:
+            while (not self.stop_event.is_set()):
+                data = self.port.read(min(max(1, self.port.in_waiting), MAX_READ_SIZE))
+                if (data):
+                    self.n_bytes += len(data)
+                    self.feed(self.decoder.decode(data))
+        except (SerialException, OSError, TypeError) as e:
+            # TypeError: the port was closed while reading
+            if (not self.stop_event.is_set() and self.error_callback is not None):
+                self.error_callback(e)
+        self.feed(self.decoder.decode(b'', final=True))
+        if (self.pending):
+            self.log.extend([self.pending])
+            self.pending = ''
+
+    ##
+    #   @brief          Append the complete lines of decoded text to the log.
+    def feed(self, text):
+        if (not text):
+            return
+        lines = (self.pending + text).split('\n')
+        self.pending = lines.pop()
+        while (len(self.pending) > MAX_LINE_LENGTH):
+            lines.append(self.pending[:MAX_LINE_LENGTH])
+            self.pending = self.pending[MAX_LINE_LENGTH:]
+        if (lines):
+            self.log.extend([line.rstrip('\r') for line in lines])